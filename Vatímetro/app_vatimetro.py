@@ -8,41 +8,19 @@
 
 import serial
 from serial.tools import list_ports
-import csv
 import argparse
-import re
 from datetime import datetime
 import sys
 
+from vatimetro_parser import parse_line
+from vatimetro_sink import CsvSink
+
 # Variables Globales
 DEFAULT_SERIAL_PORT = "COM5"
 DEFAULT_CSV_FILE = "vatimetro_data.csv"
 TIMEOUT = 1  # segundos
 BAUDRATE = 9600
 
-# Expresiones regulares para parsear líneas
-RE_V = re.compile(r"V\s+\dN\s+([0-9.E+-]+)")
-RE_A = re.compile(r"A\s+\dN\s+([0-9.E+-]+)")
-RE_W = re.compile(r"W\s+\dN\s+([0-9.E+-]+)")
-
-def parse_line(line):
-    """Intenta extraer Vin, Iin o W de una línea serie"""
-    line = line.strip()
-    vin, iin, w = None, None, None
-
-    match_v = RE_V.search(line)
-    if match_v:
-        vin = float(match_v.group(1))
-    
-    match_a = RE_A.search(line)
-    if match_a:
-        iin = float(match_a.group(1))
-    
-    match_w = RE_W.search(line)
-    if match_w:
-        w = float(match_w.group(1))
-
-    return vin, iin, w
 
 def list_available_ports():
     """Lista los puertos COM disponibles"""
@@ -125,6 +103,23 @@ def read_vatimetro_data(port):
 
 
 
+def save_to_csv(port):
+    """Lee el vatímetro y guarda las lecturas en DEFAULT_CSV_FILE"""
+    print(f"\nGuardando datos en {DEFAULT_CSV_FILE}...")
+    # El sink vuelca periódicamente: un cierre brusco pierde como mucho ~1 s
+    with CsvSink(DEFAULT_CSV_FILE, header=["Timestamp", "Vin (V)", "Iin (A)", "W (W)"],
+                 mode='w', delimiter=';', encoding=None) as sink:
+        try:
+            for line in read_vatimetro_data(port):
+                vin, iin, w = parse_line(line)
+                if vin is not None or iin is not None or w is not None:
+                    timestamp = datetime.now().isoformat()
+                    sink.writerow([timestamp, vin, iin, w])
+                    print(f"{timestamp} - Vin: {vin} V, Iin: {iin} A, W: {w} W")
+        except KeyboardInterrupt:
+            pass
+
+
 #generar interfaz visual con opciones para guardar en csv o mostrar en pantalla
 def main():
     parser = argparse.ArgumentParser(description="Interfaz para leer datos del vatímetro")
@@ -137,19 +132,7 @@ def main():
     while True:
         # Si se especificó --csv en argumentos, ejecutar modo CSV una vez
         if args.csv:
-            print(f"\nGuardando datos en {DEFAULT_CSV_FILE}...")
-            with open(DEFAULT_CSV_FILE, mode='w', newline='') as csvfile:
-                writer = csv.writer(csvfile, delimiter=';')
-                writer.writerow(["Timestamp", "Vin (V)", "Iin (A)", "W (W)"])
-                try:
-                    for line in read_vatimetro_data(current_port):
-                        vin, iin, w = parse_line(line)
-                        if vin is not None or iin is not None or w is not None:
-                            timestamp = datetime.now().isoformat()
-                            writer.writerow([timestamp, vin, iin, w])
-                            print(f"{timestamp} - Vin: {vin} V, Iin: {iin} A, W: {w} W")
-                except KeyboardInterrupt:
-                    pass
+            save_to_csv(current_port)
             return
         
         # Menú interactivo
@@ -157,19 +140,7 @@ def main():
 
         if choice == "1":
             # Guardar en CSV
-            print(f"\nGuardando datos en {DEFAULT_CSV_FILE}...")
-            with open(DEFAULT_CSV_FILE, mode='w', newline='') as csvfile:
-                writer = csv.writer(csvfile, delimiter=';')
-                writer.writerow(["Timestamp", "Vin (V)", "Iin (A)", "W (W)"])
-                try:
-                    for line in read_vatimetro_data(current_port):
-                        vin, iin, w = parse_line(line)
-                        if vin is not None or iin is not None or w is not None:
-                            timestamp = datetime.now().isoformat()
-                            writer.writerow([timestamp, vin, iin, w])
-                            print(f"{timestamp} - Vin: {vin} V, Iin: {iin} A, W: {w} W")
-                except KeyboardInterrupt:
-                    pass
+            save_to_csv(current_port)
 
         elif choice == "2":
             # Cambiar puerto COM
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# bench_vatimetro_parser.py
+#
+# Micro-benchmark del parser de líneas del vatímetro.
+# Compara el parse_line antiguo (strip + tres búsquedas RE_V/RE_A/RE_W sobre
+# la línea decodificada) con vatimetro_parser.parse_raw sobre los bytes crudos.
+
+import argparse
+import random
+import re
+import time
+
+from vatimetro_parser import parse_line, parse_raw
+
+# ====== Implementación antigua (referencia) ======
+RE_V = re.compile(r"V\s+\dN\s+([0-9.E+-]+)")
+RE_A = re.compile(r"A\s+\dN\s+([0-9.E+-]+)")
+RE_W = re.compile(r"W\s+\dN\s+([0-9.E+-]+)")
+
+
+def legacy_parse_line(line):
+    """parse_line tal como estaba copiado en los scripts del vatímetro"""
+    line = line.strip()
+    vin, iin, w = None, None, None
+
+    match_v = RE_V.search(line)
+    if match_v:
+        vin = float(match_v.group(1))
+
+    match_a = RE_A.search(line)
+    if match_a:
+        iin = float(match_a.group(1))
+
+    match_w = RE_W.search(line)
+    if match_w:
+        w = float(match_w.group(1))
+
+    return vin, iin, w
+
+
+# Líneas que el camino rápido no debe confundir con V/A/W (el WT210 también
+# puede sacar VA/VAR): el resultado tiene que ser el de las regex antiguas
+EDGE_LINES = [
+    b"VAR 0N 12.3\r\n",
+    b"VA  0N  5.0\r\n",
+    b"WH  0N  1.5\r\n",
+    b"V  0N  230.45\r\n",
+    b"V 0N\r\n",
+    b"ERR\r\n",
+]
+
+
+def make_lines(n, seed=0):
+    """Genera n líneas serie en bytes alternando V, A y W"""
+    rng = random.Random(seed)
+    lines = []
+    for i in range(n):
+        kind = i % 3
+        if kind == 0:
+            lines.append(f"V  0N  {230.0 + rng.uniform(-11.5, 11.5):.2f}\r\n".encode())
+        elif kind == 1:
+            lines.append(f"A  0N  {2.5 + rng.uniform(-0.125, 0.125):.3f}\r\n".encode())
+        else:
+            lines.append(f"W  0N  {550.0 + rng.uniform(-27.5, 27.5):.2f}\r\n".encode())
+    return lines
+
+
+def bench(name, func, lines, repeat):
+    """Ejecuta func sobre todas las líneas y devuelve la mejor tasa en líneas/s"""
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for raw in lines:
+            func(raw)
+        best = min(best, time.perf_counter() - t0)
+    rate = len(lines) / best
+    print(f"{name:<32s} {rate:14,.0f} líneas/s  ({best / len(lines) * 1e9:7.1f} ns/línea)")
+    return rate
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del parser del vatímetro")
+    parser.add_argument("-n", "--lines", type=int, default=300_000, help="Líneas por pasada")
+    parser.add_argument("-r", "--repeat", type=int, default=5, help="Pasadas (se toma la mejor)")
+    args = parser.parse_args()
+
+    lines = make_lines(args.lines)
+
+    # Comprobación de equivalencia antes de medir
+    for raw in lines[:3000]:
+        old = legacy_parse_line(raw.decode(errors="ignore"))
+        channel, value = parse_raw(raw)
+        assert value in old, (raw, old, channel, value)
+    for raw in EDGE_LINES:
+        old = legacy_parse_line(raw.decode(errors="ignore"))
+        assert parse_line(raw) == old, (raw, old, parse_line(raw))
+
+    print(f"=== {args.lines} líneas, mejor de {args.repeat} pasadas ===")
+    old_rate = bench(
+        "regex x3 (decode + strip)",
+        lambda raw: legacy_parse_line(raw.decode(errors="ignore")),
+        lines, args.repeat,
+    )
+    new_rate = bench("parse_raw (bytes)", parse_raw, lines, args.repeat)
+    print(f"\nMejora: x{new_rate / old_rate:.2f}")
+
+
+if __name__ == "__main__":
+    main()
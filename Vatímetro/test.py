@@ -6,11 +6,20 @@
 # Por defecto usa COM4, pero se puede pasar otro puerto como argumento.
 
 import json
-import re
+import queue
 import serial
+import sys
 import time
 import argparse
 import paho.mqtt.client as mqtt
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "WC_scripts"))
+
+from mqtt_publisher import MqttPublisher, add_publisher_arguments
+from status_view import StatusView, add_view_arguments
+from vatimetro_energy import EnergyIntegrator, decode_control
+from vatimetro_parser import parse_line
 
 # MQTT settings
 HOST = "155.210.152.63"
@@ -25,29 +34,6 @@ HWINFO_JSON_PATH = "hwinfo.json"
 BAUDRATE = 9600
 TIMEOUT = 1  # segundos
 
-# Expresiones regulares para parsear líneas
-RE_V = re.compile(r"V\s+\dN\s+([0-9.E+-]+)")
-RE_A = re.compile(r"A\s+\dN\s+([0-9.E+-]+)")
-RE_W = re.compile(r"W\s+\dN\s+([0-9.E+-]+)")
-
-def parse_line(line):
-    """Intenta extraer Vin, Iin o W de una línea serie"""
-    line = line.strip()
-    vin, iin, w = None, None, None
-
-    match_v = RE_V.search(line)
-    if match_v:
-        vin = float(match_v.group(1))
-    
-    match_a = RE_A.search(line)
-    if match_a:
-        iin = float(match_a.group(1))
-    
-    match_w = RE_W.search(line)
-    if match_w:
-        w = float(match_w.group(1))
-
-    return vin, iin, w
 
 def read_hwinfo_json(path):
     try:
@@ -65,6 +51,53 @@ def read_hwinfo_json(path):
         return None
 
 
+def publish_json(publisher, payload, ts=None, view=None, debug=False):
+    """Encola la muestra; el eco de cada mensaje solo con --debug (si no, al panel de estado)"""
+    publisher.publish_sample(payload, ts)
+    if view is not None:
+        view.count(payload["measurement"])
+        view.update(payload["fields"])
+    elif debug:
+        msg = json.dumps(payload, separators=(",", ":"), ensure_ascii=False)
+        print(f"Encolado: {msg}")
+
+
+def apply_control(energy, event, t, view=None):
+    """Aplica un start/stop de mqtt_gui.py en t (reloj local, el de las muestras)"""
+    result = energy.handle_control(event, t)
+    if result is None:
+        return
+    cmd, phase = result
+    if cmd == "start":
+        text = f"▶ Fase '{phase}' iniciada"
+    elif phase is not None:
+        text = f"⏹ Fase '{phase}' detenida"
+    else:
+        return
+    if view is not None:
+        view.log(text)
+    else:
+        print(text)
+
+
+def publish_closed_phases(publisher, energy, view=None, debug=False):
+    """Publica el total de cada fase que las muestras ya han cerrado"""
+    for closed in energy.pop_closed():
+        joules = closed["E_J"]
+        duration = closed["duration_s"]
+        publish_json(publisher, {
+            "measurement": "energy",
+            "tags": {"device": DEVICE[0]},
+            "fields": {
+                "ver": "1",
+                "phase": closed["phase"],
+                "E_J": round(joules, 3),
+                "E_Wh": round(joules / 3600, 6),
+                "duration_s": round(duration, 3) if duration is not None else None,
+            }
+        }, closed["end"], view=view, debug=debug)
+
+
 def main():
     # Argumentos
     parser = argparse.ArgumentParser(description="Leer serie y enviar a MQTT")
@@ -72,30 +105,59 @@ def main():
         "-p", "--port", default=DEFAULT_SERIAL_PORT,
         help=f"Puerto serie (default: {DEFAULT_SERIAL_PORT})"
     )
+    add_publisher_arguments(parser)
+    add_view_arguments(parser)
     args = parser.parse_args()
     serial_port = args.port
 
+    # Integrador de energía; los comandos de control llegan por el hilo de MQTT
+    energy = EnergyIntegrator()
+    controls = queue.Queue()
+
+    def on_connect(client, userdata, flags, rc):
+        client.subscribe(TOPIC)
+
+    def on_message(client, userdata, msg):
+        event = decode_control(msg.payload)
+        if event is not None:
+            # Se fecha al recibirlo: el "ts" del mensaje es del reloj de mqtt_gui.py
+            # y las muestras usan el time.time() local
+            controls.put((time.time(), event))
+
     # Inicializa MQTT
     client = mqtt.Client()
     client.username_pw_set(USERNAME, PASSWORD)
-    client.connect(HOST, PORT, keepalive=30)
+    client.on_connect = on_connect
+    client.on_message = on_message
+    client.connect(args.mqtt_host or HOST, args.mqtt_port or PORT, keepalive=30)
     client.loop_start()
+    publisher = MqttPublisher.from_args(client, TOPIC, args).start()
 
     # Inicializa Serial
     ser = serial.Serial(serial_port, BAUDRATE, timeout=TIMEOUT)
     print(f"Leyendo datos de {serial_port} y enviando a MQTT...")
+    view = StatusView.from_args("vatímetro -> MQTT", args)
+    if view is not None:
+        view.add_status("MQTT", publisher.format_stats)
+        view.add_status("Energía", lambda: f"{energy.total_j:.1f} J ({energy.total_j / 3600:.4f} Wh)")
+        view.start()
 
     vin_val, iin_val, w_val = None, None, None
     last_hwinfo_time = 0
     HWINFO_INTERVAL = 2  # Leer HWiNFO cada 2 segundos para no saturar
     try:
         while True:
-            line = ser.readline().decode(errors="ignore")
+            line = ser.readline()
             if not line:
                 continue
 
+            t = time.time()
             vin, iin, w = parse_line(line)
 
+            while not controls.empty():
+                received, event = controls.get_nowait()
+                apply_control(energy, event, received, view)
+
             # Actualiza valores si se detectaron
             if vin is not None:
                 vin_val = vin
@@ -103,6 +165,8 @@ def main():
                 iin_val = iin
             if w is not None:
                 w_val = w
+                energy.add(t, w)
+                publish_closed_phases(publisher, energy, view, args.debug)
 
             # Si tenemos un conjunto completo, lo enviamos
             if vin_val is not None and iin_val is not None and w_val is not None:
@@ -113,13 +177,11 @@ def main():
                         "ver": "1",
                         "Vin": vin_val,
                         "Iin": iin_val,
-                        "W": w_val
+                        "W": w_val,
+                        **energy.fields()
                     }
                 }
-                msg = json.dumps(payload, separators=(",", ":"), ensure_ascii=False)
-                info = client.publish(TOPIC, msg, qos=0, retain=False)
-                info.wait_for_publish(timeout=5)
-                print(f"Enviado: {msg}")
+                publish_json(publisher, payload, t, view, args.debug)
 
                 # Reset para esperar la siguiente serie
                 vin_val, iin_val, w_val = None, None, None
@@ -140,10 +202,7 @@ def main():
                             }
                         }
 
-                    msg_hwinfo = json.dumps(payload_hwinfo, separators=(",", ":"), ensure_ascii=False)
-                    info = client.publish(TOPIC, msg_hwinfo, qos=0, retain=False)
-                    info.wait_for_publish(timeout=5)
-                    print(f"Enviado: {msg_hwinfo}")
+                    publish_json(publisher, payload_hwinfo, view=view, debug=args.debug)
 
                     hwinfo_fields = None
 
@@ -152,8 +211,13 @@ def main():
 
     except KeyboardInterrupt:
         print("Detenido por el usuario.")
+        print(f"Energía total: {energy.total_j:.1f} J ({energy.total_j / 3600:.4f} Wh)")
     finally:
+        if view is not None:
+            view.stop()
         ser.close()
+        publisher.stop()
+        print(f"📈 MQTT: {publisher.format_stats()}")
         client.loop_stop()
         client.disconnect()
 
@@ -5,13 +5,15 @@
 # V → Vin, A → Iin, W → W
 # Por defecto usa COM4, pero se puede pasar otro puerto como argumento.
 
-import csv
-import re
 import time
 import argparse
 import random
 from datetime import datetime
 
+from vatimetro_acquisition import WT210Reader
+from vatimetro_binlog import BinarySink
+from vatimetro_sink import CsvSink, DEFAULT_FLUSH_ROWS, DEFAULT_FLUSH_INTERVAL
+
 # Intenta importar serial, pero es opcional en modo simulación
 try:
     import serial
@@ -24,30 +26,7 @@ DEFAULT_SERIAL_PORT = "COM4"
 BAUDRATE = 9600
 TIMEOUT = 1  # segundos
 DEFAULT_CSV_FILE = "vatimetro_data.csv"
-
-# Expresiones regulares para parsear líneas
-RE_V = re.compile(r"V\s+\dN\s+([0-9.E+-]+)")
-RE_A = re.compile(r"A\s+\dN\s+([0-9.E+-]+)")
-RE_W = re.compile(r"W\s+\dN\s+([0-9.E+-]+)")
-
-def parse_line(line):
-    """Intenta extraer Vin, Iin o W de una línea serie"""
-    line = line.strip()
-    vin, iin, w = None, None, None
-
-    match_v = RE_V.search(line)
-    if match_v:
-        vin = float(match_v.group(1))
-    
-    match_a = RE_A.search(line)
-    if match_a:
-        iin = float(match_a.group(1))
-    
-    match_w = RE_W.search(line)
-    if match_w:
-        w = float(match_w.group(1))
-
-    return vin, iin, w
+DEFAULT_BIN_FILE = "vatimetro_data.bin"
 
 
 def generate_simulated_serial_line():
@@ -72,6 +51,19 @@ def generate_simulated_serial_line():
         return f"W  0N  {w:.2f}"
 
 
+class SimulatedPort:
+    """Sustituto del puerto serie que entrega líneas simuladas del WT210"""
+
+    in_waiting = 0
+
+    def read(self, size=1):
+        time.sleep(0.05)  # Simula lectura de serie
+        return (generate_simulated_serial_line() + "\r\n").encode()
+
+    def close(self):
+        pass
+
+
 
 def main():
     # Argumentos
@@ -81,8 +73,12 @@ def main():
         help=f"Puerto serie (default: {DEFAULT_SERIAL_PORT})"
     )
     parser.add_argument(
-        "-f", "--file", default=DEFAULT_CSV_FILE,
-        help=f"Archivo CSV (default: {DEFAULT_CSV_FILE})"
+        "-f", "--file", default=None,
+        help=f"Archivo de salida (default: {DEFAULT_CSV_FILE} o {DEFAULT_BIN_FILE})"
+    )
+    parser.add_argument(
+        "--format", choices=["csv", "bin"], default="csv",
+        help="Formato de salida: CSV de texto o binario por columnas (ver vatimetro_binlog.py)"
     )
     parser.add_argument(
         "-s", "--simulate", action="store_true",
@@ -92,19 +88,42 @@ def main():
         "-n", "--num-samples", type=int, default=0,
         help="Número de muestras en modo simulación (0 = infinito)"
     )
+    parser.add_argument(
+        "--flush-rows", type=int, default=DEFAULT_FLUSH_ROWS,
+        help=f"Volcar la salida cada N filas (default: {DEFAULT_FLUSH_ROWS})"
+    )
+    parser.add_argument(
+        "--flush-interval", type=float, default=DEFAULT_FLUSH_INTERVAL,
+        help=f"Volcar la salida como mucho cada N segundos (default: {DEFAULT_FLUSH_INTERVAL})"
+    )
+    parser.add_argument(
+        "--fsync", action="store_true",
+        help="Forzar fsync en cada volcado (más seguro ante cortes de luz, más lento)"
+    )
+    parser.add_argument(
+        "--stats-interval", type=float, default=10.0,
+        help="Cada cuántos segundos mostrar tasa lograda y backlog (0 = nunca)"
+    )
     args = parser.parse_args()
     serial_port = args.port
-    csv_file = args.file
+    binary = args.format == "bin"
+    csv_file = args.file or (DEFAULT_BIN_FILE if binary else DEFAULT_CSV_FILE)
     simulate_mode = args.simulate
     num_samples = args.num_samples
 
-    # Inicializa archivo CSV
-    csv_f = open(csv_file, 'a', newline='', encoding='utf-8')
-    csv_writer = csv.DictWriter(csv_f, fieldnames=['timestamp', 'Vin', 'Iin', 'W'])
-    
-    # Escribe encabezados si el archivo está vacío
-    if csv_f.tell() == 0:
-        csv_writer.writeheader()
+    # Inicializa archivo de salida (recorta una fila/bloque a medias si el último run se cortó)
+    if binary:
+        sink = BinarySink(
+            csv_file, columns=[('Vin', 'f'), ('Iin', 'f'), ('W', 'f')],
+            flush_rows=args.flush_rows, flush_interval=args.flush_interval, fsync=args.fsync
+        )
+    else:
+        sink = CsvSink(
+            csv_file, header=['timestamp', 'Vin', 'Iin', 'W'],
+            flush_rows=args.flush_rows, flush_interval=args.flush_interval, fsync=args.fsync
+        )
+    if sink.recovered_bytes:
+        print(f"⚠ {csv_file}: descartados datos incompletos ({sink.recovered_bytes} bytes)")
 
     if simulate_mode:
         print(f"[MODO SIMULACIÓN] Generando datos realistas...")
@@ -114,6 +133,7 @@ def main():
         else:
             print("Objetivo: infinito (Presiona Ctrl+C para detener)")
         print()
+        ser = SimulatedPort()
     else:
         # Verifica que serial esté disponible
         if not SERIAL_AVAILABLE:
@@ -121,73 +141,62 @@ def main():
             print(f"💡 Sugerencias:")
             print(f"   - Instala: pip install pyserial")
             print(f"   - O usa modo simulación: python vatimetro.py --simulate")
-            csv_f.close()
+            sink.close()
             return
             
         # Inicializa Serial
         try:
-            ser = serial.Serial(serial_port, BAUDRATE, timeout=TIMEOUT)
+            # serial_for_url acepta COMx, /dev/ttyX, un pty o "loop://" para pruebas
+            ser = serial.serial_for_url(serial_port, BAUDRATE, timeout=TIMEOUT)
             print(f"Leyendo datos de {serial_port} y guardando en {csv_file}...")
         except serial.SerialException as e:
             print(f"❌ Error al abrir puerto {serial_port}: {e}")
             print(f"💡 Sugerencia: ejecuta con --simulate para usar modo simulación")
-            csv_f.close()
+            sink.close()
             return
 
-    vin_val, iin_val, w_val = None, None, None
+    reader = WT210Reader(ser)
     sample_count = 0
+    last_stats = time.monotonic()
     
     try:
         while True:
-            if simulate_mode:
-                line = generate_simulated_serial_line()
-                time.sleep(0.05)  # Simula lectura de serie
-            else:
-                line = ser.readline().decode(errors="ignore")
-                
-            if not line:
-                continue
-
-            vin, iin, w = parse_line(line)
-
-            # Actualiza valores si se detectaron
-            if vin is not None:
-                vin_val = vin
-            if iin is not None:
-                iin_val = iin
-            if w is not None:
-                w_val = w
-
-            # Si tenemos un conjunto completo, lo guardamos
-            if vin_val is not None and iin_val is not None and w_val is not None:
-                row = {
-                    'timestamp': datetime.now().isoformat(),
-                    'Vin': vin_val,
-                    'Iin': iin_val,
-                    'W': w_val
-                }
-                csv_writer.writerow(row)
-                csv_f.flush()
+            # Procesa todo lo que haya llegado; sin espera fija entre líneas
+            for vin_val, iin_val, w_val in reader.poll():
+                timestamp = time.time_ns() if binary else datetime.now().isoformat()
+                sink.writerow([timestamp, vin_val, iin_val, w_val])
                 sample_count += 1
                 status = f"[{sample_count:3d}]" if simulate_mode else ""
                 print(f"{status} Guardado: Vin={vin_val:7.2f}V | Iin={iin_val:6.3f}A | W={w_val:7.2f}W")
 
-                # Reset para esperar la siguiente serie
-                vin_val, iin_val, w_val = None, None, None
-                
                 # Control de muestras en simulación
                 if simulate_mode and num_samples > 0 and sample_count >= num_samples:
-                    print(f"\n✓ Simulación completada: {sample_count} muestras generadas")
                     break
-            # Opcional: pequeña espera para no saturar CPU
-            time.sleep(0.1)
+
+            if simulate_mode and num_samples > 0 and sample_count >= num_samples:
+                print(f"\n✓ Simulación completada: {sample_count} muestras generadas")
+                break
+
+            # Si el equipo deja de enviar, lo pendiente no se queda en memoria
+            sink.maybe_flush()
+
+            if args.stats_interval > 0 and time.monotonic() - last_stats >= args.stats_interval:
+                last_stats = time.monotonic()
+                st = reader.stats()
+                print(
+                    f"📈 {st['rate_hz']:.2f} muestras/s (media {st['mean_rate_hz']:.2f}) | "
+                    f"backlog {st['backlog_bytes']} B (máx {st['max_backlog_bytes']} B) | "
+                    f"líneas descartadas {st['bad_lines']}/{st['lines']}"
+                )
 
     except KeyboardInterrupt:
         print(f"\n\nDetenido por el usuario después de {sample_count} muestras.")
+    except OSError as e:
+        # SerialException hereda de OSError: puerto desconectado a mitad de lectura
+        print(f"\n❌ Error de lectura en {serial_port} tras {sample_count} muestras: {e}")
     finally:
-        if not simulate_mode:
-            ser.close()
-        csv_f.close()
+        ser.close()
+        sink.close()
         print(f"✓ Datos guardados en: {csv_file}")
 
 if __name__ == "__main__":
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# vatimetro_acquisition.py
+#
+# Adquisición por eventos del WT210.
+# En lugar de readline() + sleep fijo, se lee todo lo que haya en el buffer
+# del puerto (in_waiting) y se emite una muestra en cuanto se completa el
+# trío V/A/W. Si no hay nada pendiente, read(1) bloquea como mucho el timeout
+# del puerto, así que no se consume CPU en vacío.
+#
+# Funciona con cualquier objeto tipo pyserial (Serial, serial_for_url("loop://"),
+# un pty...) que tenga read() e in_waiting.
+#
+# SharedClock es el reloj común con el que multi_acquisition.py y
+# WC_scripts/serial_hub.py marcan las muestras de varios equipos.
+
+import time
+from datetime import datetime, timedelta
+
+from vatimetro_parser import CH_VIN, CH_IIN, parse_raw
+
+
+class SharedClock:
+    """Reloj común: ns monotónicos desde el arranque, anclados a la hora de pared inicial"""
+
+    def __init__(self):
+        self.t0_ns = time.monotonic_ns()
+        self.wall0 = datetime.now()
+
+    def now_ns(self):
+        return time.monotonic_ns() - self.t0_ns
+
+    def isoformat(self, t_ns):
+        return (self.wall0 + timedelta(microseconds=t_ns // 1000)).isoformat()
+
+
+class SampleAssembler:
+    """Junta lecturas sueltas V/A/W en muestras completas (Vin, Iin, W)"""
+
+    def __init__(self):
+        self.vin, self.iin, self.w = None, None, None
+
+    def feed(self, channel, value):
+        """Añade una lectura; devuelve (Vin, Iin, W) si se completa la serie, si no None"""
+        if channel == CH_VIN:
+            self.vin = value
+        elif channel == CH_IIN:
+            self.iin = value
+        else:
+            self.w = value
+
+        if self.vin is None or self.iin is None or self.w is None:
+            return None
+        sample = (self.vin, self.iin, self.w)
+        # Reset para esperar la siguiente serie
+        self.vin, self.iin, self.w = None, None, None
+        return sample
+
+
+class WT210Reader:
+    """Lee el buffer serie por bloques y devuelve muestras en cuanto están completas"""
+
+    def __init__(self, ser, max_chunk=4096):
+        self.ser = ser
+        self.max_chunk = max_chunk
+        self.assembler = SampleAssembler()
+        self._buf = bytearray()
+
+        # Métricas
+        self.bytes_read = 0
+        self.lines = 0
+        self.bad_lines = 0
+        self.samples = 0
+        self.backlog_bytes = 0
+        self.max_backlog_bytes = 0
+        self._t_start = time.monotonic()
+        self._t_last_stats = self._t_start
+        self._samples_last_stats = 0
+
+    def poll(self):
+        """Lee lo que haya disponible y devuelve la lista de muestras completas"""
+        waiting = self.ser.in_waiting
+        # Lo que ya estaba esperando al entrar es el retraso acumulado
+        self.backlog_bytes = waiting
+        if waiting > self.max_backlog_bytes:
+            self.max_backlog_bytes = waiting
+
+        data = self.ser.read(min(waiting, self.max_chunk) if waiting else 1)
+        if not data:
+            return []
+        self.bytes_read += len(data)
+
+        buf = self._buf
+        buf += data
+        if b"\n" not in data:
+            return []
+
+        samples = []
+        start = 0
+        while True:
+            end = buf.find(b"\n", start)
+            if end == -1:
+                break
+            raw = bytes(buf[start:end])
+            start = end + 1
+            if not raw.strip():
+                continue
+            self.lines += 1
+            reading = parse_raw(raw)
+            if reading is None:
+                self.bad_lines += 1
+                continue
+            sample = self.assembler.feed(*reading)
+            if sample is not None:
+                samples.append(sample)
+        del buf[:start]
+
+        self.samples += len(samples)
+        return samples
+
+    def stats(self):
+        """Métricas desde la última llamada: tasa lograda, backlog y líneas descartadas"""
+        now = time.monotonic()
+        dt = now - self._t_last_stats
+        rate = (self.samples - self._samples_last_stats) / dt if dt > 0 else 0.0
+        self._t_last_stats = now
+        self._samples_last_stats = self.samples
+        total = now - self._t_start
+        return {
+            "samples": self.samples,
+            "rate_hz": rate,
+            "mean_rate_hz": self.samples / total if total > 0 else 0.0,
+            "backlog_bytes": self.backlog_bytes + len(self._buf),
+            "max_backlog_bytes": self.max_backlog_bytes,
+            "lines": self.lines,
+            "bad_lines": self.bad_lines,
+        }
@@ -0,0 +1,391 @@
+#!/usr/bin/env python3
+# vatimetro_binlog.py
+#
+# Formato binario por columnas para las sesiones de los vatímetros.
+#
+#   cabecera: b"VTMBIN1\0" | u16 versión | u16 nº columnas
+#             por columna: u8 longitud + nombre utf-8 + 1 byte de tipo ('q', 'f', 'd')
+#             relleno con ceros hasta múltiplo de 8
+#   bloques:  b"CHNK" | u32 nº filas | columna 0 | columna 1 | ...
+#             cada columna son nº filas valores little-endian, rellena hasta múltiplo de 8
+#
+# La primera columna es siempre t_ns (int64, ns desde epoch). Los bloques se
+# escriben completos de una vez, así que tras un corte como mucho queda un
+# bloque a medias al final, que el lector ignora y el escritor recorta.
+#
+# El escritor solo usa la librería estándar (array); el lector con memmap
+# devuelve arrays de NumPy sin parsear nada.
+#
+# Uso como conversor:
+#   python vatimetro_binlog.py to-bin vatimetro_data.csv vatimetro_data.bin
+#   python vatimetro_binlog.py to-csv vatimetro_data.bin vatimetro_data.csv
+#   python vatimetro_binlog.py info vatimetro_data.bin
+
+import argparse
+import csv
+import math
+import os
+import re
+import struct
+import sys
+import time
+from array import array
+from datetime import datetime
+
+MAGIC = b"VTMBIN1\0"
+VERSION = 1
+CHUNK_MAGIC = b"CHNK"
+CHUNK_HEADER = struct.Struct("<4sI")
+TIME_COLUMN = "t_ns"
+
+DEFAULT_COLUMNS = [("Vin", "f"), ("Iin", "f"), ("W", "f"), ("F", "f")]
+DEFAULT_CHUNK_ROWS = 4096
+DEFAULT_FLUSH_INTERVAL = 5.0  # segundos
+
+_SWAP = sys.byteorder != "little"
+_NUMPY_DTYPES = {"q": "<i8", "f": "<f4", "d": "<f8"}
+
+
+def _pad8(n):
+    return (-n) % 8
+
+
+def _encode_header(columns):
+    out = bytearray(MAGIC)
+    out += struct.pack("<HH", VERSION, len(columns))
+    for name, code in columns:
+        raw = name.encode("utf-8")
+        out += struct.pack("<B", len(raw)) + raw + code.encode("ascii")
+    out += b"\0" * _pad8(len(out))
+    return bytes(out)
+
+
+def _read_header(f):
+    """Lee la cabecera; devuelve (columnas, offset del primer bloque)"""
+    if f.read(len(MAGIC)) != MAGIC:
+        raise ValueError("No es un fichero VTMBIN")
+    version, ncols = struct.unpack("<HH", f.read(4))
+    if version != VERSION:
+        raise ValueError(f"Versión VTMBIN no soportada: {version}")
+    columns = []
+    for _ in range(ncols):
+        (n,) = struct.unpack("<B", f.read(1))
+        name = f.read(n).decode("utf-8")
+        code = f.read(1).decode("ascii")
+        columns.append((name, code))
+    pos = f.tell()
+    pos += _pad8(pos)
+    return columns, pos
+
+
+def _chunk_size(columns, nrows):
+    size = CHUNK_HEADER.size
+    for _, code in columns:
+        nbytes = nrows * array(code).itemsize
+        size += nbytes + _pad8(nbytes)
+    return size
+
+
+def _iter_chunk_offsets(f, columns, start):
+    """Genera (offset de datos, nº filas) de cada bloque completo"""
+    end = f.seek(0, os.SEEK_END)
+    pos = start
+    while pos + CHUNK_HEADER.size <= end:
+        f.seek(pos)
+        magic, nrows = CHUNK_HEADER.unpack(f.read(CHUNK_HEADER.size))
+        if magic != CHUNK_MAGIC:
+            break
+        size = _chunk_size(columns, nrows)
+        if pos + size > end:
+            break  # bloque a medias tras un corte
+        yield pos + CHUNK_HEADER.size, nrows
+        pos += size
+
+
+def recover_bin(path, columns):
+    """Recorta un bloque incompleto al final del fichero. Devuelve los bytes eliminados"""
+    with open(path, "rb+") as f:
+        file_columns, pos = _read_header(f)
+        if file_columns != columns:
+            raise ValueError(f"{path}: columnas {file_columns} distintas de {columns}")
+        for data_pos, nrows in _iter_chunk_offsets(f, columns, pos):
+            pos = data_pos - CHUNK_HEADER.size + _chunk_size(columns, nrows)
+        end = f.seek(0, os.SEEK_END)
+        if end > pos:
+            f.truncate(pos)
+        return end - pos
+
+
+class BinarySink:
+    """Escritor VTMBIN con la misma interfaz que CsvSink (writerow/flush/close).
+    Cada fila es [t_ns, valor1, valor2, ...] en el orden de 'columns'."""
+
+    def __init__(self, path, columns=DEFAULT_COLUMNS, mode="a",
+                 flush_rows=DEFAULT_CHUNK_ROWS, flush_interval=DEFAULT_FLUSH_INTERVAL, fsync=False):
+        self.path = path
+        self.columns = [(TIME_COLUMN, "q")] + [(name, code) for name, code in columns]
+        self.flush_rows = max(1, flush_rows)
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+
+        self.recovered_bytes = 0
+        if mode == "a" and os.path.exists(path) and os.path.getsize(path) > 0:
+            self.recovered_bytes = recover_bin(path, self.columns)
+            self._f = open(path, "ab")
+        else:
+            self._f = open(path, "wb")
+            self._f.write(_encode_header(self.columns))
+
+        self._buffers = [array(code) for _, code in self.columns]
+        self.rows = 0
+        self.chunks = 0
+        self._last_flush = time.monotonic()
+
+    def writerow(self, row):
+        """Añade una fila; None en un valor se guarda como NaN"""
+        bufs = self._buffers
+        bufs[0].append(int(row[0]))
+        for buf, value in zip(bufs[1:], row[1:]):
+            buf.append(math.nan if value is None or value == "" else value)
+        self.rows += 1
+        if len(bufs[0]) >= self.flush_rows:
+            self.flush()
+        elif time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def write_columns(self, t_ns, values):
+        """Escribe un bloque directamente desde arrays (array.array o NumPy) ya alineados"""
+        self.flush()
+        data = [t_ns] + [values[name] for name, _ in self.columns[1:]]
+        self._write_chunk(len(t_ns), [_as_le_bytes(col, code) for col, (_, code) in zip(data, self.columns)])
+        self.rows += len(t_ns)
+        self._flush_file()
+
+    def _write_chunk(self, nrows, blobs):
+        parts = [CHUNK_HEADER.pack(CHUNK_MAGIC, nrows)]
+        for blob in blobs:
+            parts.append(blob)
+            parts.append(b"\0" * _pad8(len(blob)))
+        # Un solo write por bloque: si se corta, el lector lo descarta entero
+        self._f.write(b"".join(parts))
+        self.chunks += 1
+
+    def _flush_file(self):
+        self._f.flush()
+        if self.fsync:
+            os.fsync(self._f.fileno())
+        self._last_flush = time.monotonic()
+
+    def maybe_flush(self):
+        """Vuelca si hay filas pendientes y ha vencido el intervalo (para llamar en vacío)"""
+        if len(self._buffers[0]) and time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """Escribe las filas pendientes como un bloque"""
+        bufs = self._buffers
+        if len(bufs[0]):
+            self._write_chunk(len(bufs[0]), [_as_le_bytes(buf, buf.typecode) for buf in bufs])
+            self._buffers = [array(code) for _, code in self.columns]
+        self._flush_file()
+
+    def close(self):
+        if self._f.closed:
+            return
+        try:
+            self.flush()
+        finally:
+            self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def _as_le_bytes(values, code):
+    """Bytes little-endian de un array.array, array de NumPy o secuencia"""
+    if hasattr(values, "dtype"):
+        return values.astype(_NUMPY_DTYPES[code], copy=False).tobytes()
+    if not isinstance(values, array) or values.typecode != code:
+        values = array(code, values)
+    if _SWAP:
+        values = array(code, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def read_columns(path):
+    """Lee un fichero VTMBIN con memmap y devuelve {columna: numpy.ndarray}.
+    Con un solo bloque los arrays son vistas del fichero (sin copia)."""
+    import numpy as np
+
+    with open(path, "rb") as f:
+        columns, start = _read_header(f)
+        chunks = list(_iter_chunk_offsets(f, columns, start))
+
+    mm = np.memmap(path, dtype=np.uint8, mode="r")
+    parts = {name: [] for name, _ in columns}
+    for data_pos, nrows in chunks:
+        off = data_pos
+        for name, code in columns:
+            dtype = np.dtype(_NUMPY_DTYPES[code])
+            parts[name].append(np.frombuffer(mm, dtype=dtype, count=nrows, offset=off))
+            nbytes = nrows * dtype.itemsize
+            off += nbytes + _pad8(nbytes)
+
+    result = {}
+    for name, code in columns:
+        chunks_ = parts[name]
+        if len(chunks_) == 1:
+            result[name] = chunks_[0]
+        elif chunks_:
+            result[name] = np.concatenate(chunks_)
+        else:
+            result[name] = np.empty(0, dtype=_NUMPY_DTYPES[code])
+    return result
+
+
+def iter_chunks(path):
+    """Genera un dict {columna: array.array} por bloque (sin NumPy)"""
+    with open(path, "rb") as f:
+        columns, start = _read_header(f)
+        for data_pos, nrows in list(_iter_chunk_offsets(f, columns, start)):
+            f.seek(data_pos)
+            chunk = {}
+            for name, code in columns:
+                values = array(code)
+                nbytes = nrows * values.itemsize
+                values.frombytes(f.read(nbytes))
+                if _SWAP:
+                    values.byteswap()
+                f.seek(_pad8(nbytes), os.SEEK_CUR)
+                chunk[name] = values
+            yield chunk
+
+
+def read_info(path):
+    """Columnas, nº de bloques y nº de filas de un fichero VTMBIN"""
+    with open(path, "rb") as f:
+        columns, start = _read_header(f)
+        chunks = list(_iter_chunk_offsets(f, columns, start))
+    return {"columns": columns, "chunks": len(chunks), "rows": sum(n for _, n in chunks)}
+
+
+# ====== CSV <-> binario ======
+
+_UNIT_SUFFIX = re.compile(r"\s*\(.*\)\s*$")
+
+
+def datetime_to_ns(dt):
+    """datetime (local si no tiene zona) -> ns desde epoch, sin perder microsegundos"""
+    return int(dt.replace(microsecond=0).timestamp()) * 1_000_000_000 + dt.microsecond * 1000
+
+
+def ns_to_isoformat(t_ns):
+    seconds, ns = divmod(int(t_ns), 1_000_000_000)
+    return datetime.fromtimestamp(seconds).replace(microsecond=ns // 1000).isoformat()
+
+
+def _normalize_header(name):
+    """'Vin (V)' -> 'Vin', 'Timestamp' -> 't_ns'"""
+    name = _UNIT_SUFFIX.sub("", name.strip())
+    if name.lower() in ("timestamp", "time", "t"):
+        return TIME_COLUMN
+    return name
+
+
+def read_session_csv(path):
+    """Lee cualquiera de los CSV de sesión del vatímetro (',' o ';', con o sin
+    unidades, comillas o BOM). Devuelve (nombres de columna, filas [t_ns, v1, ...])"""
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        first = f.readline()
+        delimiter = ";" if first.count(";") > first.count(",") else ","
+        f.seek(0)
+        reader = csv.reader(f, delimiter=delimiter)
+        header = [_normalize_header(h) for h in next(reader)]
+        if TIME_COLUMN not in header:
+            raise ValueError(f"{path}: no hay columna de timestamp en {header}")
+        t_idx = header.index(TIME_COLUMN)
+        value_idx = [i for i, h in enumerate(header) if i != t_idx and h]
+        names = [header[i] for i in value_idx]
+
+        rows = []
+        for rec in reader:
+            if len(rec) <= t_idx or not rec[t_idx].strip():
+                continue
+            try:
+                t_ns = datetime_to_ns(datetime.fromisoformat(rec[t_idx].strip()))
+            except ValueError:
+                continue
+            values = []
+            for i in value_idx:
+                txt = rec[i].strip() if i < len(rec) else ""
+                try:
+                    values.append(float(txt) if txt and txt != "None" else math.nan)
+                except ValueError:
+                    values.append(math.nan)
+            rows.append([t_ns, *values])
+    return names, rows
+
+
+def csv_to_bin(csv_path, bin_path, dtype="f"):
+    names, rows = read_session_csv(csv_path)
+    with BinarySink(bin_path, [(name, dtype) for name in names], mode="w") as sink:
+        for row in rows:
+            sink.writerow(row)
+    return len(rows)
+
+
+def bin_to_csv(bin_path, csv_path, delimiter=","):
+    """Escribe el CSV en el formato de vatimetro.py (timestamp ISO + columnas)"""
+    with open(bin_path, "rb") as f:
+        columns, _ = _read_header(f)
+    names = [name for name, _ in columns[1:]]
+    formats = ["{:.7g}" if code == "f" else "{!r}" for _, code in columns[1:]]
+    n = 0
+    with open(csv_path, "w", newline="", encoding="utf-8") as out:
+        writer = csv.writer(out, delimiter=delimiter)
+        writer.writerow(["timestamp", *names])
+        for chunk in iter_chunks(bin_path):
+            cols = [chunk[name] for name in names]
+            for i, t_ns in enumerate(chunk[TIME_COLUMN]):
+                writer.writerow([
+                    ns_to_isoformat(t_ns),
+                    *("" if math.isnan(col[i]) else fmt.format(col[i]) for col, fmt in zip(cols, formats)),
+                ])
+                n += 1
+    return n
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Conversor CSV <-> binario (VTMBIN) de sesiones del vatímetro")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("to-bin", help="CSV -> VTMBIN")
+    p.add_argument("input")
+    p.add_argument("output")
+    p.add_argument("--f64", action="store_true", help="Guardar valores en float64 (default: float32)")
+    p = sub.add_parser("to-csv", help="VTMBIN -> CSV")
+    p.add_argument("input")
+    p.add_argument("output")
+    p.add_argument("-d", "--delimiter", default=",", help="Separador del CSV (default: ',')")
+    p = sub.add_parser("info", help="Resumen de un fichero VTMBIN")
+    p.add_argument("input")
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    if args.cmd == "to-bin":
+        n = csv_to_bin(args.input, args.output, dtype="d" if args.f64 else "f")
+    elif args.cmd == "to-csv":
+        n = bin_to_csv(args.input, args.output, args.delimiter)
+    else:
+        info = read_info(args.input)
+        cols = ", ".join(f"{name}:{code}" for name, code in info["columns"])
+        print(f"{args.input}: {info['rows']} filas en {info['chunks']} bloques | columnas {cols}")
+        return
+    print(f"✓ {n} filas {args.input} -> {args.output} en {time.perf_counter() - t0:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+# vatimetro_energy.py
+#
+# Integrador de energía en streaming para el flujo de W del vatímetro.
+# Integra por trapecios sobre los timestamps reales, con memoria O(1)
+# (solo la última muestra y un acumulador por fase). Las fases se abren y
+# cierran con los comandos start/stop que publica WC_scripts/mqtt_gui.py
+# (measurement "control", fields.cmd / fields.text, "ts" en segundos epoch).
+# Si un cambio de fase cae entre dos muestras, el trapecio se reparte
+# interpolando W en el instante del cambio.
+#
+# El instante del cambio debe estar en la misma base de tiempos que las
+# muestras: el "ts" del mensaje viene del reloj del PC de mqtt_gui.py, así
+# que el puente pasa su propio time.time() al recibirlo (handle_control(..., t)).
+# Una fase se da por cerrada cuando las muestras alcanzan el stop (o el
+# start de otra fase); pop_closed() devuelve entonces su total completo,
+# incluido el último trapecio parcial.
+#
+# Comprobación rápida: python vatimetro_energy.py
+
+import json
+
+DEFAULT_MAX_GAP = 10.0  # s: huecos mayores no se integran (equipo desconectado)
+
+
+class EnergyIntegrator:
+    """Acumula julios totales y por fase a partir de muestras (t, W)"""
+
+    def __init__(self, max_gap=DEFAULT_MAX_GAP):
+        self.max_gap = max_gap
+        self.total_j = 0.0
+        self.phase = None
+        self.phase_j = {}        # fase -> J acumulados
+        self.phase_start = {}    # fase -> t de inicio
+        self._last_t = None
+        self._last_w = None
+        self._boundaries = []    # cambios de fase aún no alcanzados por las muestras
+        self._closed = []        # fases cerradas pendientes de pop_closed()
+
+    def add(self, t, w):
+        """Añade una muestra de potencia w (W) en el instante t (s)"""
+        last_t, last_w = self._last_t, self._last_w
+        self._last_t, self._last_w = t, w
+        if last_t is None:
+            self._apply_boundaries(t)
+            return
+        dt = t - last_t
+        if dt <= 0 or dt > self.max_gap:
+            self._apply_boundaries(t)
+            return
+
+        # Reparte el trapecio entre las fases que se abren/cierran dentro del intervalo
+        seg_t, seg_w = last_t, last_w
+        while self._boundaries and self._boundaries[0][0] <= t:
+            tb, new_phase = self._boundaries.pop(0)
+            tb = max(tb, seg_t)
+            wb = last_w + (w - last_w) * (tb - last_t) / dt
+            self._accumulate(0.5 * (seg_w + wb) * (tb - seg_t))
+            self._set_phase(tb, new_phase)
+            seg_t, seg_w = tb, wb
+        self._accumulate(0.5 * (seg_w + w) * (t - seg_t))
+
+    def _accumulate(self, joules):
+        self.total_j += joules
+        if self.phase is not None:
+            self.phase_j[self.phase] = self.phase_j.get(self.phase, 0.0) + joules
+
+    def _set_phase(self, t, phase):
+        """Cambia de fase en t; la que estuviera abierta queda en _closed"""
+        if self.phase is not None:
+            start = self.phase_start.get(self.phase)
+            self._closed.append({
+                "phase": self.phase,
+                "E_J": self.phase_j.get(self.phase, 0.0),
+                "start": start,
+                "end": t,
+                "duration_s": t - start if start is not None else None,
+            })
+        if phase is not None:
+            self.phase_start[phase] = t
+        self.phase = phase
+
+    def _apply_boundaries(self, t):
+        while self._boundaries and self._boundaries[0][0] <= t:
+            tb, phase = self._boundaries.pop(0)
+            self._set_phase(tb, phase)
+
+    def _schedule(self, t, phase):
+        if t is None:
+            t = self._last_t if self._last_t is not None else 0.0
+        if self._last_t is not None and t <= self._last_t:
+            # El cambio llega tarde respecto a las muestras: se aplica desde ya
+            self._set_phase(self._last_t, phase)
+        else:
+            self._boundaries.append((t, phase))
+
+    def pop_closed(self):
+        """Fases cerradas desde la llamada anterior: dicts phase/E_J/start/end/duration_s"""
+        closed, self._closed = self._closed, []
+        return closed
+
+    def start_phase(self, name, t=None):
+        """Abre la fase 'name' en t (por defecto, en la última muestra)"""
+        self.phase_j.setdefault(name, 0.0)
+        self._schedule(t, name)
+
+    def stop_phase(self, t=None):
+        """Cierra la fase actual en t; devuelve su nombre (o None). El total sale por pop_closed()"""
+        name = self._boundaries[-1][1] if self._boundaries else self.phase
+        self._schedule(t, None)
+        return name
+
+    def handle_control(self, payload, t=None):
+        """Aplica un mensaje de control de mqtt_gui.py (dict ya decodificado).
+        t: instante del comando en la base de tiempos de las muestras (por
+        defecto el "ts" del mensaje, del reloj de mqtt_gui.py).
+        Devuelve ('start'|'stop', fase) si cambió algo, si no None."""
+        if payload.get("measurement") != "control":
+            return None
+        fields = payload.get("fields") or {}
+        cmd = fields.get("cmd")
+        ts = t if t is not None else payload.get("ts")
+        if cmd == "start":
+            name = (fields.get("text") or "").strip() or f"fase_{len(self.phase_j) + 1}"
+            self.start_phase(name, ts)
+            return "start", name
+        if cmd == "stop":
+            return "stop", self.stop_phase(ts)
+        return None
+
+    def fields(self):
+        """Campos para añadir al payload de potencia"""
+        out = {"E_J": round(self.total_j, 3)}
+        if self.phase is not None:
+            out["phase"] = self.phase
+            out["E_phase_J"] = round(self.phase_j.get(self.phase, 0.0), 3)
+        return out
+
+
+def decode_control(raw):
+    """Decodifica un mensaje MQTT solo si puede ser de control (evita json.loads del resto)"""
+    if b'"control"' not in raw:
+        return None
+    try:
+        payload = json.loads(raw)
+    except (ValueError, UnicodeDecodeError):
+        return None
+    return payload if isinstance(payload, dict) else None
+
+
+if __name__ == "__main__":
+    # Stop posterior a la última muestra: el total se publica al alcanzarlo,
+    # con el trapecio parcial incluido (100 W de 0.5 a 2.5 s = 200 J)
+    energy = EnergyIntegrator()
+    energy.add(0, 100)
+    energy.start_phase("fase", 0.5)
+    energy.add(1, 100)
+    energy.add(2, 100)
+    energy.stop_phase(2.5)
+    assert energy.pop_closed() == [], "la fase no debe cerrarse antes de que las muestras lleguen al stop"
+    energy.add(3, 100)
+    closed = energy.pop_closed()
+    assert len(closed) == 1 and closed[0]["phase"] == "fase", closed
+    assert abs(closed[0]["E_J"] - 200.0) < 1e-9, closed
+    assert closed[0]["E_J"] == energy.phase_j["fase"]
+    assert closed[0]["duration_s"] == 2.0, closed
+    assert abs(energy.total_j - 300.0) < 1e-9, energy.total_j
+
+    # Stop que llega tarde (ya hay muestras posteriores): se cierra en la última muestra
+    energy.start_phase("tarde", 3.5)
+    energy.add(4, 50)
+    energy.stop_phase(3.9)
+    closed = energy.pop_closed()
+    assert len(closed) == 1 and closed[0]["end"] == 4 and closed[0]["duration_s"] == 0.5, closed
+    print("✓ vatimetro_energy OK")
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# vatimetro_parser.py
+#
+# Parser común de las líneas serie del vatímetro WT210 ("V  0N  230.45").
+# Trabaja directamente sobre los bytes de ser.readline(): despacha por el
+# primer byte (V/A/W) y convierte el valor sin decodificar la línea entera.
+# Si la línea no tiene la forma esperada se recurre a una única expresión
+# regular (una sola pasada) con la misma semántica que las antiguas RE_V/RE_A/RE_W.
+
+import re
+
+# Canales: nombres de columna que usan los CSV y los payload MQTT
+CH_VIN = "Vin"
+CH_IIN = "Iin"
+CH_W = "W"
+
+# Primer byte de la línea -> canal
+_DISPATCH = {
+    ord("V"): CH_VIN,
+    ord("A"): CH_IIN,
+    ord("W"): CH_W,
+}
+
+# Camino lento: una sola búsqueda para los tres canales
+_RE_ANY = re.compile(rb"([VAW])\s+\dN\s+([0-9.E+-]+)")
+_LETTER_TO_CHANNEL = {b"V": CH_VIN, b"A": CH_IIN, b"W": CH_W}
+
+
+def _parse_slow(raw):
+    """Busca todas las lecturas de la línea con una sola expresión regular"""
+    found = []
+    for m in _RE_ANY.finditer(raw):
+        try:
+            found.append((_LETTER_TO_CHANNEL[m.group(1)], float(m.group(2))))
+        except ValueError:
+            continue
+    return found
+
+
+def _parse_fast(raw):
+    """Camino rápido para la forma canónica [b"V", b"0N", b"230.45"]"""
+    channel = _DISPATCH.get(raw[0])
+    if channel is None:
+        return None
+    parts = raw.split(None, 3)
+    if len(parts) != 3 or len(parts[0]) != 1:  # "VA"/"VAR" no son V
+        return None
+    tag = parts[1]
+    if len(tag) != 2 or tag[1] != 78 or not 48 <= tag[0] <= 57:  # "\dN"
+        return None
+    try:
+        return channel, float(parts[2])
+    except ValueError:
+        return None
+
+
+def parse_raw(raw):
+    """Devuelve (canal, valor) de una línea serie en bytes, o None si no hay lectura"""
+    if not raw:
+        return None
+    reading = _parse_fast(raw)
+    if reading is not None:
+        return reading
+    found = _parse_slow(raw)
+    return found[0] if found else None
+
+
+def iter_readings(lines):
+    """Genera tuplas (canal, valor) a partir de un iterable de líneas en bytes"""
+    for raw in lines:
+        reading = parse_raw(raw)
+        if reading is not None:
+            yield reading
+
+
+def parse_line(line):
+    """Intenta extraer Vin, Iin o W de una línea serie (str o bytes)"""
+    if isinstance(line, str):
+        line = line.encode("ascii", "ignore")
+    vin, iin, w = None, None, None
+    if not line:
+        return vin, iin, w
+
+    # Una línea normal lleva un único canal; si trae más se usan todos
+    reading = _parse_fast(line)
+    readings = [reading] if reading is not None else _parse_slow(line)
+    for channel, value in readings:
+        if channel == CH_VIN:
+            vin = value
+        elif channel == CH_IIN:
+            iin = value
+        else:
+            w = value
+
+    return vin, iin, w
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+# vatimetro_replay.py
+#
+# Reproduce una sesión grabada como si fuera el WT210: escribe líneas
+# "V  0N ..." / "A  0N ..." / "W  0N ..." en un pty (solo Linux/macOS), para
+# medir de punta a punta vatimetro.py, app_vatimetro.py o test.py sin el equipo.
+#
+# Entradas aceptadas:
+#   - cualquier CSV de sesión (vatimetro.py, app_vatimetro.py, simulador)
+#   - fichero binario VTMBIN (vatimetro_binlog.py)
+#   - captura serie cruda: una línea del equipo por fila (sin tiempos), o el
+#     CSV "Timestamp,Medicion" que guarda wt210.py (con tiempos)
+#
+# Uso:
+#   python vatimetro_replay.py vatimetro_test.csv                # tiempos originales
+#   python vatimetro_replay.py sesion.bin --speed 10             # 10x más rápido
+#   python vatimetro_replay.py vatimetro_bulk.txt --max --check salida.csv
+#   (en otra consola) python vatimetro.py -p /dev/pts/N -f salida.csv
+
+import argparse
+import csv
+import math
+import os
+import time
+import tty
+from datetime import datetime
+
+from vatimetro_binlog import MAGIC, TIME_COLUMN, datetime_to_ns, iter_chunks, read_info, read_session_csv
+
+LINE_FORMATS = (("Vin", "V  0N  {:.2f}\r\n"), ("Iin", "A  0N  {:.3f}\r\n"), ("W", "W  0N  {:.2f}\r\n"))
+
+
+def _sample_lines(values):
+    """{Vin, Iin, W} -> bytes con las tres líneas del WT210 (omite NaN)"""
+    out = []
+    for name, fmt in LINE_FORMATS:
+        value = values.get(name)
+        if value is not None and not math.isnan(value):
+            out.append(fmt.format(value))
+    return "".join(out).encode()
+
+
+def _detect_kind(path):
+    with open(path, "rb") as f:
+        head = f.read(len(MAGIC))
+        if head == MAGIC:
+            return "bin"
+        f.seek(0)
+        first = f.readline().decode("utf-8-sig", errors="ignore").strip().lower()
+    if "medicion" in first:
+        return "capture_csv"
+    if "timestamp" in first:
+        return "csv"
+    return "raw"
+
+
+def load_events(path):
+    """Devuelve (lista de (t_ns o None, bytes), nº de muestras)"""
+    kind = _detect_kind(path)
+    events = []
+
+    if kind == "bin":
+        for chunk in iter_chunks(path):
+            names = [name for name in chunk if name != TIME_COLUMN]
+            for i, t_ns in enumerate(chunk[TIME_COLUMN]):
+                events.append((t_ns, _sample_lines({name: chunk[name][i] for name in names})))
+        return events, len(events)
+
+    if kind == "csv":
+        names, rows = read_session_csv(path)
+        for row in rows:
+            events.append((row[0], _sample_lines(dict(zip(names, row[1:])))))
+        return events, len(events)
+
+    if kind == "capture_csv":
+        with open(path, newline="", encoding="utf-8-sig") as f:
+            reader = csv.reader(f)
+            next(reader)
+            for rec in reader:
+                if len(rec) < 2:
+                    continue
+                try:
+                    t_ns = datetime_to_ns(datetime.fromisoformat(rec[0].strip()))
+                except ValueError:
+                    t_ns = None
+                events.append((t_ns, rec[1].strip().encode() + b"\r\n"))
+    else:
+        with open(path, "rb") as f:
+            for raw in f:
+                raw = raw.rstrip(b"\r\n")
+                if raw:
+                    events.append((None, raw + b"\r\n"))
+
+    samples = sum(1 for _, line in events if line[:1] == b"W")
+    return events, samples
+
+
+def count_received(path):
+    """Filas de datos en la salida del script bajo prueba (CSV o VTMBIN)"""
+    if not os.path.exists(path):
+        return 0
+    with open(path, "rb") as f:
+        is_bin = f.read(len(MAGIC)) == MAGIC
+    if is_bin:
+        return read_info(path)["rows"]
+    with open(path, "rb") as f:
+        lines = sum(1 for line in f if line.strip())
+    return max(0, lines - 1)  # sin cabecera
+
+
+def replay(fd, events, speed=1.0, max_speed=False, line_rate=30.0, baud=0):
+    """Escribe los eventos en fd respetando los tiempos. Devuelve (bytes, líneas, segundos)"""
+    byte_time = 10.0 / baud if baud else 0.0
+    t_start = time.perf_counter()
+    first_t = None
+    due = 0.0
+    sent_bytes = sent_lines = 0
+
+    for t_ns, data in events:
+        if not max_speed:
+            if t_ns is not None:
+                if first_t is None:
+                    first_t = t_ns
+                due = (t_ns - first_t) / 1e9 / speed
+            else:
+                due += data.count(b"\n") / line_rate / speed
+            wait = t_start + due - time.perf_counter()
+            if wait > 0:
+                time.sleep(wait)
+
+        view = memoryview(data)
+        while view:
+            n = os.write(fd, view)
+            view = view[n:]
+        sent_bytes += len(data)
+        sent_lines += data.count(b"\n")
+        if byte_time:
+            # Emula el ritmo del cable (p.ej. 9600 baudios ~ 960 bytes/s)
+            wait = t_start + sent_bytes * byte_time / (1 if max_speed else speed) - time.perf_counter()
+            if wait > 0:
+                time.sleep(wait)
+
+    return sent_bytes, sent_lines, time.perf_counter() - t_start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reproduce una sesión del vatímetro por un pty")
+    parser.add_argument("input", help="CSV de sesión, fichero VTMBIN o captura serie cruda")
+    parser.add_argument("-s", "--speed", type=float, default=1.0, help="Factor de aceleración (default: 1 = tiempos originales)")
+    parser.add_argument("--max", action="store_true", help="Sin esperas: tan rápido como lea el consumidor")
+    parser.add_argument("--line-rate", type=float, default=30.0, help="Líneas/s para capturas sin tiempos (default: 30)")
+    parser.add_argument("--baud", type=int, default=0, help="Emular el ritmo del cable a estos baudios (0 = no)")
+    parser.add_argument("--start-delay", type=float, default=3.0, help="Segundos para arrancar el consumidor antes de empezar")
+    parser.add_argument("--loop", type=int, default=1, help="Repetir la sesión N veces")
+    parser.add_argument("--check", metavar="SALIDA", help="Fichero que escribe el consumidor: informa de muestras perdidas")
+    parser.add_argument("--check-lines", action="store_true", help="Comparar con líneas enviadas (app_vatimetro.py guarda una fila por línea)")
+    parser.add_argument("--check-wait", type=float, default=2.0, help="Espera antes de contar la salida (default: 2 s)")
+    args = parser.parse_args()
+
+    events, samples = load_events(args.input)
+    if not events:
+        print(f"❌ {args.input}: no hay nada que reproducir")
+        return
+
+    master, slave = os.openpty()
+    tty.setraw(slave)
+    print(f"▶ Puerto virtual: {os.ttyname(slave)}")
+    print(f"  {len(events)} eventos, {samples} muestras x {args.loop} | "
+          f"{'máxima velocidad' if args.max else f'velocidad x{args.speed:g}'}")
+
+    received_before = count_received(args.check) if args.check else 0
+    try:
+        time.sleep(args.start_delay)
+        total_bytes = total_lines = 0
+        elapsed = 0.0
+        for _ in range(args.loop):
+            b, n, dt = replay(master, events, args.speed, args.max, args.line_rate, args.baud)
+            total_bytes += b
+            total_lines += n
+            elapsed += dt
+        print(f"✓ Enviadas {total_lines} líneas ({total_bytes} bytes) en {elapsed:.2f} s "
+              f"-> {total_lines / elapsed:,.0f} líneas/s, {samples * args.loop / elapsed:,.1f} muestras/s")
+
+        if args.check:
+            time.sleep(args.check_wait)
+            received = count_received(args.check)
+            received = received - received_before if received >= received_before else received
+            expected = total_lines if args.check_lines else samples * args.loop
+            print(f"  Recibidas {received}/{expected} -> perdidas {expected - received} "
+                  f"({(expected - received) / expected * 100:.2f} %)")
+    except KeyboardInterrupt:
+        print("\nDetenido por el usuario.")
+    finally:
+        os.close(master)
+        os.close(slave)
+
+
+if __name__ == "__main__":
+    main()
@@ -7,33 +7,19 @@
 import random
 import time
 import argparse
-import re
 import csv
 from datetime import datetime
 
-# Expresiones regulares para parsear líneas
-RE_V = re.compile(r"V\s+\dN\s+([0-9.E+-]+)")
-RE_A = re.compile(r"A\s+\dN\s+([0-9.E+-]+)")
-RE_W = re.compile(r"W\s+\dN\s+([0-9.E+-]+)")
+from vatimetro_parser import parse_line
 
-def parse_line(line):
-    """Intenta extraer Vin, Iin o W de una línea serie"""
-    line = line.strip()
-    vin, iin, w = None, None, None
+# NumPy solo hace falta para el modo 'bulk'
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
 
-    match_v = RE_V.search(line)
-    if match_v:
-        vin = float(match_v.group(1))
-    
-    match_a = RE_A.search(line)
-    if match_a:
-        iin = float(match_a.group(1))
-    
-    match_w = RE_W.search(line)
-    if match_w:
-        w = float(match_w.group(1))
-
-    return vin, iin, w
+BULK_CHUNK = 1_000_000  # muestras generadas por bloque en el modo 'bulk'
 
 
 def generate_realistic_data():
@@ -131,13 +117,126 @@ def simulate_serial_lines(num_lines=30, interval=0.3):
     print(f"\n✓ Simulación completada. Muestras completas generadas: {complete_samples}")
 
 
+class BulkGenerator:
+    """Generador vectorizado de muestras físicamente coherentes.
+
+    - W = V·I·PF
+    - deriva lenta de V e I (suma de senoides de periodo largo)
+    - escalones de carga aleatorios en I, y caída de tensión proporcional a I
+    - rizado a frecuencia de red sobre V, con la frecuencia también derivando
+      (la fase se integra muestra a muestra). Muestreado a 10 Hz, 50 Hz cae en
+      alias sobre continua: el rizado se ve como una oscilación lenta a la
+      desviación de frecuencia (F - 50 Hz), como en un medidor real
+    El estado (tiempo, fase de red y nivel de carga) se conserva entre bloques."""
+
+    def __init__(self, rate_hz=10.0, seed=None, start_ns=None, mains_hz=50.0):
+        self.rng = np.random.default_rng(seed)
+        self.dt_ns = int(round(1e9 / rate_hz))
+        self.t_ns = time.time_ns() if start_ns is None else start_ns
+        self.t0_ns = self.t_ns
+        self.mains_hz = mains_hz
+        self.mains_phase = 0.0   # rad, fase del rizado al inicio del siguiente bloque
+        self.load = 2.5          # A, nivel de carga actual
+        self.steps_per_s = 1 / 30  # un escalón de carga cada ~30 s
+        # Deriva: (amplitud, periodo en s, fase)
+        self._drift_v = [(a, p, self.rng.uniform(0, 2 * np.pi)) for a, p in ((2.0, 3600), (0.8, 600), (0.3, 60))]
+        self._drift_i = [(a, p, self.rng.uniform(0, 2 * np.pi)) for a, p in ((0.04, 900), (0.02, 120))]
+
+    @staticmethod
+    def _drift(t, terms):
+        out = np.zeros_like(t)
+        for amp, period, phase in terms:
+            out += amp * np.sin(2 * np.pi * t / period + phase)
+        return out
+
+    def next_chunk(self, n):
+        """Devuelve dict con t_ns (int64) y Vin, Iin, W, F (float64) de n muestras"""
+        rng = self.rng
+        t_ns = self.t_ns + np.arange(n, dtype=np.int64) * self.dt_ns
+        t = (t_ns - self.t0_ns) / 1e9
+        self.t_ns = int(t_ns[-1]) + self.dt_ns
+
+        # Escalones de carga: instantes aleatorios y niveles nuevos
+        dur = n * self.dt_ns / 1e9
+        n_steps = rng.poisson(dur * self.steps_per_s)
+        positions = np.sort(rng.integers(0, n, n_steps))
+        levels = np.concatenate(([self.load], rng.uniform(0.5, 4.0, n_steps)))
+        load = levels[np.searchsorted(positions, np.arange(n), side="right")]
+        self.load = float(levels[-1])
+
+        iin = load * (1 + self._drift(t, self._drift_i)) + rng.normal(0, 0.005, n)
+        iin = np.maximum(iin, 0.0)
+
+        freq = self.mains_hz + 0.02 * np.sin(2 * np.pi * t / 300) + rng.normal(0, 0.002, n)
+        # Fase integrada (no freq·t: el ruido de freq por t absoluto sería fase aleatoria)
+        step = 2 * np.pi * freq * (self.dt_ns / 1e9)
+        phase = self.mains_phase + np.cumsum(step) - step
+        self.mains_phase = float((phase[-1] + step[-1]) % (2 * np.pi))
+        ripple = 0.25 * np.sin(phase)
+        # Caída en la línea: la tensión baja cuando sube la corriente
+        vin = 230.0 + self._drift(t, self._drift_v) - 0.8 * (iin - 2.5) + ripple + rng.normal(0, 0.05, n)
+
+        pf = np.clip(0.97 - 0.02 / np.maximum(load, 0.5) + rng.normal(0, 0.003, n), 0.8, 1.0)
+        w = vin * iin * pf
+        return {"t_ns": t_ns, "Vin": vin, "Iin": iin, "W": w, "F": freq}
+
+
+def _iso_timestamps(t_ns):
+    """Array de ns desde epoch -> lista de timestamps ISO en hora local"""
+    offset = time.localtime().tm_gmtoff * 1_000_000_000
+    local = (t_ns + offset).astype("datetime64[ns]")
+    return np.datetime_as_string(local, unit="us").tolist()
+
+
+def simulate_bulk(num_samples, output_file, out_format="bin", rate_hz=10.0, seed=None):
+    """Genera num_samples muestras sin esperas y las escribe en bin, csv o líneas serie"""
+    if not NUMPY_AVAILABLE:
+        print("❌ El modo 'bulk' necesita numpy (pip install numpy)")
+        return
+
+    gen = BulkGenerator(rate_hz=rate_hz, seed=seed)
+    print(f"\n=== Generando {num_samples} muestras ({out_format}) -> {output_file} ===")
+    t0 = time.perf_counter()
+
+    if out_format == "bin":
+        from vatimetro_binlog import BinarySink
+        out = BinarySink(output_file, [("Vin", "f"), ("Iin", "f"), ("W", "f"), ("F", "f")], mode="w")
+    else:
+        out = open(output_file, "w", newline="", encoding="utf-8")
+        if out_format == "csv":
+            out.write("timestamp,Vin,Iin,W\n")
+
+    done = 0
+    try:
+        while done < num_samples:
+            n = min(BULK_CHUNK, num_samples - done)
+            chunk = gen.next_chunk(n)
+            if out_format == "bin":
+                out.write_columns(chunk["t_ns"], chunk)
+            elif out_format == "csv":
+                rows = zip(_iso_timestamps(chunk["t_ns"]), chunk["Vin"].tolist(),
+                           chunk["Iin"].tolist(), chunk["W"].tolist())
+                out.write("".join(f"{ts},{v:.2f},{i:.3f},{w:.2f}\n" for ts, v, i, w in rows))
+            else:
+                # Mismo formato que el WT210: V, A y W en líneas separadas
+                rows = zip(chunk["Vin"].tolist(), chunk["Iin"].tolist(), chunk["W"].tolist())
+                out.write("".join(f"V  0N  {v:.2f}\r\nA  0N  {i:.3f}\r\nW  0N  {w:.2f}\r\n" for v, i, w in rows))
+            done += n
+    finally:
+        out.close()
+
+    elapsed = time.perf_counter() - t0
+    print(f"✓ {done} muestras en {elapsed:.2f} s ({done / elapsed:,.0f} muestras/s)")
+
+
 def main():
     parser = argparse.ArgumentParser(description="Simulador del vatimetro")
     parser.add_argument(
         "-m", "--mode", 
-        choices=['csv', 'serial'], 
+        choices=['csv', 'serial', 'bulk'], 
         default='csv',
-        help="Modo de simulación: 'csv' (guardar directamente) o 'serial' (simular líneas serie)"
+        help="Modo de simulación: 'csv' (guardar directamente), 'serial' (simular líneas serie) "
+             "o 'bulk' (vectorizado, sin esperas, para pruebas de carga)"
     )
     parser.add_argument(
         "-n", "--num", 
@@ -156,11 +255,34 @@ def main():
         default="vatimetro_data_simulated.csv",
         help="Archivo de salida CSV"
     )
+    parser.add_argument(
+        "-f", "--format",
+        choices=['bin', 'csv', 'serial'],
+        default='bin',
+        help="Salida del modo 'bulk': binario por columnas, CSV o líneas serie del WT210"
+    )
+    parser.add_argument(
+        "-r", "--rate",
+        type=float,
+        default=10.0,
+        help="Muestras por segundo simuladas en los timestamps del modo 'bulk'"
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=None,
+        help="Semilla del modo 'bulk' (reproducible)"
+    )
     
     args = parser.parse_args()
     
     if args.mode == 'csv':
         simulate_to_csv(args.num, args.output, args.interval)
+    elif args.mode == 'bulk':
+        output = args.output
+        if output == parser.get_default("output"):
+            output = {"bin": "vatimetro_bulk.bin", "csv": "vatimetro_bulk.csv", "serial": "vatimetro_bulk.txt"}[args.format]
+        simulate_bulk(args.num, output, args.format, args.rate, args.seed)
     else:
         simulate_serial_lines(args.num, args.interval)
 
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+# vatimetro_sink.py
+#
+# Sumidero CSV para las grabaciones del vatímetro.
+# En lugar de hacer flush() en cada fila, vuelca al disco cuando se acumulan
+# N filas o ha pasado un intervalo de tiempo (lo que ocurra antes), con fsync
+# opcional. Al abrir un fichero existente en modo 'a' recorta la última fila
+# si quedó a medias tras un corte (cuelgue, apagado, kill...).
+
+import csv
+import os
+import time
+
+DEFAULT_FLUSH_ROWS = 50
+DEFAULT_FLUSH_INTERVAL = 1.0  # segundos
+
+
+def recover_csv(path):
+    """Recorta el fichero hasta la última fila completa. Devuelve los bytes eliminados"""
+    try:
+        f = open(path, "rb+")
+    except FileNotFoundError:
+        return 0
+
+    with f:
+        size = f.seek(0, os.SEEK_END)
+        if size == 0:
+            return 0
+        f.seek(size - 1)
+        if f.read(1) == b"\n":
+            return 0
+
+        # Busca hacia atrás el último salto de línea
+        pos = size
+        block = 4096
+        while pos > 0:
+            start = max(0, pos - block)
+            f.seek(start)
+            chunk = f.read(pos - start)
+            idx = chunk.rfind(b"\n")
+            if idx != -1:
+                keep = start + idx + 1
+                break
+            pos = start
+        else:
+            keep = 0
+
+        f.truncate(keep)
+        return size - keep
+
+
+class CsvSink:
+    """Escritor CSV con política de volcado por filas, por tiempo y fsync opcional"""
+
+    def __init__(self, path, header=None, mode="a", delimiter=",",
+                 flush_rows=DEFAULT_FLUSH_ROWS, flush_interval=DEFAULT_FLUSH_INTERVAL,
+                 fsync=False, encoding="utf-8"):
+        self.path = path
+        self.flush_rows = max(1, flush_rows)
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+
+        self.recovered_bytes = recover_csv(path) if mode == "a" else 0
+        self._f = open(path, mode, newline="", encoding=encoding)
+        self._writer = csv.writer(self._f, delimiter=delimiter)
+
+        self.rows = 0
+        self.flushes = 0
+        self._pending = 0
+        self._last_flush = time.monotonic()
+
+        # Escribe encabezados si el archivo está vacío
+        if header and self._f.tell() == 0:
+            self._writer.writerow(header)
+            self.flush()
+
+    def writerow(self, row):
+        """Añade una fila y vuelca si lo pide la política"""
+        self._writer.writerow(row)
+        self.rows += 1
+        self._pending += 1
+        if self._pending >= self.flush_rows:
+            self.flush()
+        elif time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def maybe_flush(self):
+        """Vuelca si hay filas pendientes y ha vencido el intervalo (para llamar en vacío)"""
+        if self._pending and time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """Vuelca el buffer al sistema operativo (y al disco si fsync)"""
+        self._f.flush()
+        if self.fsync:
+            os.fsync(self._f.fileno())
+        self._pending = 0
+        self._last_flush = time.monotonic()
+        self.flushes += 1
+
+    def close(self):
+        if self._f.closed:
+            return
+        try:
+            self.flush()
+        finally:
+            self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
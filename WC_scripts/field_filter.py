@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+# field_filter.py
+#
+# Filtro por campo (deadband) para los puentes MQTT: de cada muestra solo se
+# publican los campos que han cambiado lo suficiente respecto al último valor
+# publicado, o los que llevan más de --heartbeat s sin publicarse. Pensado
+# para campos que apenas varían a 1 Hz (temperaturas de agua, socket_0_temp,
+# flow_lpm...).
+#
+# Reglas por clave exacta o patrón (fnmatch), la primera que coincide gana:
+#   --deadband water_in=0.05        cambio absoluto > 0.05
+#   --deadband "air_*=0.1"          patrón
+#   --deadband flow_lpm=2%          cambio relativo > 2 % del último publicado
+#   --deadband "*_temp=0.5,1%"      el mayor de los dos umbrales
+#   --deadband "*_temp=0"           solo cuando cambia
+# Los campos sin regla se publican siempre. Los no numéricos, cuando cambian.
+# Los consumidores deben mantener el último valor de cada campo (como hace
+# Influx/Grafana con fill(previous)).
+
+import fnmatch
+import time
+from typing import Dict, List, Optional, Tuple
+
+DEFAULT_HEARTBEAT = 60.0  # s sin publicar un campo filtrado antes de reenviarlo
+
+# Reglas de --deadband-defaults de cada puente (en un solo sitio para que no
+# diverjan entre copias)
+# Sensores serie: campos lentos, solo se publican si cambian más del umbral
+SENSORS_DEADBAND_DEFAULTS = {
+    "water_*": "0.05",
+    "air_*": "0.1",
+    "extra_temp*": "0.1",
+    "flow_lpm": "1%",
+}
+# Temperaturas de PCM (°C enteros): solo se publican cuando cambian
+PCM_DEADBAND_DEFAULTS = {
+    "*_temp": "0",
+    "*_temp_*": "0",
+}
+
+Rule = Tuple[str, float, float]  # patrón, umbral absoluto, umbral relativo
+
+
+def parse_rule(text: str) -> Rule:
+    """'flow_lpm=0.1,2%' -> ('flow_lpm', 0.1, 0.02)"""
+    pattern, sep, spec = text.partition("=")
+    if not sep or not pattern.strip():
+        raise ValueError(f"Regla inválida '{text}' (usa CLAVE=0.1, CLAVE=2% o 'patrón*=0.1,2%')")
+    abs_band = rel_band = 0.0
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if part.endswith("%"):
+            rel_band = float(part[:-1]) / 100
+        else:
+            abs_band = float(part)
+    return pattern.strip(), abs_band, rel_band
+
+
+def add_filter_arguments(parser, defaults: Optional[Dict[str, str]] = None) -> None:
+    """Añade --deadband/--heartbeat (y --deadband-defaults si el script trae reglas propias)"""
+    parser.add_argument("--deadband", action="append", default=[], metavar="CLAVE=UMBRAL",
+                        help="Publicar un campo solo si cambia más del umbral (abs, %% o ambos; "
+                             "la clave admite patrones, repetible). Ej.: water_*=0.05, flow_lpm=2%%")
+    parser.add_argument("--heartbeat", type=float, default=DEFAULT_HEARTBEAT,
+                        help=f"Con --deadband, reenviar cada campo al menos cada S s (default: {DEFAULT_HEARTBEAT:g})")
+    if defaults:
+        rules = ", ".join(f"{k}={v}" for k, v in defaults.items()).replace("%", "%%")
+        parser.add_argument("--deadband-defaults", action="store_true",
+                            help=f"Activar las reglas deadband por defecto del script ({rules})")
+
+
+class DeadbandFilter:
+    """Deja pasar solo los campos que cambian (o vencen el heartbeat) y cuenta el ahorro"""
+
+    def __init__(self, rules: List[Rule], heartbeat: float = DEFAULT_HEARTBEAT):
+        self.rules = list(rules)
+        self.heartbeat = heartbeat
+        self._rule_for: Dict[str, Optional[Tuple[float, float]]] = {}  # clave -> umbrales (cache)
+        self._last: Dict[str, Tuple[object, float]] = {}  # clave -> (último valor publicado, t)
+
+        self.samples_in = 0
+        self.samples_out = 0
+        self.fields_in = 0
+        self.fields_out = 0
+
+    @classmethod
+    def from_args(cls, args, defaults: Optional[Dict[str, str]] = None) -> Optional["DeadbandFilter"]:
+        """None si no hay ninguna regla: el puente publica todo como siempre"""
+        specs = list(args.deadband)
+        if defaults and getattr(args, "deadband_defaults", False):
+            specs += [f"{k}={v}" for k, v in defaults.items()]
+        if not specs:
+            return None
+        return cls([parse_rule(spec) for spec in specs], heartbeat=args.heartbeat)
+
+    def _resolve(self, key: str) -> Optional[Tuple[float, float]]:
+        for pattern, abs_band, rel_band in self.rules:
+            if key == pattern or fnmatch.fnmatchcase(key, pattern):
+                return abs_band, rel_band
+        return None
+
+    def filter(self, fields: dict, now: Optional[float] = None) -> dict:
+        """Campos de una muestra -> solo los que hay que publicar (vacío si ninguno)"""
+        if now is None:
+            now = time.time()
+        out = {}
+        rule_for = self._rule_for
+        last = self._last
+        for key, value in fields.items():
+            try:
+                rule = rule_for[key]
+            except KeyError:
+                rule = rule_for[key] = self._resolve(key)
+            if rule is None:
+                out[key] = value
+                continue
+            prev = last.get(key)
+            if prev is not None and now - prev[1] < self.heartbeat:
+                old = prev[0]
+                if (isinstance(value, (int, float)) and isinstance(old, (int, float))
+                        and not isinstance(value, bool) and not isinstance(old, bool)):
+                    if abs(value - old) <= max(rule[0], rule[1] * abs(old)):
+                        continue
+                elif value == old:
+                    continue
+            last[key] = (value, now)
+            out[key] = value
+
+        self.samples_in += 1
+        self.fields_in += len(fields)
+        if out:
+            self.samples_out += 1
+            self.fields_out += len(out)
+        return out
+
+    def ratio(self) -> float:
+        """Campos recibidos / campos publicados"""
+        return self.fields_in / self.fields_out if self.fields_out else 0.0
+
+    def stats(self) -> dict:
+        return {
+            "samples_in": self.samples_in,
+            "samples_out": self.samples_out,
+            "fields_in": self.fields_in,
+            "fields_out": self.fields_out,
+            "ratio": round(self.ratio(), 2),
+        }
+
+    def format_stats(self) -> str:
+        skipped = self.samples_in - self.samples_out
+        return (f"campos {self.fields_in} -> {self.fields_out} (compresión x{self.ratio():.2f}) | "
+                f"muestras sin cambios {skipped} de {self.samples_in}")
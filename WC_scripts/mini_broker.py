@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+# mini_broker.py
+#
+# Broker MQTT 3.1.1 mínimo en asyncio para pruebas locales de los puentes
+# (sustituye a 155.210.152.63 en el banco de pruebas). Soporta CONNECT,
+# PUBLISH QoS 0/1/2, SUBSCRIBE con comodines + y #, mensajes retenidos y
+# PINGREQ; ignora usuario/contraseña. Se puede matar y relanzar en mitad de
+# un experimento para probar el spool de mqtt_publisher.py.
+#
+# Con --decode cuenta las muestras recibidas (mqtt_codec.MessageDecoder), y
+# con --log las guarda en JSONL para comprobar pérdidas/duplicados.
+#
+# Uso:
+#   python mini_broker.py --port 1883 --decode --log recibido.jsonl
+#   python pcm/pcm_csv_to_mqtt.py --mqtt-host 127.0.0.1 --mqtt-port 1883 --spool spool_pcm
+
+import argparse
+import asyncio
+import json
+import time
+
+from mqtt_codec import MessageDecoder
+
+DEFAULT_PORT = 1883
+
+CONNECT, CONNACK, PUBLISH, PUBACK, PUBREC, PUBREL, PUBCOMP = 1, 2, 3, 4, 5, 6, 7
+SUBSCRIBE, SUBACK, UNSUBSCRIBE, UNSUBACK, PINGREQ, PINGRESP, DISCONNECT = 8, 9, 10, 11, 12, 13, 14
+
+
+def topic_matches(pattern: str, topic: str) -> bool:
+    p_parts = pattern.split("/")
+    t_parts = topic.split("/")
+    for i, p in enumerate(p_parts):
+        if p == "#":
+            return True
+        if i >= len(t_parts):
+            return False
+        if p != "+" and p != t_parts[i]:
+            return False
+    return len(p_parts) == len(t_parts)
+
+
+def encode_length(n: int) -> bytes:
+    out = bytearray()
+    while True:
+        byte = n % 128
+        n //= 128
+        if n:
+            byte |= 0x80
+        out.append(byte)
+        if not n:
+            return bytes(out)
+
+
+def packet(ptype: int, flags: int, body: bytes) -> bytes:
+    return bytes([(ptype << 4) | flags]) + encode_length(len(body)) + body
+
+
+def _utf8(data: bytes, pos: int):
+    n = int.from_bytes(data[pos:pos + 2], "big")
+    return data[pos + 2:pos + 2 + n].decode("utf-8", errors="replace"), pos + 2 + n
+
+
+class Broker:
+    def __init__(self, decode=False, log_path=None):
+        self.sessions = {}  # writer -> [filtros]
+        self.retained = {}
+        self.messages = 0
+        self.bytes = 0
+        self.samples = 0
+        self.decoder = MessageDecoder() if decode else None
+        self.log = open(log_path, "a", encoding="utf-8", buffering=1) if log_path else None
+
+    async def handle(self, reader, writer):
+        peer = writer.get_extra_info("peername")
+        self.sessions[writer] = []
+        try:
+            while True:
+                head = await reader.readexactly(1)
+                length, mult = 0, 1
+                while True:
+                    b = (await reader.readexactly(1))[0]
+                    length += (b & 0x7F) * mult
+                    mult *= 128
+                    if not b & 0x80:
+                        break
+                body = await reader.readexactly(length) if length else b""
+                ptype, flags = head[0] >> 4, head[0] & 0x0F
+
+                if ptype == CONNECT:
+                    writer.write(packet(CONNACK, 0, b"\x00\x00"))
+                    print(f"+ conexión {peer}")
+                elif ptype == PUBLISH:
+                    qos = (flags >> 1) & 3
+                    topic, pos = _utf8(body, 0)
+                    pid = body[pos:pos + 2]
+                    if qos:
+                        pos += 2
+                    self.route(topic, body[pos:], bool(flags & 1))
+                    if qos == 1:
+                        writer.write(packet(PUBACK, 0, pid))
+                    elif qos == 2:
+                        writer.write(packet(PUBREC, 0, pid))
+                elif ptype == PUBREL:
+                    writer.write(packet(PUBCOMP, 0, body[:2]))
+                elif ptype == SUBSCRIBE:
+                    pid, pos, granted = body[:2], 2, bytearray()
+                    while pos < len(body):
+                        pattern, pos = _utf8(body, pos)
+                        pos += 1
+                        self.sessions[writer].append(pattern)
+                        granted.append(0)
+                    writer.write(packet(SUBACK, 0, pid + bytes(granted)))
+                    for topic, payload in self.retained.items():
+                        if any(topic_matches(p, topic) for p in self.sessions[writer]):
+                            writer.write(self._publish_packet(topic, payload, retain=True))
+                elif ptype == UNSUBSCRIBE:
+                    pos = 2
+                    while pos < len(body):
+                        pattern, pos = _utf8(body, pos)
+                        if pattern in self.sessions[writer]:
+                            self.sessions[writer].remove(pattern)
+                    writer.write(packet(UNSUBACK, 0, body[:2]))
+                elif ptype == PINGREQ:
+                    writer.write(packet(PINGRESP, 0, b""))
+                elif ptype == DISCONNECT:
+                    break
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self.sessions.pop(writer, None)
+            writer.close()
+            print(f"- desconexión {peer}")
+
+    @staticmethod
+    def _publish_packet(topic: str, payload: bytes, retain=False) -> bytes:
+        t = topic.encode("utf-8")
+        return packet(PUBLISH, 1 if retain else 0, len(t).to_bytes(2, "big") + t + payload)
+
+    def route(self, topic: str, payload: bytes, retain: bool):
+        self.messages += 1
+        self.bytes += len(payload)
+        if retain:
+            if payload:
+                self.retained[topic] = payload
+            else:
+                self.retained.pop(topic, None)
+        if self.decoder is not None:
+            try:
+                samples = self.decoder.feed(topic, payload)
+            except (ValueError, UnicodeDecodeError) as e:
+                print(f"⚠ {topic}: no se pudo decodificar ({e})")
+                samples = []
+            self.samples += len(samples)
+            if self.log is not None:
+                for sample in samples:
+                    self.log.write(json.dumps({"topic": topic, "rx": time.time(), **sample}, ensure_ascii=False) + "\n")
+        data = None
+        for writer, patterns in list(self.sessions.items()):
+            if any(topic_matches(p, topic) for p in patterns):
+                data = data or self._publish_packet(topic, payload)
+                writer.write(data)
+
+    async def report(self, interval):
+        last = (time.monotonic(), 0, 0)
+        while True:
+            await asyncio.sleep(interval)
+            now = time.monotonic()
+            dt = now - last[0]
+            text = (f"[broker] {self.messages} mensajes ({(self.messages - last[1]) / dt:.1f}/s), "
+                    f"{self.bytes / 1024:.0f} kB")
+            if self.decoder is not None:
+                text += f", {self.samples} muestras ({(self.samples - last[2]) / dt:.1f}/s)"
+            print(text, flush=True)
+            if self.log is not None:
+                self.log.flush()
+            last = (now, self.messages, self.samples)
+
+
+async def serve(args):
+    broker = Broker(decode=args.decode, log_path=args.log)
+    server = await asyncio.start_server(broker.handle, args.host, args.port)
+    print(f"▶ mini_broker escuchando en {args.host}:{args.port}", flush=True)
+    reporter = asyncio.create_task(broker.report(args.stats_interval))
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        reporter.cancel()
+        if broker.log is not None:
+            broker.log.close()
+        print(f"■ {broker.messages} mensajes, {broker.samples} muestras")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Broker MQTT mínimo para pruebas locales")
+    parser.add_argument("--host", default="127.0.0.1", help="Dirección de escucha (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"Puerto (default: {DEFAULT_PORT})")
+    parser.add_argument("--decode", action="store_true", help="Decodificar y contar muestras")
+    parser.add_argument("--log", help="Guardar las muestras decodificadas en JSONL (implica --decode)")
+    parser.add_argument("--stats-interval", type=float, default=5.0, help="Segundos entre informes")
+    args = parser.parse_args()
+    args.decode = args.decode or bool(args.log)
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
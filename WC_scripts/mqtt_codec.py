@@ -0,0 +1,370 @@
+#!/usr/bin/env python3
+# mqtt_codec.py
+#
+# Codificación de los mensajes MQTT del topic 'cooler' y decodificador para
+# los consumidores. Un mensaje puede ser:
+#   {...}   una muestra JSON (formato de siempre: measurement, tags, fields[, ts])
+#   [...]   lote JSON: array de muestras con "ts" (segundos epoch)
+#   texto   lote en line protocol de Influx, una muestra por línea con
+#           timestamp explícito en ns:  pcm,device=pcm system_ipc=1.27 1736...
+# El primer carácter distingue el formato sin ambigüedad: un measurement de
+# line protocol no puede empezar por '{' ni por '['.
+#
+# Modo "packed" (diccionario de esquema): los nombres de campo se publican una
+# vez, retenidos, en <topic>/schema/<id>; cada mensaje en <topic>/packed lleva
+# solo los valores como float32:
+#   cabecera  <4sH   id de esquema (4 bytes) + nº de filas
+#   fila      <d + n*f   ts (segundos epoch) + valores en el orden del esquema
+# Los contadores que solo crecen (DOUBLE_FIELDS: *_time_ticks, *_energy_joules,
+# E_J...) van como float64: en float32 perderían precisión sin avisar. El
+# esquema lleva entonces "format" con el tipo de cada columna. Un valor fuera
+# del rango de float32 viaja como ±inf en lugar de romper el mensaje.
+# Los campos no numéricos (p.ej. "ver": "1") van fijos en el esquema; si
+# cambian, o aparece un campo nuevo, se publica un esquema nuevo. Un campo del
+# esquema que falta en una muestra viaja como NaN (el decodificador lo omite).
+
+import fnmatch
+import hashlib
+import json
+import math
+import struct
+from typing import Dict, Iterable, List, Optional, Tuple
+
+BATCH_FORMATS = ("json", "line", "packed")
+PACKED_SUBTOPIC = "packed"
+SCHEMA_SUBTOPIC = "schema"
+PACKED_HEADER = struct.Struct("<4sH")
+MAX_PACKED_ROWS = 0xFFFF
+MAX_PENDING_PACKED = 1000  # mensajes packed guardados a la espera de su esquema
+DOUBLE_FIELDS = ("*_time_ticks", "*energy_joules*", "E_J", "E_Wh")  # columnas float64
+FLOAT32_MAX = 3.4028234663852886e38
+
+
+def dumps(payload) -> str:
+    return json.dumps(payload, separators=(",", ":"), ensure_ascii=False)
+
+
+# ====== line protocol ======
+def _escape_key(text: str) -> str:
+    return str(text).replace("\\", "\\\\").replace(",", "\\,").replace("=", "\\=").replace(" ", "\\ ")
+
+
+def _escape_measurement(text: str) -> str:
+    return str(text).replace("\\", "\\\\").replace(",", "\\,").replace(" ", "\\ ")
+
+
+def _field_value(value) -> Optional[str]:
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, (int, float)):
+        # Todo número como float, igual que llega por JSON
+        return repr(float(value))
+    if value is None:
+        return None
+    text = str(value).replace("\\", "\\\\").replace('"', '\\"')
+    return f'"{text}"'
+
+
+def to_line(payload: dict, ts: float) -> Optional[str]:
+    """Una muestra {measurement, tags, fields} -> línea de line protocol (ts en segundos)"""
+    head = _escape_measurement(payload.get("measurement", ""))
+    for key, value in sorted((payload.get("tags") or {}).items()):
+        if value is not None and value != "":
+            head += f",{_escape_key(key)}={_escape_key(value)}"
+    fields = []
+    for key, value in (payload.get("fields") or {}).items():
+        text = _field_value(value)
+        if text is not None:
+            fields.append(f"{_escape_key(key)}={text}")
+    if not fields:
+        return None
+    return f"{head} {','.join(fields)} {int(round(ts * 1e9))}"
+
+
+def encode_batch(samples: Iterable[Tuple[dict, float]], fmt: str = "json") -> str:
+    """Lista de (payload, ts) -> cuerpo de un único mensaje MQTT (json o line)"""
+    if fmt == "json":
+        return dumps([{**payload, "ts": ts} for payload, ts in samples])
+    if fmt == "line":
+        lines = (to_line(payload, ts) for payload, ts in samples)
+        return "\n".join(line for line in lines if line)
+    raise ValueError(f"Formato de lote desconocido: {fmt} (usa {', '.join(BATCH_FORMATS)})")
+
+
+def _split_unescaped(text: str, sep: str, maxsplit: int = -1) -> List[str]:
+    parts, cur, i = [], [], 0
+    in_quotes = False
+    while i < len(text):
+        ch = text[i]
+        if ch == "\\" and i + 1 < len(text):
+            cur.append(text[i:i + 2])
+            i += 2
+            continue
+        if ch == '"':
+            in_quotes = not in_quotes
+        if ch == sep and not in_quotes and (maxsplit < 0 or len(parts) < maxsplit):
+            parts.append("".join(cur))
+            cur = []
+        else:
+            cur.append(ch)
+        i += 1
+    parts.append("".join(cur))
+    return parts
+
+
+def _unescape(text: str) -> str:
+    out, i = [], 0
+    while i < len(text):
+        if text[i] == "\\" and i + 1 < len(text):
+            out.append(text[i + 1])
+            i += 2
+        else:
+            out.append(text[i])
+            i += 1
+    return "".join(out)
+
+
+def _parse_field_value(text: str):
+    if text.startswith('"') and text.endswith('"') and len(text) >= 2:
+        return _unescape(text[1:-1])
+    if text in ("true", "t", "T", "True", "TRUE"):
+        return True
+    if text in ("false", "f", "F", "False", "FALSE"):
+        return False
+    if text.endswith("i") or text.endswith("u"):
+        return int(text[:-1])
+    return float(text)
+
+
+def parse_line_protocol(line: str) -> dict:
+    """Línea de line protocol -> {measurement, tags, fields, ts} (ts en segundos)"""
+    parts = _split_unescaped(line.strip(), " ")
+    if len(parts) < 2:
+        raise ValueError(f"Línea incompleta: {line!r}")
+    head, field_text = parts[0], parts[1]
+    ts = int(parts[2]) / 1e9 if len(parts) > 2 and parts[2] else None
+
+    head_parts = _split_unescaped(head, ",")
+    tags = {}
+    for item in head_parts[1:]:
+        key, _, value = item.partition("=")
+        tags[_unescape(key)] = _unescape(value)
+    fields = {}
+    for item in _split_unescaped(field_text, ","):
+        key, value = _split_unescaped(item, "=", 1)
+        fields[_unescape(key)] = _parse_field_value(value)
+    return {"measurement": _unescape(head_parts[0]), "tags": tags, "fields": fields, "ts": ts}
+
+
+# ====== diccionario de esquema ======
+class Schema:
+    """Nombres de campo (y campos fijos) de un tipo de muestra"""
+
+    def __init__(self, measurement: str, tags: dict, names: List[str], static: dict,
+                 formats: Optional[str] = None):
+        self.measurement = measurement
+        self.tags = tags
+        self.names = names
+        self.static = static
+        self.name_tuple = tuple(names)
+        self.name_set = frozenset(names)
+        if formats is None:
+            formats = "".join("d" if is_double_field(name) else "f" for name in names)
+        self.formats = formats
+        self.row = struct.Struct(f"<d{formats}")
+        self.id = hashlib.sha1(dumps(self.to_dict(with_id=False)).encode("utf-8")).hexdigest()[:8]
+        self.id_bytes = bytes.fromhex(self.id)
+
+    def to_dict(self, with_id: bool = True) -> dict:
+        out = {"measurement": self.measurement, "tags": self.tags, "fields": self.names, "static": self.static}
+        if "d" in self.formats:  # (sin "format", todo float32: esquemas anteriores)
+            out["format"] = self.formats
+        if with_id:
+            out = {"schema": self.id, **out}
+        return out
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Schema":
+        names = list(data.get("fields") or [])
+        schema = cls(data.get("measurement", ""), data.get("tags") or {}, names,
+                     data.get("static") or {}, data.get("format") or "f" * len(names))
+        if data.get("schema") and data["schema"] != schema.id:
+            raise ValueError(f"Esquema {data['schema']} no coincide con su contenido ({schema.id})")
+        return schema
+
+
+    def pack(self, ts: float, values: List) -> bytes:
+        """Fila con los valores fuera de rango (float32, o int enorme) como ±inf"""
+        try:
+            return self.row.pack(ts, *values)
+        except (struct.error, OverflowError):
+            return self.row.pack(ts, *[_clamp(value, code) for value, code in zip(values, self.formats)])
+
+
+def is_double_field(name: str) -> bool:
+    return any(fnmatch.fnmatchcase(name, pattern) for pattern in DOUBLE_FIELDS)
+
+
+def _clamp(value, code: str) -> float:
+    try:
+        value = float(value)
+    except OverflowError:  # int más grande que un double
+        return math.inf if value > 0 else -math.inf
+    if code == "f" and abs(value) > FLOAT32_MAX:
+        return math.copysign(math.inf, value)
+    return value
+
+
+class SchemaEncoder:
+    """Convierte muestras en mensajes packed + los esquemas retenidos que hagan falta"""
+
+    def __init__(self, topic: str):
+        self.topic = topic
+        self.packed_topic = f"{topic}/{PACKED_SUBTOPIC}"
+        self._schemas: Dict[tuple, Schema] = {}
+        self._last: Optional[Schema] = None
+
+    def schema_topic(self, schema: Schema) -> str:
+        return f"{self.topic}/{SCHEMA_SUBTOPIC}/{schema.id}"
+
+    def _schema_for(self, payload: dict) -> Tuple[Schema, bool]:
+        fields = payload.get("fields") or {}
+        measurement = payload.get("measurement", "")
+        tags = payload.get("tags") or {}
+        names, static = [], []
+        for key, value in fields.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                names.append(key)
+            else:
+                static.append((key, value))
+        last = self._last
+        if (last is not None and measurement == last.measurement and tags == last.tags
+                and dict(static) == last.static and last.name_set.issuperset(names)):
+            return last, False  # mismo esquema aunque falte algún campo (NaN)
+        cache_key = (measurement, tuple(sorted(tags.items())), tuple(names), tuple(static))
+        schema = self._schemas.get(cache_key)
+        new = schema is None
+        if new:
+            schema = Schema(measurement, dict(tags), names, dict(static))
+            self._schemas[cache_key] = schema
+        self._last = schema
+        return schema, new
+
+    def encode(self, samples: Iterable[Tuple[dict, float]]) -> List[Tuple[str, bytes, bool]]:
+        """(payload, ts)... -> [(topic, cuerpo, retain)]: esquemas nuevos primero, luego los datos"""
+        out = []
+        rows: List[bytes] = []
+        current: Optional[Schema] = None
+
+        def flush():
+            if rows:
+                out.append((self.packed_topic, PACKED_HEADER.pack(current.id_bytes, len(rows)) + b"".join(rows), False))
+                rows.clear()
+
+        for payload, ts in samples:
+            fields = payload.get("fields") or {}
+            last = self._last
+            if (last is not None and not last.static and tuple(fields) == last.name_tuple
+                    and payload.get("measurement") == last.measurement and payload.get("tags") == last.tags):
+                # Camino rápido: mismos campos en el mismo orden que la muestra anterior
+                try:
+                    row = last.row.pack(ts, *fields.values())
+                except (struct.error, OverflowError):
+                    pass
+                else:
+                    if last is not current or len(rows) >= MAX_PACKED_ROWS:
+                        flush()
+                        current = last
+                    rows.append(row)
+                    continue
+            schema, new = self._schema_for(payload)
+            if new:
+                flush()
+                out.append((self.schema_topic(schema), dumps(schema.to_dict()).encode("utf-8"), True))
+            if schema is not current or len(rows) >= MAX_PACKED_ROWS:
+                flush()
+                current = schema
+            rows.append(schema.pack(ts, [fields.get(name, math.nan) for name in schema.names]))
+        flush()
+        return out
+
+    def schemas(self) -> List[Tuple[str, bytes, bool]]:
+        """Todos los esquemas conocidos (para re-publicarlos tras reconectar)"""
+        return [(self.schema_topic(s), dumps(s.to_dict()).encode("utf-8"), True) for s in self._schemas.values()]
+
+
+def decode_packed(body: bytes, schemas: Dict[str, Schema]) -> List[dict]:
+    """Mensaje packed -> muestras; KeyError si el esquema aún no se conoce"""
+    schema_id, nrows = PACKED_HEADER.unpack_from(body)
+    schema = schemas[schema_id.hex()]
+    out = []
+    offset = PACKED_HEADER.size
+    for _ in range(nrows):
+        ts, *values = schema.row.unpack_from(body, offset)
+        offset += schema.row.size
+        fields = {name: value for name, value in zip(schema.names, values) if not math.isnan(value)}
+        fields.update(schema.static)
+        out.append({"measurement": schema.measurement, "tags": dict(schema.tags), "fields": fields, "ts": ts})
+    return out
+
+
+class MessageDecoder:
+    """Decodificador para consumidores suscritos a <topic>/#: JSON, lotes, line protocol y packed"""
+
+    def __init__(self, max_pending: int = MAX_PENDING_PACKED):
+        self.schemas: Dict[str, Schema] = {}
+        self.unknown_schema = 0
+        self.max_pending = max_pending
+        self._pending: List[bytes] = []
+
+    def feed(self, topic: str, payload: bytes) -> List[dict]:
+        parts = topic.split("/")
+        if len(parts) >= 2 and parts[-2] == SCHEMA_SUBTOPIC:
+            if not payload:
+                return []
+            schema = Schema.from_dict(json.loads(payload))
+            self.schemas[schema.id] = schema
+            return self._drain_pending(schema.id_bytes)
+        if parts[-1] == PACKED_SUBTOPIC:
+            try:
+                return decode_packed(payload, self.schemas)
+            except KeyError:
+                # El esquema llega al suscribirse (retenido) o, si el broker se
+                # reinició, cuando el publicador lo re-publica: mientras, se guarda
+                self.unknown_schema += 1
+                if len(self._pending) >= self.max_pending:
+                    self._pending.pop(0)
+                self._pending.append(bytes(payload))
+                return []
+        return decode_message(payload)
+
+    def _drain_pending(self, schema_id: bytes) -> List[dict]:
+        out: List[dict] = []
+        if self._pending:
+            waiting = [body for body in self._pending if body[:4] == schema_id]
+            if waiting:
+                self._pending = [body for body in self._pending if body[:4] != schema_id]
+                for body in waiting:
+                    out.extend(decode_packed(body, self.schemas))
+        return out
+
+
+# ====== consumidor ======
+def decode_message(raw) -> List[dict]:
+    """Cualquier mensaje del topic -> lista de muestras {measurement, tags, fields, ts}"""
+    if isinstance(raw, (bytes, bytearray)):
+        raw = raw.decode("utf-8")
+    text = raw.lstrip()
+    if not text:
+        return []
+    first = text[0]
+    if first == "{":
+        sample = json.loads(text)
+        sample.setdefault("ts", None)
+        return [sample]
+    if first == "[":
+        samples = json.loads(text)
+        for sample in samples:
+            sample.setdefault("ts", None)
+        return samples
+    return [parse_line_protocol(line) for line in text.splitlines() if line.strip()]
@@ -6,6 +6,8 @@ from tkinter import ttk, messagebox
 
 import paho.mqtt.client as mqtt
 
+from mqtt_publisher import MqttPublisher
+
 # ====== MQTT SETTINGS (igual que tu script) ======
 MQTT_HOST = "155.210.152.63"
 MQTT_PORT = 8080
@@ -17,6 +19,7 @@ MQTT_MEASUREMENT = "control"
 MQTT_DEVICE = "control"
 MQTT_QOS = 0
 MQTT_RETAIN = False
+MQTT_QUEUE_SIZE = 100  # los comandos no se descartan: con la cola llena se espera hasta 1 s
 
 # Si tu puerto 8080 fuese WebSockets (solo si te falla):
 USE_WEBSOCKETS = False
@@ -115,6 +118,8 @@ class App(tk.Tk):
         self.client.username_pw_set(MQTT_USERNAME, MQTT_PASSWORD)
         self.client.on_connect = self._on_connect
         self.client.on_disconnect = self._on_disconnect
+        self.publisher = MqttPublisher(self.client, MQTT_TOPIC, maxsize=MQTT_QUEUE_SIZE,
+                                       policy="block", qos=MQTT_QOS, wait_timeout=3, block_timeout=1.0).start()
 
         try:
             self.client.connect(MQTT_HOST, MQTT_PORT, keepalive=30)
@@ -161,8 +166,8 @@ class App(tk.Tk):
             "ts": time.time(),
         }
         msg = json.dumps(payload, separators=(",", ":"), ensure_ascii=False)
-        info = self.client.publish(MQTT_TOPIC, msg, qos=MQTT_QOS, retain=MQTT_RETAIN)
-        info.wait_for_publish(timeout=3)
+        if not self.publisher.publish(msg, retain=MQTT_RETAIN):
+            raise RuntimeError("cola MQTT llena")
         self._log(f"PUB -> {MQTT_TOPIC} : {msg}")
 
     def send_cmd(self, cmd: str):
@@ -236,6 +241,7 @@ class App(tk.Tk):
         except Exception:
             pass
         try:
+            self.publisher.stop(timeout=3)
             self.client.loop_stop()
             self.client.disconnect()
         except Exception:
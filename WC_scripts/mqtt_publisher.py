@@ -0,0 +1,441 @@
+#!/usr/bin/env python3
+# mqtt_publisher.py
+#
+# Publicador MQTT asíncrono compartido por los puentes (PCM, sensores serie,
+# vatímetro, GUI). El hilo de adquisición solo encola; un hilo dedicado hace
+# publish() + wait_for_publish(), así un broker lento no frena la lectura del
+# puerto serie ni la tubería de stdout de PCM.
+#
+# La cola está acotada; cuando se llena se aplica la política elegida:
+#   drop         descarta el mensaje nuevo (por defecto)
+#   drop-oldest  descarta el más antiguo de la cola y encola el nuevo
+#   block        espera hueco (hasta block_timeout s; si vence, descarta)
+#
+# Las muestras enviadas con publish_sample() pueden agruparse (lotes de N
+# muestras o T ms, lo que llegue antes) en un solo mensaje JSON array o line
+# protocol con timestamps, o en modo "packed" (valores float32 + esquema
+# retenido); ver mqtt_codec.py para los formatos y el decodificador.
+#
+# Con spool (mqtt_spool.py), lo que no se puede publicar (broker caído, fallo
+# de publish o cola llena) va a disco en lugar de perderse, y se re-publica al
+# reconectar con sus timestamps originales, a una tasa limitada.
+#
+# Con sample_age (un LatencyHistogram) se registra, para cada muestra
+# publicada en vivo, la edad desde su ts hasta que el broker la acepta.
+
+import bisect
+import json
+import queue
+import threading
+import time
+from collections import deque
+from typing import List, Optional, Sequence, Union
+
+from mqtt_codec import BATCH_FORMATS, SchemaEncoder, dumps, encode_batch
+from mqtt_spool import DEFAULT_MAX_BYTES, DEFAULT_SEGMENT_BYTES, KIND_RAW, KIND_SAMPLE, DiskSpool
+
+POLICIES = ("drop", "drop-oldest", "block")
+DEFAULT_QUEUE_SIZE = 1000
+DEFAULT_POLICY = "drop"
+DEFAULT_WAIT_TIMEOUT = 5.0  # s, igual que el wait_for_publish que usaban los scripts
+DEFAULT_BLOCK_TIMEOUT = 1.0  # s máximos que espera el hilo de adquisición con la política block
+DEFAULT_MAX_BATCH = 1000  # tope de muestras por lote cuando solo se limita por tiempo
+LATENCY_WINDOW = 1000  # últimas N latencias para los percentiles
+DEFAULT_REPLAY_RATE = 200.0  # muestras/s re-publicadas desde el spool
+REPLAY_TICK = 0.05  # s entre tandas de re-publicación
+REPLAY_BATCH = 100  # muestras por mensaje al re-publicar
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+_STOP = object()
+
+
+def add_publisher_arguments(parser) -> None:
+    """Añade las opciones de broker, cola, lotes y spool a un argparse"""
+    parser.add_argument("--mqtt-host", help="Broker MQTT (default: el del script)")
+    parser.add_argument("--mqtt-port", type=int, help="Puerto del broker (default: el del script)")
+    parser.add_argument("--mqtt-qos", type=int, choices=(0, 1), default=0,
+                        help="QoS de publicación; con 1 y --spool no se pierde lo que estaba en vuelo (default: 0)")
+    parser.add_argument("--queue-size", type=int, default=DEFAULT_QUEUE_SIZE,
+                        help=f"Mensajes MQTT en cola como máximo (default: {DEFAULT_QUEUE_SIZE})")
+    parser.add_argument("--queue-policy", choices=POLICIES, default=DEFAULT_POLICY,
+                        help=f"Qué hacer con la cola llena (default: {DEFAULT_POLICY})")
+    parser.add_argument("--block-timeout", type=float, default=DEFAULT_BLOCK_TIMEOUT,
+                        help="Con --queue-policy block, segundos de espera antes de descartar "
+                             f"(default: {DEFAULT_BLOCK_TIMEOUT:g}; 0 = sin límite)")
+    parser.add_argument("--batch", type=int, default=1,
+                        help="Muestras por mensaje MQTT (default: 1 = sin lotes)")
+    parser.add_argument("--batch-ms", type=float, default=0.0,
+                        help="Enviar el lote como mucho cada T ms (default: 0 = solo por tamaño)")
+    parser.add_argument("--batch-format", choices=BATCH_FORMATS, default="json",
+                        help="Formato de las muestras en lote: array JSON, line protocol o "
+                             "packed (float32 + esquema retenido; también sin lotes) (default: json)")
+    parser.add_argument("--spool", metavar="DIR",
+                        help="Guardar en disco lo que no se pueda publicar y re-publicarlo al reconectar")
+    parser.add_argument("--spool-max-mb", type=float, default=DEFAULT_MAX_BYTES / 2**20,
+                        help=f"Tamaño máximo del spool en MB (default: {DEFAULT_MAX_BYTES // 2**20})")
+    parser.add_argument("--spool-segment-mb", type=float, default=DEFAULT_SEGMENT_BYTES / 2**20,
+                        help=f"Tamaño de cada segmento del spool en MB (default: {DEFAULT_SEGMENT_BYTES // 2**20})")
+    parser.add_argument("--replay-rate", type=float, default=DEFAULT_REPLAY_RATE,
+                        help=f"Mensajes/s al re-publicar el spool (default: {DEFAULT_REPLAY_RATE:g})")
+
+
+class LatencyHistogram:
+    """Histograma por intervalos (se vacía en cada snapshot); seguro entre hilos"""
+
+    def __init__(self, buckets_ms: Sequence[float] = LATENCY_BUCKETS_MS):
+        self.buckets_ms = tuple(buckets_ms)
+        self._lock = threading.Lock()
+        self._values: List[float] = []
+
+    def add(self, seconds: float) -> None:
+        with self._lock:
+            self._values.append(seconds * 1000)
+
+    def snapshot(self, reset: bool = True) -> dict:
+        """Campos del intervalo: count, mean/p50/p95/max en ms y nº por cubeta (le_<ms>ms, le_inf)"""
+        with self._lock:
+            values = sorted(self._values)
+            if reset:
+                self._values = []
+        out = {"count": len(values)}
+        if values:
+            n = len(values)
+            out["mean_ms"] = sum(values) / n
+            out["p50_ms"] = values[n // 2]
+            out["p95_ms"] = values[min(n - 1, int(n * 0.95))]
+            out["max_ms"] = values[-1]
+        prev = 0
+        for edge in self.buckets_ms:
+            idx = bisect.bisect_right(values, edge)
+            out[f"le_{edge:g}ms"] = idx - prev
+            prev = idx
+        out["le_inf"] = len(values) - prev
+        return out
+
+
+class MqttPublisher:
+    """Cola acotada + hilo publicador sobre un cliente paho ya conectado"""
+
+    def __init__(self, client, topic: str, maxsize: int = DEFAULT_QUEUE_SIZE,
+                 policy: str = DEFAULT_POLICY, qos: int = 0,
+                 wait_timeout: float = DEFAULT_WAIT_TIMEOUT, block_timeout: Optional[float] = DEFAULT_BLOCK_TIMEOUT,
+                 batch_size: int = 1, batch_ms: float = 0.0, batch_format: str = "json",
+                 spool: Optional[DiskSpool] = None, replay_rate: float = DEFAULT_REPLAY_RATE,
+                 sample_age: Optional[LatencyHistogram] = None):
+        if policy not in POLICIES:
+            raise ValueError(f"Política desconocida: {policy} (usa {', '.join(POLICIES)})")
+        if batch_format not in BATCH_FORMATS:
+            raise ValueError(f"Formato de lote desconocido: {batch_format} (usa {', '.join(BATCH_FORMATS)})")
+        self.client = client
+        self.topic = topic
+        self.policy = policy
+        self.qos = qos
+        self.wait_timeout = wait_timeout
+        self.block_timeout = block_timeout
+
+        self.batch_interval = batch_ms / 1000 if batch_ms > 0 else None
+        self.batching = batch_size > 1 or self.batch_interval is not None or batch_format == "packed"
+        self.batch_size = batch_size if batch_size > 1 or self.batch_interval is None else DEFAULT_MAX_BATCH
+        self.batch_format = batch_format
+        self._encoders = {}  # topic -> SchemaEncoder (modo packed)
+        self._batches = {}  # topic -> [(payload, ts, t_enq)], solo lo toca el hilo publicador
+
+        self.spool = spool
+        self.replay_rate = replay_rate
+        self.sample_age = sample_age
+        self._replaying = False
+        self._last_replay = time.monotonic()
+
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max(1, maxsize))
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        self._thread: Optional[threading.Thread] = None
+
+        self.enqueued = 0
+        self.published = 0
+        self.samples = 0
+        self.dropped = 0
+        self.failed = 0
+        self.spooled = 0
+        self.max_depth = 0
+
+    @classmethod
+    def from_args(cls, client, topic: str, args, **kwargs) -> "MqttPublisher":
+        """Crea el publicador con las opciones de add_publisher_arguments()"""
+        spool = None
+        if args.spool:
+            spool = DiskSpool(args.spool, max_bytes=int(args.spool_max_mb * 2**20),
+                              segment_bytes=int(args.spool_segment_mb * 2**20))
+        kwargs.setdefault("qos", args.mqtt_qos)
+        kwargs.setdefault("block_timeout", args.block_timeout if args.block_timeout > 0 else None)
+        return cls(client, topic, maxsize=args.queue_size, policy=args.queue_policy,
+                   batch_size=args.batch, batch_ms=args.batch_ms, batch_format=args.batch_format,
+                   spool=spool, replay_rate=args.replay_rate, **kwargs)
+
+    # ---------- productor ----------
+    def publish(self, payload: Union[str, bytes, dict], topic: Optional[str] = None, retain: bool = False) -> bool:
+        """Encola un mensaje tal cual (dict se serializa en el hilo publicador). False si se descartó"""
+        return self._put((topic or self.topic, payload, retain, time.perf_counter(), None, False))
+
+    def publish_sample(self, payload: dict, ts: Optional[float] = None, topic: Optional[str] = None) -> bool:
+        """Encola una muestra {measurement, tags, fields}; con lotes activos se agrupa con otras.
+        ts es la hora de la muestra en segundos epoch (por defecto, ahora)"""
+        return self._put((topic or self.topic, payload, False, time.perf_counter(),
+                          time.time() if ts is None else ts, True))
+
+    def _put(self, item) -> bool:
+        try:
+            if self.policy == "block":
+                self._queue.put(item, timeout=self.block_timeout)
+            else:
+                self._queue.put_nowait(item)
+        except queue.Full:
+            if self.spool is not None:
+                self._spool_item(item)
+                return True
+            if self.policy != "drop-oldest":
+                with self._lock:
+                    self.dropped += 1
+                return False
+            # Hace hueco quitando el más antiguo (otro productor podría ganarnos el hueco)
+            while True:
+                try:
+                    self._queue.get_nowait()
+                    self._queue.task_done()
+                    with self._lock:
+                        self.dropped += 1
+                except queue.Empty:
+                    pass
+                try:
+                    self._queue.put_nowait(item)
+                    break
+                except queue.Full:
+                    continue
+
+        with self._lock:
+            self.enqueued += 1
+            depth = self._queue.qsize()
+            if depth > self.max_depth:
+                self.max_depth = depth
+        return True
+
+    # ---------- hilo publicador ----------
+    def start(self) -> "MqttPublisher":
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="mqtt-publisher", daemon=True)
+            self._thread.start()
+        return self
+
+    def _run(self) -> None:
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            if self.spool is not None:
+                self._maybe_replay()
+                # Con datos en el spool (también al arrancar o al reconectar sin
+                # tráfico nuevo) se despierta cada tick para seguir vaciándolo
+                if self._replaying or self.spool:
+                    timeout = REPLAY_TICK if timeout is None else min(timeout, REPLAY_TICK)
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+            if deadline is not None and time.monotonic() >= deadline:
+                # Vence T aunque sigan llegando muestras
+                self._flush_batches()
+                deadline = None
+            if item is None:
+                continue
+            try:
+                if item is _STOP:
+                    self._flush_batches()
+                    return
+                topic, payload, retain, t_enq, ts, is_sample = item
+                if not is_sample or not self.batching:
+                    if not self._send(topic, payload, retain, (t_enq,), (ts,) if is_sample else ()):
+                        self._spool_item(item)
+                    continue
+                batch = self._batches.setdefault(topic, [])
+                batch.append((payload, ts, t_enq))
+                if len(batch) >= self.batch_size:
+                    self._flush_batch(topic)
+                if not self._batches:
+                    deadline = None
+                elif deadline is None and self.batch_interval is not None:
+                    deadline = time.monotonic() + self.batch_interval
+            finally:
+                self._queue.task_done()
+
+    def _flush_batch(self, topic: str) -> None:
+        batch = self._batches.pop(topic, None)
+        if not batch:
+            return
+        samples = [(payload, ts) for payload, ts, _ in batch]
+        if not self._send_samples(topic, samples, [t_enq for _, _, t_enq in batch]):
+            for payload, ts in samples:
+                self._spool_sample(topic, payload, ts)
+
+    def _flush_batches(self) -> None:
+        for topic in list(self._batches):
+            self._flush_batch(topic)
+
+    def _send_samples(self, topic: str, samples, enqueue_times) -> bool:
+        """Publica una lista de (payload, ts) en el formato configurado"""
+        # Edad solo de las muestras en vivo (las re-publicadas del spool no traen enqueue_times)
+        sample_ts = [ts for _, ts in samples] if enqueue_times else ()
+        if self.batch_format != "packed":
+            fmt = self.batch_format
+            return self._send(topic, encode_batch(samples, fmt), False, enqueue_times, sample_ts)
+        encoder = self._encoders.get(topic)
+        if encoder is None:
+            encoder = self._encoders[topic] = SchemaEncoder(topic)
+        ok = True
+        for msg_topic, body, retain in encoder.encode(samples):
+            # Los esquemas no cuentan como muestras
+            if retain:
+                ok = self._send(msg_topic, body, retain, ()) and ok
+                continue
+            ok = self._send(msg_topic, body, retain, enqueue_times, sample_ts) and ok
+            enqueue_times = sample_ts = ()
+        return ok
+
+    def _connected(self) -> bool:
+        is_connected = getattr(self.client, "is_connected", None)
+        return is_connected() if is_connected is not None else True
+
+    def _send(self, topic: str, payload, retain: bool, enqueue_times, sample_ts=()) -> bool:
+        if isinstance(payload, dict):
+            payload = dumps(payload)
+        if self.spool is not None and not self._connected():
+            ok = False  # sin broker: directo al spool, sin esperar wait_timeout
+        else:
+            try:
+                info = self.client.publish(topic, payload, qos=self.qos, retain=retain)
+                info.wait_for_publish(timeout=self.wait_timeout)
+                ok = info.rc == 0 and (self.qos == 0 or info.is_published())
+            except Exception:
+                ok = False
+        now = time.perf_counter()
+        with self._lock:
+            if ok:
+                self.published += 1
+                self.samples += len(enqueue_times)
+                self._latencies.extend(now - t_enq for t_enq in enqueue_times)
+            else:
+                self.failed += 1
+        if ok and sample_ts and self.sample_age is not None:
+            published = time.time()
+            for ts in sample_ts:
+                self.sample_age.add(published - ts)
+        return ok
+
+    # ---------- spool ----------
+    def _spool_item(self, item) -> None:
+        topic, payload, retain, _, ts, is_sample = item
+        if self.spool is None:
+            return
+        if is_sample:
+            self._spool_sample(topic, payload, ts)
+        else:
+            self.spool.append(topic, dumps(payload) if isinstance(payload, dict) else payload,
+                              time.time(), KIND_RAW, retain)
+            with self._lock:
+                self.spooled += 1
+
+    def _spool_sample(self, topic: str, payload: dict, ts: float) -> None:
+        if self.spool is None:
+            return
+        self.spool.append(topic, dumps(payload), ts, KIND_SAMPLE)
+        with self._lock:
+            self.spooled += 1
+
+    def _maybe_replay(self) -> None:
+        """Re-publica una tanda del spool si hay broker, respetando replay_rate"""
+        now = time.monotonic()
+        if now - self._last_replay < REPLAY_TICK:
+            return
+        elapsed = min(1.0, now - self._last_replay)
+        self._last_replay = now
+        if not self.spool or not self._connected():
+            self._replaying = False
+            return
+        if not self._replaying:
+            # Los esquemas packed pudieron perderse con el broker: se re-publican
+            self._replaying = True
+            for encoder in self._encoders.values():
+                for topic, body, retain in encoder.schemas():
+                    self._send(topic, body, retain, ())
+
+        records, token = self.spool.read(max(1, int(self.replay_rate * elapsed)))
+        pending = {}  # topic -> [(payload, ts)]
+        for topic, body, ts, kind, retain in records:
+            if kind == KIND_SAMPLE:
+                pending.setdefault(topic, []).append((json.loads(body), ts))
+                continue
+            if not self._send(topic, body, retain, ()):
+                return
+        for topic, samples in pending.items():
+            for i in range(0, len(samples), REPLAY_BATCH):
+                if not self._send_samples(topic, samples[i:i + REPLAY_BATCH], ()):
+                    return  # se reintentará desde el último commit
+        self.spool.commit(token, len(records))
+        if not self.spool:
+            self._replaying = False
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Vacía la cola (hasta timeout s) y para el hilo"""
+        if self._thread is None:
+            return
+        deadline = time.monotonic() + timeout
+        while self._queue.qsize() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        try:
+            self._queue.put(_STOP, timeout=max(0.0, deadline - time.monotonic()))
+        except queue.Full:
+            pass  # el hilo es daemon: muere con el proceso
+        self._thread.join(max(0.0, deadline - time.monotonic()))
+        self._thread = None
+        if self.spool is not None:
+            self.spool.close()
+
+    # ---------- métricas ----------
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lat = sorted(self._latencies)
+            out = {
+                "depth": self._queue.qsize(),
+                "max_depth": self.max_depth,
+                "enqueued": self.enqueued,
+                "published": self.published,
+                "samples": self.samples,
+                "dropped": self.dropped,
+                "failed": self.failed,
+                "spooled": self.spooled,
+            }
+        if self.spool is not None:
+            out["replayed"] = self.spool.replayed
+            out["spool_bytes"] = self.spool.pending_bytes()
+            out["spool_dropped_bytes"] = self.spool.dropped_bytes
+        if lat:
+            n = len(lat)
+            out["latency_p50_ms"] = lat[n // 2] * 1000
+            out["latency_p95_ms"] = lat[min(n - 1, int(n * 0.95))] * 1000
+            out["latency_max_ms"] = lat[-1] * 1000
+        return out
+
+    def format_stats(self) -> str:
+        s = self.stats()
+        text = f"cola {s['depth']} (máx {s['max_depth']}) | publicados {s['published']}"
+        if self.batching:
+            text += f" ({s['samples']} muestras)"
+        text += f" | descartados {s['dropped']} | fallidos {s['failed']}"
+        if self.spool is not None:
+            text += (f" | spool {s['spooled']} guardados, {s['replayed']} re-publicados, "
+                     f"{s['spool_bytes'] / 1024:.0f} kB pendientes")
+        if "latency_p50_ms" in s:
+            text += (f" | latencia p50 {s['latency_p50_ms']:.1f} ms, p95 {s['latency_p95_ms']:.1f} ms, "
+                     f"máx {s['latency_max_ms']:.1f} ms")
+        return text
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+# mqtt_spool.py
+#
+# Spool en disco (store-and-forward) para los puentes MQTT. Cuando el broker
+# no está accesible o la cola del publicador se llena, los mensajes se añaden
+# a segmentos append-only en un directorio; al reconectar, MqttPublisher los
+# re-publica con sus timestamps originales a una tasa limitada.
+#
+# Formato de segmento (spool-<nº>.seg): registros consecutivos
+#   <IIdBBH  crc32, len(cuerpo), ts (s epoch), tipo, retain, len(topic)
+#   topic (utf-8) + cuerpo
+# El crc cubre todo lo que va tras él; un registro cortado por un apagado se
+# descarta al abrir. El tamaño total está acotado: si se supera, se borra el
+# segmento más antiguo (se pierden los datos más viejos, no los nuevos).
+# La posición de re-publicación se guarda en el fichero 'cursor'.
+
+import os
+import struct
+import threading
+import zlib
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+RECORD = struct.Struct("<IIdBBH")
+KIND_RAW = 0      # mensaje ya codificado: se re-publica tal cual
+KIND_SAMPLE = 1   # muestra JSON {measurement, tags, fields}: se re-codifica con su ts
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+DEFAULT_SEGMENT_BYTES = 4 * 1024 * 1024
+SEGMENT_GLOB = "spool-*.seg"
+CURSOR_FILE = "cursor"
+
+SpoolRecord = Tuple[str, bytes, float, int, bool]  # topic, cuerpo, ts, tipo, retain
+
+
+def _segment_name(seq: int) -> str:
+    return f"spool-{seq:08d}.seg"
+
+
+def _read_records(f, limit: Optional[int] = None) -> Tuple[List[SpoolRecord], int]:
+    """Lee registros válidos desde la posición actual. Devuelve (registros, bytes válidos leídos)"""
+    records: List[SpoolRecord] = []
+    consumed = 0
+    while limit is None or len(records) < limit:
+        head = f.read(RECORD.size)
+        if len(head) < RECORD.size:
+            break
+        crc, body_len, ts, kind, retain, topic_len = RECORD.unpack(head)
+        data = f.read(topic_len + body_len)
+        if len(data) < topic_len + body_len or zlib.crc32(head[4:] + data) != crc:
+            break
+        records.append((data[:topic_len].decode("utf-8"), data[topic_len:], ts, kind, bool(retain)))
+        consumed += RECORD.size + topic_len + body_len
+    return records, consumed
+
+
+class DiskSpool:
+    """Cola FIFO persistente en segmentos, de tamaño acotado y segura entre hilos"""
+
+    def __init__(self, directory, max_bytes: int = DEFAULT_MAX_BYTES,
+                 segment_bytes: int = DEFAULT_SEGMENT_BYTES):
+        self.dir = Path(directory)
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.segment_bytes = max(1024, min(segment_bytes, max_bytes // 2 or segment_bytes))
+        self._lock = threading.Lock()
+
+        self.appended = 0
+        self.replayed = 0
+        self.dropped_bytes = 0
+        self.recovered_bytes = 0
+
+        self._sizes = {}
+        for path in sorted(self.dir.glob(SEGMENT_GLOB)):
+            try:
+                self._sizes[int(path.stem.split("-")[1])] = path.stat().st_size
+            except (ValueError, IndexError):
+                continue
+        if self._sizes:
+            self._recover(max(self._sizes))
+        else:
+            self._sizes[1] = 0
+
+        self._read_seq, self._read_pos = self._load_cursor()
+        self._write_seq = max(self._sizes)
+        self._write_f = open(self.dir / _segment_name(self._write_seq), "ab")
+
+    # ---------- arranque ----------
+    def _recover(self, seq: int) -> None:
+        """Recorta el último segmento hasta el último registro completo"""
+        path = self.dir / _segment_name(seq)
+        with open(path, "rb+") as f:
+            _, valid = _read_records(f)
+            size = f.seek(0, os.SEEK_END)
+            if valid < size:
+                f.truncate(valid)
+                self.recovered_bytes = size - valid
+        self._sizes[seq] = valid
+
+    def _load_cursor(self) -> Tuple[int, int]:
+        first = min(self._sizes)
+        try:
+            seq, pos = (int(x) for x in (self.dir / CURSOR_FILE).read_text().split())
+        except (OSError, ValueError):
+            return first, 0
+        if seq not in self._sizes:
+            return first, 0
+        return seq, min(pos, self._sizes[seq])
+
+    def _save_cursor(self) -> None:
+        tmp = self.dir / (CURSOR_FILE + ".tmp")
+        tmp.write_text(f"{self._read_seq} {self._read_pos}\n")
+        os.replace(tmp, self.dir / CURSOR_FILE)
+
+    # ---------- escritura ----------
+    def append(self, topic: str, body, ts: float, kind: int = KIND_RAW, retain: bool = False) -> None:
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        topic_b = topic.encode("utf-8")
+        head = RECORD.pack(0, len(body), ts, kind, int(retain), len(topic_b))[4:]
+        crc = zlib.crc32(head + topic_b + body)
+        record = struct.pack("<I", crc) + head + topic_b + body
+        with self._lock:
+            if self._sizes[self._write_seq] >= self.segment_bytes:
+                self._rotate()
+            self._write_f.write(record)
+            self._write_f.flush()
+            self._sizes[self._write_seq] += len(record)
+            self.appended += 1
+            self._enforce_limit()
+
+    def _rotate(self) -> None:
+        self._write_f.close()
+        self._write_seq += 1
+        self._sizes[self._write_seq] = 0
+        self._write_f = open(self.dir / _segment_name(self._write_seq), "ab")
+
+    def _enforce_limit(self) -> None:
+        while sum(self._sizes.values()) > self.max_bytes and len(self._sizes) > 1:
+            oldest = min(self._sizes)
+            if oldest == self._write_seq:
+                break
+            lost = self._sizes.pop(oldest)
+            if oldest == self._read_seq:
+                lost -= self._read_pos
+                self._read_seq, self._read_pos = min(self._sizes), 0
+                self._save_cursor()
+            elif oldest < self._read_seq:
+                lost = 0  # ya re-publicado
+            self.dropped_bytes += lost
+            try:
+                os.remove(self.dir / _segment_name(oldest))
+            except OSError:
+                pass
+
+    # ---------- lectura ----------
+    def pending_bytes(self) -> int:
+        with self._lock:
+            return sum(size for seq, size in self._sizes.items() if seq >= self._read_seq) - self._read_pos
+
+    def __bool__(self) -> bool:
+        return self.pending_bytes() > 0
+
+    def read(self, max_records: int) -> Tuple[List[SpoolRecord], Tuple[int, int]]:
+        """Siguientes registros sin consumirlos; commit(token) los da por enviados"""
+        with self._lock:
+            seq, pos = self._read_seq, self._read_pos
+            records: List[SpoolRecord] = []
+            while len(records) < max_records:
+                size = self._sizes.get(seq)
+                if size is None:
+                    break
+                if pos >= size:
+                    if seq == self._write_seq:
+                        break
+                    seq, pos = min(s for s in self._sizes if s > seq), 0
+                    continue
+                if seq == self._write_seq:
+                    self._write_f.flush()
+                with open(self.dir / _segment_name(seq), "rb") as f:
+                    f.seek(pos)
+                    chunk, consumed = _read_records(f, max_records - len(records))
+                if not chunk:
+                    pos = size  # resto ilegible: se salta
+                    continue
+                records.extend(chunk)
+                pos += consumed
+            return records, (seq, pos)
+
+    def commit(self, token: Tuple[int, int], count: int = 0) -> None:
+        """Avanza el cursor y borra los segmentos ya re-publicados"""
+        with self._lock:
+            seq, pos = token
+            if seq not in self._sizes:
+                # _enforce_limit() borró el segmento entre read() y commit()
+                seq, pos = max(seq, min(self._sizes)), 0
+            if (seq, pos) < (self._read_seq, self._read_pos):
+                seq, pos = self._read_seq, self._read_pos  # el cursor nunca retrocede
+            for old in [s for s in self._sizes if s < seq]:
+                self._sizes.pop(old)
+                try:
+                    os.remove(self.dir / _segment_name(old))
+                except OSError:
+                    pass
+            if seq == self._write_seq and pos >= self._sizes[seq] and pos > 0:
+                # Todo enviado: vacía el segmento activo en lugar de dejarlo crecer
+                self._write_f.close()
+                os.remove(self.dir / _segment_name(seq))
+                self._sizes.pop(seq)
+                self._write_seq += 1
+                self._sizes[self._write_seq] = 0
+                self._write_f = open(self.dir / _segment_name(self._write_seq), "ab")
+                seq, pos = self._write_seq, 0
+            self._read_seq, self._read_pos = seq, pos
+            self.replayed += count
+            self._save_cursor()
+
+    def close(self) -> None:
+        with self._lock:
+            if not self._write_f.closed:
+                self._write_f.close()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# fake_pcm.py
+#
+# pcm.exe falso para probar pcm_csv_to_mqtt.py en Linux: escribe por stdout
+# las dos cabeceras CSV (System,... / Date,Time,...) con las 549 columnas de
+# pcm_csv_to_mqtt_parametros.csv y una fila por intervalo con valores
+# sintéticos y la hora local en Date/Time, como 'pcm 1 -csv'.
+# Puede simular los fallos que vigila el supervisor del puente:
+#   --die-after N    termina con código 1 tras N filas
+#   --stall-after N  deja de escribir tras N filas sin terminar (colgado)
+#   --lag-ms MS      Date/Time van MS por detrás de la hora real
+#
+# Uso (los argumentos propios van dentro de --pcm-exe):
+#   python pcm_csv_to_mqtt.py --pcm-exe "fake_pcm.py --die-after 20" --mqtt-host 127.0.0.1 --mqtt-port 1883
+
+import argparse
+import csv
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+COLUMNS_FILE = Path(__file__).resolve().parent / "pcm_csv_to_mqtt_parametros.csv"
+
+
+def load_columns(path: Path):
+    components, metrics = [], []
+    with path.open("r", encoding="utf-8", errors="ignore", newline="") as f:
+        for row in csv.DictReader(f):
+            components.append((row.get("Component") or row.get("component") or "").strip())
+            metrics.append((row.get("Metric") or row.get("metric") or "").strip())
+    return components, metrics
+
+
+def main():
+    parser = argparse.ArgumentParser(description="pcm.exe simulado (salida CSV por stdout)")
+    parser.add_argument("interval", nargs="?", type=float, default=1.0, help="Segundos entre filas (como pcm.exe)")
+    parser.add_argument("--die-after", type=int, default=0, help="Terminar con código 1 tras N filas (0 = nunca)")
+    parser.add_argument("--stall-after", type=int, default=0, help="Dejar de escribir tras N filas (0 = nunca)")
+    parser.add_argument("--lag-ms", type=float, default=0.0, help="Retraso de Date/Time respecto a la hora real (ms)")
+    parser.add_argument("--startup", type=float, default=0.5, help="Segundos antes de las cabeceras (carga del driver)")
+    parser.add_argument("--seed", type=int, default=None, help="Semilla de los valores")
+    args, _ = parser.parse_known_args()  # ignora -csv y demás opciones de pcm.exe
+
+    components, metrics = load_columns(COLUMNS_FILE)
+    rng = random.Random(args.seed)
+
+    print("INFO: fake_pcm (simulación)", flush=True)
+    time.sleep(args.startup)
+    print(",".join(components))
+    print(",".join(metrics), flush=True)
+
+    rows = 0
+    next_t = time.monotonic()
+    while True:
+        next_t += args.interval
+        time.sleep(max(0.0, next_t - time.monotonic()))
+        t = datetime.now() - timedelta(milliseconds=args.lag_ms)
+        values = [t.strftime("%Y-%m-%d"), t.strftime("%H:%M:%S.%f")[:-3]]
+        values += [f"{rng.uniform(0, 100):.4g}" for _ in components[2:]]
+        print(",".join(values), flush=True)
+        rows += 1
+        if args.die_after and rows >= args.die_after:
+            print("Error: fake_pcm terminado a propósito", file=sys.stderr, flush=True)
+            sys.exit(1)
+        if args.stall_after and rows >= args.stall_after:
+            while True:
+                time.sleep(3600)
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except (KeyboardInterrupt, BrokenPipeError):
+        pass
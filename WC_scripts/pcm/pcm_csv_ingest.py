@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+# pcm_csv_ingest.py
+#
+# Ingesta offline de CSV grabados con 'pcm -csv=fichero.csv'. Usa la misma
+# detección de cabeceras y el mismo mapping que pcm_csv_to_mqtt.py, pero en
+# lugar de leer el stdout de pcm.exe en vivo procesa ficheros completos:
+# cada fichero se parte en trozos por bytes (alineados a fin de línea) y un
+# pool de procesos proyecta las filas de cada trozo en paralelo.
+#
+# Salidas:
+#   --bin DIR    un fichero VTMBIN por CSV (vatimetro_binlog.py: columnar,
+#                t_ns + una columna float32 por métrica, NaN si falta)
+#   --publish    publica las muestras por MQTT en lotes con su timestamp
+#                original (opciones de mqtt_publisher.py; cola en modo block)
+#
+# Uso:
+#   python pcm_csv_ingest.py pcm_run1.csv pcm_run2.csv --bin pcm_bin --workers 8
+#   python pcm_csv_ingest.py pcm_run1.csv --publish --batch 500 --batch-format packed
+
+import argparse
+import math
+import os
+import sys
+import time
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import List, Tuple
+
+import paho.mqtt.client as mqtt
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent / "Vatímetro"))
+
+import pcm_csv_to_mqtt as pcm
+from mqtt_publisher import MqttPublisher, add_publisher_arguments
+
+DEFAULT_CHUNK_MB = 8.0
+DEFAULT_PUBLISH_BATCH = 500
+HEADER_SCAN_LINES = 50  # líneas en las que buscar las cabeceras System/Date
+
+# Estado de cada proceso del pool (se fija una vez por fichero en el initializer)
+_plan: List[Tuple[int, str]] = []
+_n_columns = 0
+_width = 0
+
+
+def find_headers(path: Path):
+    """Devuelve (cabecera componentes, cabecera métricas, offset de la primera fila de datos)"""
+    components_header = None
+    with path.open("rb") as f:
+        for _ in range(HEADER_SCAN_LINES):
+            raw = f.readline()
+            if not raw:
+                break
+            line = raw.decode("utf-8", errors="ignore").rstrip("\r\n")
+            if components_header is None:
+                if line.startswith("System,"):
+                    components_header = pcm.parse_csv_line(line)
+            elif line.startswith("Date,"):
+                return components_header, pcm.parse_csv_line(line), f.tell()
+    raise ValueError(f"{path}: no se encontraron las cabeceras 'System,...' / 'Date,...' de PCM")
+
+
+def split_ranges(path: Path, start: int, chunk_bytes: int) -> List[Tuple[int, int]]:
+    """Trozos [inicio, fin) de ~chunk_bytes alineados al principio de una línea"""
+    size = path.stat().st_size
+    ranges = []
+    with path.open("rb") as f:
+        pos = start
+        while pos < size:
+            end = pos + chunk_bytes
+            if end >= size:
+                end = size
+            else:
+                f.seek(end)
+                f.readline()
+                end = f.tell()
+            ranges.append((pos, end))
+            pos = end
+    return ranges
+
+
+def _init_worker(plan, n_columns, width):
+    global _plan, _n_columns, _width
+    _plan, _n_columns, _width = plan, n_columns, width
+
+
+def process_range(path: str, start: int, end: int):
+    """Trozo del fichero -> (t_ns, [columna float32 por clave del plan], filas descartadas)"""
+    with open(path, "rb") as f:
+        f.seek(start)
+        data = f.read(end - start).decode("utf-8", errors="ignore")
+
+    indices = [idx for idx, _ in _plan]
+    t_ns = array("q")
+    columns = [array("f") for _ in indices]
+    pairs = list(zip(columns, indices))
+    nan = math.nan
+    width = max(_width, 2)
+    hour_cache = {}
+    skipped = 0
+    for line in pcm.iter_clean_lines(data.splitlines()):
+        # Igual que project_row(), pero directo a columnas (sin dict por fila)
+        if '"' in line:
+            row = pcm.parse_csv_line(line)
+        elif line.count(",") + 1 >= _n_columns:
+            row = line.split(",", width)
+        else:
+            row = ()
+        if len(row) < min(_n_columns, width):
+            skipped += 1
+            continue
+        ts = pcm.row_time_ns(row[0], row[1], hour_cache)
+        if ts is None:
+            skipped += 1
+            continue
+        t_ns.append(ts)
+        for column, idx in pairs:
+            try:
+                column.append(float(row[idx]))
+            except ValueError:
+                column.append(nan)
+    return t_ns, columns, skipped
+
+
+def ingest_file(path: Path, fixed_pairs, core_template_metrics, args, sink_factory, on_chunk):
+    components_header, metrics_header, data_start = find_headers(path)
+    plan, width, n_columns, detected_cores, selected_pairs = pcm.prepare_headers(
+        components_header, metrics_header, fixed_pairs, core_template_metrics
+    )
+    keys = [key for _, key in plan]
+    ranges = split_ranges(path, data_start, int(args.chunk_mb * 2**20))
+    print(f"▶ {path.name}: {n_columns} columnas | cores: {len(detected_cores)} | "
+          f"métricas: {len(keys)} | {len(ranges)} trozos")
+
+    sink = sink_factory(path, keys)
+    rows = skipped = 0
+    try:
+        with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker,
+                                 initargs=(plan, n_columns, width)) as pool:
+            # map() conserva el orden de los trozos: las filas salen ordenadas en el tiempo
+            results = pool.map(process_range, [str(path)] * len(ranges),
+                               [r[0] for r in ranges], [r[1] for r in ranges])
+            for t_ns, columns, bad in results:
+                rows += len(t_ns)
+                skipped += bad
+                if len(t_ns):
+                    on_chunk(sink, keys, t_ns, columns)
+    finally:
+        if sink is not None:
+            sink.close()
+    return rows, skipped
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Ingesta offline de CSV de PCM (pcm -csv=fichero) en paralelo.")
+    ap.add_argument("files", nargs="+", help="CSV grabados por PCM")
+    ap.add_argument("--mapping", default=pcm.MAPPING_FILE, help=f"Mapping de métricas (default: {pcm.MAPPING_FILE})")
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                    help="Procesos del pool (default: nº de CPUs)")
+    ap.add_argument("--chunk-mb", type=float, default=DEFAULT_CHUNK_MB,
+                    help=f"Tamaño de cada trozo en MB (default: {DEFAULT_CHUNK_MB:g})")
+    out = ap.add_mutually_exclusive_group(required=True)
+    out.add_argument("--bin", metavar="DIR", help="Escribir un .bin (VTMBIN) por CSV en DIR")
+    out.add_argument("--publish", action="store_true", help="Publicar por MQTT en lotes con los timestamps originales")
+    add_publisher_arguments(ap)
+    args = ap.parse_args()
+
+    mapping_path = Path(args.mapping)
+    if not mapping_path.exists() and not mapping_path.is_absolute():
+        mapping_path = Path(__file__).resolve().parent / args.mapping
+    if not mapping_path.exists():
+        print(f"❌ No existe el mapping: {mapping_path}")
+        sys.exit(1)
+    fixed_pairs, core_template_metrics = pcm.load_mapping(mapping_path)
+
+    client = publisher = None
+    if args.bin:
+        from vatimetro_binlog import BinarySink
+
+        out_dir = Path(args.bin)
+        out_dir.mkdir(parents=True, exist_ok=True)
+
+        def sink_factory(path, keys):
+            bin_path = out_dir / (path.stem + ".bin")
+            print(f"  -> {bin_path}")
+            return BinarySink(str(bin_path), columns=[(key, "f") for key in keys], mode="w")
+
+        def on_chunk(sink, keys, t_ns, columns):
+            sink.write_columns(t_ns, dict(zip(keys, columns)))
+    else:
+        # Ingesta: nada se descarta (la cola espera) y por defecto se agrupa en lotes
+        args.queue_policy = "block"
+        if args.batch <= 1:
+            args.batch = DEFAULT_PUBLISH_BATCH
+        client = mqtt.Client()
+        client.username_pw_set(pcm.MQTT_USERNAME, pcm.MQTT_PASSWORD)
+        mqtt_host = args.mqtt_host or pcm.MQTT_HOST
+        mqtt_port = args.mqtt_port or pcm.MQTT_PORT
+        client.connect(mqtt_host, mqtt_port, keepalive=30)
+        client.loop_start()
+        publisher = MqttPublisher.from_args(client, pcm.MQTT_TOPIC, args).start()
+        print(f"✅ MQTT conectado a {mqtt_host}:{mqtt_port} topic='{pcm.MQTT_TOPIC}'")
+
+        def sink_factory(path, keys):
+            return None
+
+        def on_chunk(sink, keys, t_ns, columns):
+            for i, ts in enumerate(t_ns):
+                fields = {}
+                for key, column in zip(keys, columns):
+                    value = column[i]
+                    if value == value:  # NaN = sin dato
+                        fields[key] = value
+                payload = {"measurement": pcm.MQTT_MEASUREMENT, "tags": {"device": pcm.MQTT_DEVICE}, "fields": fields}
+                publisher.publish_sample(payload, ts=ts / 1e9)
+
+    total_rows = total_skipped = 0
+    t0 = time.perf_counter()
+    try:
+        for name in args.files:
+            path = Path(name)
+            t_file = time.perf_counter()
+            try:
+                rows, skipped = ingest_file(path, fixed_pairs, core_template_metrics, args, sink_factory, on_chunk)
+            except (OSError, ValueError) as e:
+                print(f"❌ {path}: {e}")
+                continue
+            dt = time.perf_counter() - t_file
+            total_rows += rows
+            total_skipped += skipped
+            print(f"✓ {path.name}: {rows:,} filas ({skipped} descartadas) en {dt:.2f} s "
+                  f"-> {rows / dt if dt > 0 else 0:,.0f} filas/s")
+    except KeyboardInterrupt:
+        print("\nSaliendo...")
+    finally:
+        if publisher is not None:
+            publisher.stop(timeout=60)
+            print(f"📈 MQTT: {publisher.format_stats()}")
+            client.loop_stop()
+            client.disconnect()
+
+    dt = time.perf_counter() - t0
+    print(f"📈 Total: {total_rows:,} filas ({total_skipped} descartadas) en {dt:.2f} s "
+          f"-> {total_rows / dt if dt > 0 else 0:,.0f} filas/s con {args.workers} procesos")
+
+
+if __name__ == "__main__":
+    main()
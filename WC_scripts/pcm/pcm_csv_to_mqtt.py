@@ -2,18 +2,52 @@
 # pcm_csv_to_mqtt.py
 #
 # Lanza Intel PCM en modo CSV, extrae métricas seleccionadas y publica JSON por MQTT.
+#
+# El mapping se puede recargar en caliente sin relanzar pcm.exe (se conserva
+# su calentamiento): al guardar el fichero, con la señal SIGHUP (SIGBREAK /
+# Ctrl+Break en Windows) o con un comando MQTT de control
+#   {"measurement":"control","fields":{"cmd":"reload_mapping"}}
+# (desde mqtt_gui.py: escribir reload_mapping y pulsar "Send (custom)").
+# La proyección se recompila entera y se cambia entre dos filas.
+#
+# pcm.exe corre bajo un supervisor: si termina o deja de escribir filas
+# (--stall-timeout) se relanza con backoff exponencial y se vuelven a
+# detectar las cabeceras. Cada --latency-interval s se publica un histograma
+# (measurement pcm_latency) del retardo entre las columnas Date/Time de PCM y
+# la publicación MQTT. Para probarlo sin Windows: fake_pcm.py
+#   python pcm_csv_to_mqtt.py --pcm-exe fake_pcm.py --mqtt-host 127.0.0.1 --mqtt-port 1883
+#
+# Con --aggregate calcula en la misma pasada mean/min/max/sum de cada métrica
+# por core (IPC, AFREQ, C0res%, TEMP...) para cada grupo de cores (por defecto
+# P-cores / E-cores), p.ej. pcores_ipc_mean. 'both' publica agregados y
+# métricas por core; 'only' sustituye las métricas por core por los agregados.
+#   python pcm_csv_to_mqtt.py --aggregate only
+#   python pcm_csv_to_mqtt.py --aggregate both --group big=0,1,6-9 --group little=2-5,10-17
 
 import argparse
 import csv
 import json
+import os
+import queue
 import re
+import shlex
+import signal
 import subprocess
 import sys
+import threading
+import time
+from datetime import datetime
 from pathlib import Path
-from typing import Dict, Iterable, List, Tuple
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
 
 import paho.mqtt.client as mqtt
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from field_filter import PCM_DEADBAND_DEFAULTS, DeadbandFilter, add_filter_arguments
+from mqtt_publisher import LatencyHistogram, MqttPublisher, add_publisher_arguments
+from status_view import StatusView, add_view_arguments
+
 # ====== MQTT SETTINGS (por defecto) ======
 MQTT_HOST = "155.210.152.63"
 MQTT_PORT = 8080
@@ -22,6 +56,7 @@ MQTT_PASSWORD = "paip2020"
 MQTT_TOPIC = "cooler"
 MQTT_DEVICE = "pcm"
 MQTT_MEASUREMENT = "pcm"
+LATENCY_MEASUREMENT = "pcm_latency"
 
 # ====== PCM SETTINGS (fijos) ======
 PCM_EXE = r"C:\Program Files (x86)\PCM\pcm.exe"
@@ -29,9 +64,35 @@ PCM_INTERVAL = 1
 PCM_EXTRA_ARGS = ["-csv"]
 MAPPING_FILE = "pcm_csv_to_mqtt_parametros_filtrada.csv"
 PCM_STDERR_LOG_FILE = "pcm_stderr.log"
+MAPPING_CHECK_INTERVAL = 2.0  # s entre comprobaciones del mtime del mapping
+MAPPING_SETTLE = 0.5  # s sin cambios antes de releer (el editor puede estar escribiendo)
+RELOAD_COMMAND = "reload_mapping"
+
+# ====== SUPERVISOR ======
+STALL_TIMEOUT = 15.0  # s sin filas para dar pcm.exe por colgado
+EXIT_TIMEOUT = 5.0  # s de espera a que pcm.exe termine tras cerrar stdout
+STARTUP_TIMEOUT = 60.0  # s hasta la primera línea (carga del driver)
+BACKOFF_MIN = 1.0
+BACKOFF_MAX = 60.0
+HEALTHY_AFTER = 60.0  # s funcionando para reiniciar el backoff
+SUPERVISOR_TICK = 1.0  # s entre ticks sin datos (recargas, histograma)
+LATENCY_INTERVAL = 10.0  # s entre histogramas de latencia publicados
 
 CORE0_COMPONENT = "Core0 (Socket 0)"
-CORE_PATTERN = re.compile(r"^Core\d+ \(Socket \d+\)$")
+CORE_PATTERN = re.compile(r"^Core(\d+) \(Socket \d+\)$")
+
+# ====== AGREGADOS POR GRUPO DE CORES (--aggregate) ======
+# Misma topología híbrida que Afinidad Procesos/automatization.py
+CORE_GROUPS = {
+    "pcores": [0, 1, 6, 7, 8, 9, 18, 19],
+    "ecores": [2, 3, 4, 5, 10, 11, 12, 13, 14, 15, 16, 17],
+}
+AGG_STATS = ("mean", "min", "max", "sum")
+AGG_MODES = ("off", "both", "only")
+
+# ====== DEADBAND (--deadband-defaults) ======
+# Temperaturas de PCM (°C enteros): solo se publican cuando cambian (ver field_filter.py)
+DEADBAND_DEFAULTS = PCM_DEADBAND_DEFAULTS
 
 
 def sanitize_token(text: str) -> str:
@@ -100,6 +161,62 @@ def build_pair_index(components: List[str], metrics: List[str]) -> Dict[Tuple[st
     return pair_to_index
 
 
+def expand_core_pairs(
+    components: List[str],
+    fixed_pairs: List[Tuple[str, str]],
+    core_template_metrics: List[str],
+) -> Tuple[List[Tuple[str, str]], List[str]]:
+    """Pares fijos + la plantilla Core0 repetida para cada 'CoreN (Socket M)' de la cabecera"""
+    detected_cores: List[str] = []
+    for comp in components:
+        c = comp.strip()
+        if CORE_PATTERN.match(c) and c not in detected_cores:
+            detected_cores.append(c)
+
+    selected_pairs = list(fixed_pairs)
+    for core_name in detected_cores:
+        for metric in core_template_metrics:
+            pair = (core_name, metric)
+            if pair not in selected_pairs:
+                selected_pairs.append(pair)
+    return selected_pairs, detected_cores
+
+
+def prepare_headers(
+    components_header: List[str],
+    metrics_header: List[str],
+    fixed_pairs: List[Tuple[str, str]],
+    core_template_metrics: List[str],
+):
+    """Cabeceras 'System,...' y 'Date,...' -> (plan, ancho, nº columnas, cores, pares seleccionados)"""
+    n = min(len(components_header), len(metrics_header))
+    components_header = components_header[:n]
+    metrics_header = metrics_header[:n]
+    pair_to_index = build_pair_index(components_header, metrics_header)
+    selected_pairs, detected_cores = expand_core_pairs(components_header, fixed_pairs, core_template_metrics)
+    plan = compile_projection(selected_pairs, pair_to_index)
+    return plan, projection_width(plan), n, detected_cores, selected_pairs
+
+
+def row_time_ns(date: str, clock: str, hour_cache: Optional[dict] = None) -> Optional[int]:
+    """Columnas Date/Time de PCM ('2025-01-01', '12:00:00.123') -> ns desde epoch (hora local)"""
+    try:
+        if hour_cache is None or len(clock) < 8 or clock[2] != ":" or clock[5] != ":":
+            dt = datetime.fromisoformat(f"{date.strip()}T{clock.strip()}")
+            return int(dt.replace(microsecond=0).timestamp()) * 1_000_000_000 + dt.microsecond * 1000
+        # Camino rápido: el inicio de cada hora se calcula una vez (por hora y no
+        # por día para respetar los cambios de horario de verano)
+        key = (date, clock[0:2])
+        hour_ns = hour_cache.get(key)
+        if hour_ns is None:
+            hour_ns = int(datetime.fromisoformat(f"{date.strip()}T{clock[0:2]}:00:00").timestamp()) * 1_000_000_000
+            hour_cache[key] = hour_ns
+        seconds = int(clock[3:5]) * 60 + float(clock[6:])
+        return hour_ns + int(round(seconds * 1e9))
+    except ValueError:
+        return None
+
+
 def parse_float(value: str):
     txt = value.strip()
     if not txt:
@@ -110,6 +227,303 @@ def parse_float(value: str):
         return None
 
 
+def compile_projection(
+    selected_pairs: List[Tuple[str, str]],
+    pair_to_index: Dict[Tuple[str, str], int],
+) -> List[Tuple[int, str]]:
+    """Plan (índice de columna, clave JSON) calculado una vez al llegar las cabeceras"""
+    plan: List[Tuple[int, str]] = []
+    for component, metric in selected_pairs:
+        idx = pair_to_index.get((component, metric))
+        if idx is None:
+            print(f"⚠️ No encontrado en cabecera: {component} | {metric}")
+            continue
+        plan.append((idx, json_key(component, metric)))
+    return plan
+
+
+def projection_width(plan: List[Tuple[int, str]]) -> int:
+    """Número de columnas que hay que partir para cubrir el plan"""
+    return max((idx for idx, _ in plan), default=-1) + 1
+
+
+def project_row(line: str, plan: List[Tuple[int, str]], n_columns: int, width: int):
+    """Extrae los campos del plan de una fila CSV; None si la fila está incompleta"""
+    if '"' in line:
+        row = parse_csv_line(line)
+        if len(row) < n_columns:
+            return None
+    else:
+        # Sin comillas no hace falta el módulo csv: basta partir hasta la última columna usada
+        if line.count(",") + 1 < n_columns:
+            return None
+        row = line.split(",", width)
+
+    fields = {}
+    for idx, key in plan:
+        try:
+            fields[key] = float(row[idx])
+        except (ValueError, IndexError):
+            continue
+    return fields
+
+
+def parse_core_list(text: str) -> List[int]:
+    """'0,1,6-9' -> [0, 1, 6, 7, 8, 9]"""
+    cores: List[int] = []
+    for part in text.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            lo, hi = (int(x) for x in part.split("-", 1))
+            cores.extend(range(lo, hi + 1))
+        else:
+            cores.append(int(part))
+    return cores
+
+
+def parse_group_args(values: List[str]) -> Dict[str, List[int]]:
+    """['pcores=0,1,6-9', ...] -> {'pcores': [0, 1, 6, 7, 8, 9]}"""
+    groups: Dict[str, List[int]] = {}
+    for value in values:
+        name, sep, cores = value.partition("=")
+        if not sep or not name.strip():
+            raise ValueError(f"Grupo inválido '{value}' (usa NOMBRE=0,1,6-9)")
+        groups[name.strip()] = parse_core_list(cores)
+    return groups
+
+
+def compile_aggregation(
+    groups: Dict[str, List[int]],
+    detected_cores: List[str],
+    core_template_metrics: List[str],
+    plan: List[Tuple[int, str]],
+    stats: Iterable[str] = AGG_STATS,
+) -> List[Tuple[List[str], str, str, str, str]]:
+    """Plan de agregados: (claves de los cores del grupo, clave mean, min, max, sum); None si no se pide"""
+    planned = {key for _, key in plan}
+    stats = set(stats)
+    core_number = {}
+    for core_name in detected_cores:
+        m = CORE_PATTERN.match(core_name)
+        core_number.setdefault(int(m.group(1)), core_name)
+
+    agg_plan = []
+    for group, cores in groups.items():
+        names = [core_number[c] for c in cores if c in core_number]
+        missing = [c for c in cores if c not in core_number]
+        if missing:
+            print(f"⚠️ Grupo '{group}': cores no presentes en la cabecera: {missing}")
+        for metric in core_template_metrics:
+            keys = [k for k in (json_key(name, metric) for name in names) if k in planned]
+            if not keys:
+                continue
+            prefix = f"{sanitize_token(group)}_{sanitize_token(metric)}"
+            agg_plan.append((keys, *(f"{prefix}_{stat}" if stat in stats else None for stat in AGG_STATS)))
+    return agg_plan
+
+
+def aggregate_fields(fields: Dict[str, float], agg_plan) -> Dict[str, float]:
+    """Calcula mean/min/max/sum por grupo sobre los campos ya proyectados de una fila"""
+    out = {}
+    for keys, mean_key, min_key, max_key, sum_key in agg_plan:
+        try:
+            values = [fields[k] for k in keys]
+        except KeyError:
+            # Algún core sin valor en esta fila: se agrega sobre los que haya
+            values = [fields[k] for k in keys if k in fields]
+            if not values:
+                continue
+        total = sum(values)
+        if mean_key:
+            out[mean_key] = total / len(values)
+        if min_key:
+            out[min_key] = min(values)
+        if max_key:
+            out[max_key] = max(values)
+        if sum_key:
+            out[sum_key] = total
+    return out
+
+
+RESTARTED = object()  # PcmSupervisor.lines(): pcm.exe relanzado, hay que releer cabeceras
+
+
+class PcmSupervisor:
+    """Lanza pcm.exe y lo relanza con backoff si termina o deja de escribir"""
+
+    def __init__(self, cmd: List[str], stderr_fh, stall_timeout: float = STALL_TIMEOUT,
+                 startup_timeout: float = STARTUP_TIMEOUT, backoff_max: float = BACKOFF_MAX,
+                 notify: Callable[[str], None] = print):
+        self.cmd = cmd
+        self.stderr_fh = stderr_fh
+        self.stall_timeout = stall_timeout
+        self.startup_timeout = max(startup_timeout, stall_timeout)
+        self.backoff_max = backoff_max
+        self.notify = notify  # avisos de reinicio (print o el panel de estado)
+        self.proc: Optional[subprocess.Popen] = None
+        self.restarts = 0
+        self._failures = 0
+        self._stopping = False
+        self._spawn_error = None
+
+    def _spawn(self) -> None:
+        self._lines: "queue.Queue" = queue.Queue()
+        self._started = time.monotonic()
+        self._last_output = None
+        try:
+            self.proc = subprocess.Popen(
+                self.cmd,
+                stdout=subprocess.PIPE,
+                stderr=self.stderr_fh,
+                text=True,
+                encoding="utf-8",
+                errors="ignore",
+                bufsize=1,
+            )
+        except OSError as e:
+            self.proc = None
+            self._spawn_error = e
+            self._lines.put(None)
+            return
+        # Un hilo por proceso lee stdout: el bucle principal no se queda bloqueado si PCM se cuelga
+        threading.Thread(target=self._reader, args=(self.proc, self._lines), name="pcm-stdout", daemon=True).start()
+
+    @staticmethod
+    def _reader(proc, lines) -> None:
+        try:
+            for raw in proc.stdout:
+                lines.put(raw)
+        except (OSError, ValueError):
+            pass
+        lines.put(None)
+
+    def _kill(self) -> None:
+        proc = self.proc
+        if proc is None or proc.poll() is not None:
+            return
+        try:
+            proc.terminate()
+            proc.wait(timeout=2)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+        except OSError:
+            pass
+
+    def lines(self, tick: float = SUPERVISOR_TICK):
+        """Líneas limpias de pcm.exe; None en cada tick sin datos y RESTARTED tras relanzarlo"""
+        self._spawn()
+        while not self._stopping:
+            try:
+                raw = self._lines.get(timeout=tick)
+            except queue.Empty:
+                raw = ""
+            now = time.monotonic()
+            if raw:
+                for line in iter_clean_lines((raw,)):
+                    self._last_output = now
+                    yield line
+                continue
+            if raw is None:
+                if self.proc is None:
+                    reason = f"no se pudo lanzar PCM ({self._spawn_error})"
+                else:
+                    try:
+                        reason = f"PCM terminó (código {self.proc.wait(timeout=EXIT_TIMEOUT)})"
+                    except subprocess.TimeoutExpired:
+                        # stdout cerrado o roto pero el proceso sigue vivo: se mata
+                        self._kill()
+                        reason = f"PCM cerró stdout y seguía en marcha tras {EXIT_TIMEOUT:.0f} s"
+            elif self._last_output is None and now - self._started > self.startup_timeout:
+                reason = f"PCM sin salida {self.startup_timeout:.0f} s tras arrancar"
+            elif self._last_output is not None and now - self._last_output > self.stall_timeout:
+                reason = f"PCM sin filas durante {now - self._last_output:.0f} s"
+            else:
+                yield None
+                continue
+            yield from self._restart(reason)
+
+    def _restart(self, reason: str):
+        self._kill()
+        if self._last_output is not None and time.monotonic() - self._started >= HEALTHY_AFTER:
+            self._failures = 0
+        delay = min(self.backoff_max, BACKOFF_MIN * 2 ** self._failures)
+        self._failures += 1
+        self.restarts += 1
+        self.notify(f"⚠️ {reason}; relanzando en {delay:.0f} s (reinicio nº {self.restarts})")
+        deadline = time.monotonic() + delay
+        while not self._stopping and time.monotonic() < deadline:
+            time.sleep(min(SUPERVISOR_TICK, max(0.0, deadline - time.monotonic())))
+            yield None  # el bucle principal sigue atendiendo recargas e histogramas
+        if self._stopping:
+            return
+        self._spawn()
+        yield RESTARTED
+
+    def stop(self) -> None:
+        self._stopping = True
+        self._kill()
+
+
+class MappingWatcher:
+    """Decide cuándo recargar el mapping: cambio en disco, señal o comando MQTT"""
+
+    def __init__(self, path: Path, interval: float = MAPPING_CHECK_INTERVAL):
+        self.path = path
+        self.interval = interval
+        self._signature = self._stat()
+        self._next_check = time.monotonic() + interval
+        self._requested = threading.Event()
+        self._reason = ""
+
+    def _stat(self):
+        try:
+            st = self.path.stat()
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def request(self, reason: str) -> None:
+        """Pide una recarga (seguro desde el hilo MQTT o un manejador de señal)"""
+        self._reason = reason
+        self._requested.set()
+
+    def poll(self) -> Optional[str]:
+        """Motivo de la recarga si toca hacerla ahora; None si no"""
+        if self._requested.is_set():
+            self._requested.clear()
+            self._signature = self._stat()
+            return self._reason
+        if self.interval <= 0:
+            return None
+        now = time.monotonic()
+        if now < self._next_check:
+            return None
+        self._next_check = now + self.interval
+        signature = self._stat()
+        if signature is None or signature == self._signature:
+            return None
+        if time.time() - signature[0] / 1e9 < MAPPING_SETTLE:
+            return None  # aún se está escribiendo: se mira en la siguiente comprobación
+        self._signature = signature
+        return "fichero modificado"
+
+
+def is_reload_command(raw: bytes) -> bool:
+    """Mensaje de control {"measurement":"control","fields":{"cmd":"reload_mapping"}}"""
+    if RELOAD_COMMAND.encode() not in raw:
+        return False
+    try:
+        payload = json.loads(raw)
+    except (ValueError, UnicodeDecodeError):
+        return False
+    if not isinstance(payload, dict) or payload.get("measurement") != "control":
+        return False
+    fields = payload.get("fields") or {}
+    return RELOAD_COMMAND in (fields.get("cmd"), fields.get("text"))
+
+
 def main():
     ap = argparse.ArgumentParser(
         description="Lanza PCM, extrae métricas seleccionadas y publica JSON por MQTT."
@@ -124,7 +538,72 @@ def main():
         default="pcm_mqtt_debug.jsonl",
         help="Ruta del archivo de depuración JSONL (usado con --json-log)",
     )
+    ap.add_argument(
+        "--aggregate",
+        choices=AGG_MODES,
+        default="off",
+        help="Agregados por grupo de cores: off, both (agregados + métricas por core) u only (solo agregados)",
+    )
+    ap.add_argument(
+        "--group",
+        action="append",
+        default=[],
+        metavar="NOMBRE=CORES",
+        help="Grupo de cores para --aggregate, p.ej. pcores=0,1,6-9 (repetible; "
+             "por defecto: " + ", ".join(CORE_GROUPS) + ")",
+    )
+    ap.add_argument(
+        "--agg-stats",
+        default=",".join(AGG_STATS),
+        help=f"Estadísticos a publicar (default: {','.join(AGG_STATS)})",
+    )
+    ap.add_argument(
+        "--pcm-exe",
+        default=PCM_EXE,
+        help="Ejecutable de PCM, con argumentos si hace falta (un .py se lanza con este intérprete, "
+             "p.ej. \"fake_pcm.py --die-after 20\")",
+    )
+    ap.add_argument(
+        "--stall-timeout",
+        type=float,
+        default=STALL_TIMEOUT,
+        help=f"Segundos sin filas para relanzar PCM (default: {STALL_TIMEOUT:g})",
+    )
+    ap.add_argument(
+        "--backoff-max",
+        type=float,
+        default=BACKOFF_MAX,
+        help=f"Espera máxima entre reinicios de PCM en s (default: {BACKOFF_MAX:g})",
+    )
+    ap.add_argument(
+        "--latency-interval",
+        type=float,
+        default=LATENCY_INTERVAL,
+        help=f"Segundos entre histogramas de latencia PCM->MQTT publicados (0 = no; default: {LATENCY_INTERVAL:g})",
+    )
+    ap.add_argument(
+        "--mapping-check",
+        type=float,
+        default=MAPPING_CHECK_INTERVAL,
+        help=f"Segundos entre comprobaciones del mapping para recargarlo (0 = no vigilar; default: {MAPPING_CHECK_INTERVAL:g})",
+    )
+    add_publisher_arguments(ap)
+    add_filter_arguments(ap, DEADBAND_DEFAULTS)
+    add_view_arguments(ap)
     args = ap.parse_args()
+    try:
+        deadband = DeadbandFilter.from_args(args, DEADBAND_DEFAULTS)
+    except ValueError as e:
+        ap.error(str(e))
+
+    try:
+        core_groups = parse_group_args(args.group) if args.group else dict(CORE_GROUPS)
+    except ValueError as e:
+        ap.error(str(e))
+    agg_stats = [s.strip() for s in args.agg_stats.split(",") if s.strip()]
+    unknown = [s for s in agg_stats if s not in AGG_STATS]
+    if unknown:
+        ap.error(f"Estadísticos desconocidos: {', '.join(unknown)} (usa {', '.join(AGG_STATS)})")
 
     mapping_path = Path(MAPPING_FILE)
     if not mapping_path.exists():
@@ -135,13 +614,41 @@ def main():
     if not core_template_metrics:
         print("⚠️ No se encontró plantilla Core0 en el mapping; no se expandirán métricas por core.")
 
+    watcher = MappingWatcher(mapping_path, args.mapping_check)
+
+    # Recarga por señal (SIGHUP; en Windows SIGBREAK = Ctrl+Break)
+    reload_signal = getattr(signal, "SIGHUP", None) or getattr(signal, "SIGBREAK", None)
+    if reload_signal is not None:
+        signal.signal(reload_signal, lambda signum, frame: watcher.request(f"señal {signal.Signals(signum).name}"))
+
+    # Recarga por comando MQTT; los mensajes llegan por el hilo de paho
+    def on_connect(client, userdata, flags, rc):
+        client.subscribe(MQTT_TOPIC)
+
+    def on_message(client, userdata, msg):
+        if is_reload_command(msg.payload):
+            watcher.request("comando MQTT")
+
     client = mqtt.Client()
     client.username_pw_set(MQTT_USERNAME, MQTT_PASSWORD)
-    client.connect(MQTT_HOST, MQTT_PORT, keepalive=30)
+    client.on_connect = on_connect
+    client.on_message = on_message
+    mqtt_host = args.mqtt_host or MQTT_HOST
+    mqtt_port = args.mqtt_port or MQTT_PORT
+    client.connect(mqtt_host, mqtt_port, keepalive=30)
     client.loop_start()
-    print(f"✅ MQTT conectado a {MQTT_HOST}:{MQTT_PORT} topic='{MQTT_TOPIC}'")
-
-    cmd = [PCM_EXE, str(PCM_INTERVAL), *PCM_EXTRA_ARGS]
+    latency = LatencyHistogram() if args.latency_interval > 0 else None
+    publisher = MqttPublisher.from_args(client, MQTT_TOPIC, args, sample_age=latency).start()
+    print(f"✅ MQTT conectado a {mqtt_host}:{mqtt_port} topic='{MQTT_TOPIC}'")
+
+    # Una ruta existente va tal cual (puede tener espacios); si no, se parte como línea de órdenes
+    exe = [args.pcm_exe] if Path(args.pcm_exe).exists() else shlex.split(args.pcm_exe, posix=os.name != "nt")
+    if exe and exe[0].endswith(".py"):
+        script = Path(exe[0])
+        if not script.exists() and (Path(__file__).resolve().parent / script).exists():
+            script = Path(__file__).resolve().parent / script
+        exe = [sys.executable, str(script), *exe[1:]]
+    cmd = [*exe, str(PCM_INTERVAL), *PCM_EXTRA_ARGS]
     print(f"▶ Ejecutando: {' '.join(cmd)}")
 
     debug_json_fh = None
@@ -152,25 +659,114 @@ def main():
         debug_json_fh = debug_path.open("a", encoding="utf-8", newline="")
         print(f"🧪 JSON debug activado: {debug_path}")
 
-    proc = subprocess.Popen(
-        cmd,
-        stdout=subprocess.PIPE,
-        stderr=pcm_stderr_fh,
-        text=True,
-        encoding="utf-8",
-        errors="ignore",
-        bufsize=1,
-    )
+    # Panel de estado a ritmo fijo; con --debug, una línea por fila publicada como antes
+    view = StatusView.from_args("pcm_csv_to_mqtt", args)
+    last_latency = ["-"]
+
+    def note(text: str) -> None:
+        """Avisos poco frecuentes: al panel si está activo (si no, se borrarían al refrescar)"""
+        if view is not None:
+            view.log(text)
+        else:
+            print(text)
+
+    supervisor = PcmSupervisor(cmd, pcm_stderr_fh, stall_timeout=args.stall_timeout, backoff_max=args.backoff_max,
+                               notify=note)
+
+    def compile_pipeline(fixed_pairs, core_template_metrics):
+        """Proyección + agregados para las cabeceras actuales: (plan, ancho, nº columnas, agregados, claves por core)"""
+        plan, width, n_columns, detected_cores, selected_pairs = prepare_headers(
+            components_header, metrics_header, fixed_pairs, core_template_metrics
+        )
+        note(
+            f"✅ Cabeceras: {n_columns} columnas | "
+            f"cores: {len(detected_cores)} | pares seleccionados: {len(selected_pairs)}"
+        )
+        agg_plan = []
+        core_keys = frozenset()
+        if args.aggregate != "off":
+            agg_plan = compile_aggregation(core_groups, detected_cores, core_template_metrics, plan, agg_stats)
+            if args.aggregate == "only":
+                core_keys = frozenset(json_key(c, m) for c in detected_cores for m in core_template_metrics)
+            note(f"✅ Agregados: {len(agg_plan)} métricas de grupo ({', '.join(core_groups)}) | modo {args.aggregate}")
+        return plan, width, n_columns, agg_plan, core_keys
+
+    def reload_mapping(reason: str):
+        """Relee el mapping y devuelve el pipeline nuevo; None si hay que conservar el actual"""
+        nonlocal fixed_pairs, core_template_metrics
+        t0 = time.perf_counter()
+        try:
+            new_fixed, new_template = load_mapping(mapping_path)
+        except (OSError, csv.Error, UnicodeError) as e:
+            note(f"⚠️ Recarga del mapping ({reason}) fallida, se mantiene el anterior: {e}")
+            return None
+        if not new_fixed and not new_template:
+            note(f"⚠️ Recarga del mapping ({reason}): fichero vacío, se mantiene el anterior")
+            return None
+        new_pipeline = None
+        if metrics_header is not None:
+            new_pipeline = compile_pipeline(new_fixed, new_template)
+            if not new_pipeline[0]:
+                note(f"⚠️ Recarga del mapping ({reason}): ninguna métrica en la cabecera, se mantiene el anterior")
+                return None
+        old_count = len(pipeline[0]) if pipeline else 0
+        fixed_pairs, core_template_metrics = new_fixed, new_template
+        dt_ms = (time.perf_counter() - t0) * 1000
+        new_count = len(new_pipeline[0]) if new_pipeline else 0
+        note(f"🔄 Mapping recargado ({reason}) en {dt_ms:.1f} ms: {old_count} -> {new_count} métricas")
+        return new_pipeline
+
+    def publish_latency():
+        fields = latency.snapshot()
+        fields["pcm_restarts"] = supervisor.restarts
+        # Mensaje suelto (no muestra) para no contarse a sí mismo en el histograma
+        publisher.publish({
+            "measurement": LATENCY_MEASUREMENT,
+            "tags": {"device": MQTT_DEVICE},
+            "fields": fields,
+            "ts": time.time(),
+        })
+        if fields["count"]:
+            last_latency[0] = (f"{fields['count']} filas | p50 {fields['p50_ms']:.0f} ms, "
+                               f"p95 {fields['p95_ms']:.0f} ms, máx {fields['max_ms']:.0f} ms")
+            if view is None:
+                print(f"⏱ Latencia PCM->MQTT: {last_latency[0]}")
 
     components_header = None
     metrics_header = None
-    pair_to_index: Dict[Tuple[str, str], int] = {}
-    selected_pairs: List[Tuple[str, str]] = []
-    missing_once = set()
+    pipeline = None
+    hour_cache = {}
+    next_latency = time.monotonic() + args.latency_interval
+
+    if view is not None:
+        view.add_status("MQTT", publisher.format_stats)
+        view.add_status("PCM", lambda: f"reinicios {supervisor.restarts}")
+        if latency is not None:
+            view.add_status("Latencia PCM->MQTT", lambda: last_latency[0])
+        if deadband is not None:
+            view.add_status("Deadband", deadband.format_stats)
+        view.start()
 
     try:
-        assert proc.stdout is not None
-        for line in iter_clean_lines(proc.stdout):
+        for line in supervisor.lines():
+            if latency is not None and time.monotonic() >= next_latency:
+                next_latency = time.monotonic() + args.latency_interval
+                publish_latency()
+
+            # Recarga entre filas: el pipeline nuevo se compila entero y se sustituye de una vez
+            reason = watcher.poll()
+            if reason is not None:
+                new_pipeline = reload_mapping(reason)
+                if new_pipeline is not None:
+                    pipeline = new_pipeline
+
+            if line is None:
+                continue
+            if line is RESTARTED:
+                # PCM vuelve a escribir sus cabeceras: se detectan de nuevo
+                components_header = metrics_header = pipeline = None
+                continue
+
             if components_header is None:
                 if line.startswith("System,"):
                     components_header = parse_csv_line(line)
@@ -181,77 +777,61 @@ def main():
                     continue
 
                 metrics_header = parse_csv_line(line)
-                n = min(len(components_header), len(metrics_header))
-                components_header = components_header[:n]
-                metrics_header = metrics_header[:n]
-                pair_to_index = build_pair_index(components_header, metrics_header)
-
-                detected_cores = []
-                for comp in components_header:
-                    c = comp.strip()
-                    if CORE_PATTERN.match(c) and c not in detected_cores:
-                        detected_cores.append(c)
-
-                selected_pairs = list(fixed_pairs)
-                for core_name in detected_cores:
-                    for metric in core_template_metrics:
-                        pair = (core_name, metric)
-                        if pair not in selected_pairs:
-                            selected_pairs.append(pair)
-
-                print(
-                    f"✅ Cabeceras detectadas: {len(components_header)} columnas | "
-                    f"cores: {len(detected_cores)} | pares seleccionados: {len(selected_pairs)}"
-                )
-                continue
-
-            row = parse_csv_line(line)
-            if len(row) < len(metrics_header):
+                pipeline = compile_pipeline(fixed_pairs, core_template_metrics)
                 continue
 
-            fields = {}
-            for component, metric in selected_pairs:
-                idx = pair_to_index.get((component, metric))
-                if idx is None:
-                    key = (component, metric)
-                    if key not in missing_once:
-                        missing_once.add(key)
-                        print(f"⚠️ No encontrado en cabecera: {component} | {metric}")
-                    continue
-
-                val = parse_float(row[idx])
-                if val is None:
-                    continue
-
-                fields[json_key(component, metric)] = val
-
+            plan, width, n_columns, agg_plan, core_keys = pipeline
+            t_row = time.time()
+            fields = project_row(line, plan, n_columns, width)
             if not fields:
                 continue
+            if agg_plan:
+                aggregates = aggregate_fields(fields, agg_plan)
+                if core_keys:
+                    fields = {k: v for k, v in fields.items() if k not in core_keys}
+                fields.update(aggregates)
+            if view is not None:
+                view.count("filas")
+                view.update(fields)
+            if deadband is not None:
+                fields = deadband.filter(fields, t_row)
+                if not fields:
+                    if view is not None:
+                        view.count("sin cambios")
+                    continue
+            # ts de la muestra = columnas Date/Time de PCM (la latencia se mide desde ahí)
+            date, clock, _ = line.split(",", 2)
+            t_ns = row_time_ns(date, clock, hour_cache)
+            ts = t_ns / 1e9 if t_ns is not None else t_row
 
             mqtt_payload = {
                 "measurement": MQTT_MEASUREMENT,
                 "tags": {"device": MQTT_DEVICE},
                 "fields": fields,
             }
-            msg = json.dumps(mqtt_payload, separators=(",", ":"), ensure_ascii=False)
-            info = client.publish(MQTT_TOPIC, msg, qos=0, retain=False)
-            info.wait_for_publish(timeout=5)
+            publisher.publish_sample(mqtt_payload, ts=ts)
             if debug_json_fh is not None:
+                msg = json.dumps(mqtt_payload, separators=(",", ":"), ensure_ascii=False)
                 debug_json_fh.write(msg + "\n")
                 debug_json_fh.flush()
-            print(f"[MQTT] Enviado ({len(fields)} fields)")
+            if view is not None:
+                view.count("publicadas")
+            elif args.debug:
+                print(f"[MQTT] Encolado ({len(fields)} fields) | cola {publisher.depth()}")
 
     except KeyboardInterrupt:
         print("\nSaliendo...")
     finally:
-        try:
-            proc.terminate()
-            proc.wait(timeout=2)
-        except Exception:
-            pass
+        if view is not None:
+            view.stop()
+        supervisor.stop()
         if debug_json_fh is not None:
             debug_json_fh.close()
         pcm_stderr_fh.close()
+        publisher.stop()
+        print(f"📈 MQTT: {publisher.format_stats()} | reinicios PCM {supervisor.restarts}")
+        if deadband is not None:
+            print(f"📉 Deadband: {deadband.format_stats()}")
         client.loop_stop()
         client.disconnect()
 
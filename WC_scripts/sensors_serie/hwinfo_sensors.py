@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+# hwinfo_sensors.py
+#
+# Escritura de los sensores personalizados de HWiNFO
+# (HKCU\Software\HWiNFO64\Sensors\Custom\<grupo>\<tipo>) detrás de un backend
+# intercambiable:
+#   registry  winreg, solo Windows: claves abiertas una vez y reutilizadas
+#   file      JSON con el estado de todas las claves (pruebas en Linux)
+#   memory    diccionario en memoria (tests y benchmark)
+#
+# HWiNFOSensors escribe Name/Unit una sola vez al arrancar y, en cada trama,
+# solo los Value cuyo texto formateado ha cambiado. Cuenta las llamadas al
+# backend para comparar con lo que hacía antes el puente (por sensor y trama:
+# CreateKey + Name + Value, y Unit en los tipos Other con unidad).
+
+import json
+import os
+from pathlib import Path
+from typing import Dict, Optional
+
+try:
+    import winreg
+    WINREG_AVAILABLE = True
+except ImportError:
+    WINREG_AVAILABLE = False
+
+BACKENDS = ("registry", "file", "memory", "none")
+REG_BASE = r"Software\HWiNFO64\Sensors\Custom"
+VALUE_FORMAT = "{:.2f}"
+
+
+def writes_unit(meta: dict) -> bool:
+    """HWiNFO solo usa Unit en los tipos Other*"""
+    return meta["type"].lower().startswith("other") and bool(meta.get("unit"))
+
+
+def legacy_calls(meta: dict) -> int:
+    """Llamadas por trama del puente anterior: CreateKey + Name + Value (+ Unit)"""
+    return 3 + writes_unit(meta)
+
+
+def sensor_path(group: str, stype: str) -> str:
+    return fr"{REG_BASE}\{group}\{stype}"
+
+
+class SensorBackend:
+    """Interfaz: open_key() una vez por sensor, set_value() por cada escritura, commit() por trama"""
+
+    def __init__(self):
+        self.opens = 0
+        self.sets = 0
+
+    def open_key(self, path: str):
+        raise NotImplementedError
+
+    def set_value(self, handle, name: str, text: str) -> None:
+        raise NotImplementedError
+
+    def commit(self) -> None:
+        """Fin de trama (el backend de fichero vuelca aquí)"""
+
+    def close(self) -> None:
+        pass
+
+
+class RegistryBackend(SensorBackend):
+    def __init__(self):
+        super().__init__()
+        if not WINREG_AVAILABLE:
+            raise RuntimeError("winreg no disponible (solo Windows)")
+        self._handles = []
+
+    def open_key(self, path: str):
+        handle = winreg.CreateKey(winreg.HKEY_CURRENT_USER, path)
+        self._handles.append(handle)
+        self.opens += 1
+        return handle
+
+    def set_value(self, handle, name: str, text: str) -> None:
+        winreg.SetValueEx(handle, name, 0, winreg.REG_SZ, text)
+        self.sets += 1
+
+    def close(self) -> None:
+        for handle in self._handles:
+            try:
+                winreg.CloseKey(handle)
+            except OSError:
+                pass
+        self._handles = []
+
+
+class MemoryBackend(SensorBackend):
+    def __init__(self):
+        super().__init__()
+        self.keys: Dict[str, Dict[str, str]] = {}
+
+    def open_key(self, path: str):
+        self.opens += 1
+        return self.keys.setdefault(path, {})
+
+    def set_value(self, handle, name: str, text: str) -> None:
+        handle[name] = text
+        self.sets += 1
+
+
+class FileBackend(MemoryBackend):
+    """Como memory, pero vuelca el estado a un JSON (escritura atómica) en cada trama con cambios"""
+
+    def __init__(self, path):
+        super().__init__()
+        self.path = Path(path)
+        self.dumps = 0
+        self._dirty = False
+
+    def set_value(self, handle, name: str, text: str) -> None:
+        super().set_value(handle, name, text)
+        self._dirty = True
+
+    def commit(self) -> None:
+        if not self._dirty:
+            return
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        tmp.write_text(json.dumps(self.keys, ensure_ascii=False, indent=1), encoding="utf-8")
+        os.replace(tmp, self.path)
+        self.dumps += 1
+        self._dirty = False
+
+    def close(self) -> None:
+        self.commit()
+
+
+def make_backend(kind: str, path: Optional[str] = None) -> Optional[SensorBackend]:
+    if kind == "registry":
+        return RegistryBackend()
+    if kind == "file":
+        return FileBackend(path or "hwinfo_sensors.json")
+    if kind == "memory":
+        return MemoryBackend()
+    if kind == "none":
+        return None
+    raise ValueError(f"Backend desconocido: {kind} (usa {', '.join(BACKENDS)})")
+
+
+class HWiNFOSensors:
+    """Sensores de SENSORS sobre un backend: Name/Unit al arrancar, Value solo si cambia"""
+
+    def __init__(self, backend: SensorBackend, sensors: Dict[str, dict]):
+        self.backend = backend
+        self._handles = {}
+        self._last: Dict[str, str] = {}
+        self.updates = 0
+        self.writes = 0
+        self.legacy_calls = 0
+        for key, meta in sensors.items():
+            handle = backend.open_key(sensor_path(meta["group"], meta["type"]))
+            backend.set_value(handle, "Name", meta["name"])
+            if writes_unit(meta):
+                backend.set_value(handle, "Unit", meta["unit"])
+            self._handles[key] = (handle, legacy_calls(meta))
+
+    def update(self, key: str, value: float) -> bool:
+        """Escribe Value si el texto formateado cambió. True si se escribió"""
+        entry = self._handles.get(key)
+        if entry is None:
+            return False
+        handle, legacy = entry
+        self.updates += 1
+        self.legacy_calls += legacy
+        text = VALUE_FORMAT.format(value)
+        if self._last.get(key) == text:
+            return False
+        self.backend.set_value(handle, "Value", text)
+        self._last[key] = text
+        self.writes += 1
+        return True
+
+    def commit(self) -> None:
+        self.backend.commit()
+
+    def close(self) -> None:
+        self.backend.close()
+
+    def stats(self) -> dict:
+        return {
+            "updates": self.updates,
+            "writes": self.writes,
+            "backend_calls": self.backend.opens + self.backend.sets,
+            "legacy_calls": self.legacy_calls,
+        }
+
+    def format_stats(self) -> str:
+        s = self.stats()
+        change = (s["backend_calls"] / s["legacy_calls"] - 1) * 100 if s["legacy_calls"] else 0.0
+        return (f"valores {s['updates']} -> {s['writes']} escritos | llamadas al backend {s['backend_calls']} "
+                f"(antes {s['legacy_calls']}, {change:+.0f} %)")
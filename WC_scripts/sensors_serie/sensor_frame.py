@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+# sensor_frame.py
+#
+# Decodificación rápida de las tramas JSON de los sensores serie.
+#   loads()       orjson si está instalado (pip install orjson), si no json
+#   SensorLayout  la whitelist SENSORS compilada una vez en una tupla fija de
+#                 (clave, slot)
+#   SensorFrame   array de floats preasignado (NaN = no vino) + pares válidos
+#                 de la trama + máscara de validez (bit 'slot' a 1 si la clave
+#                 llegó con un valor numérico)
+#
+# Cada trama se decodifica directamente en el array; HWiNFO, MQTT y el
+# grabador .bin leen de ese array en lugar de recorrer otra vez el dict.
+
+import json
+import math
+from array import array
+from typing import Dict, Iterable, List, Tuple
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+JSON_BACKEND = "orjson" if ORJSON_AVAILABLE else "json"
+
+
+def _coerce(value) -> float:
+    try:
+        return float(value)
+    except (ValueError, TypeError, OverflowError):
+        return math.nan
+
+
+def loads(payload):
+    """bytes/str JSON -> objeto (ValueError si no es JSON válido)"""
+    if ORJSON_AVAILABLE:
+        return orjson.loads(payload)
+    return json.loads(payload)
+
+
+class SensorLayout:
+    """Whitelist compilada: orden fijo de claves y su slot en el array"""
+
+    def __init__(self, keys: Iterable[str]):
+        self.keys: Tuple[str, ...] = tuple(keys)
+        self.slots: Tuple[Tuple[str, int], ...] = tuple((key, slot) for slot, key in enumerate(self.keys))
+        self.index: Dict[str, int] = {key: slot for key, slot in self.slots}
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def new_frame(self) -> "SensorFrame":
+        return SensorFrame(self)
+
+
+class SensorFrame:
+    """Última trama decodificada: values[slot] (NaN si no vino) + mask + extra (fuera de la whitelist o no numérico)"""
+
+    def __init__(self, layout: SensorLayout):
+        self.layout = layout
+        self._nan = array("d", [math.nan]) * len(layout)
+        self.values = array("d", self._nan)
+        self._items: List[Tuple[str, float]] = []
+        self.extra: dict = {}  # claves fuera de la whitelist o no numéricas, tal cual
+
+    def decode(self, payload) -> bool:
+        """Decodifica una trama JSON en el array. False si no es un objeto JSON"""
+        data = loads(payload)  # ValueError si no es JSON válido
+        if not isinstance(data, dict):
+            return False
+        return self.load(data)
+
+    def load(self, data: dict) -> bool:
+        # Una sola pasada por el dict: cada clave de la whitelist va a su slot y
+        # a la lista de pares válidos (items() y fields() no vuelven a recorrer
+        # el array); el resto (y los valores no numéricos) se guarda en extra
+        index = self.layout.index
+        values = self.values
+        values[:] = self._nan  # reinicio en C
+        items = []
+        extra = {}
+        for key, value in data.items():
+            slot = index.get(key)
+            if slot is None:
+                extra[key] = value
+                continue
+            try:
+                values[slot] = value
+            except (TypeError, OverflowError):  # texto, null, o un entero enorme
+                number = _coerce(value)
+                if number != number:  # null, "abc"...: se publica tal cual, como antes
+                    extra[key] = value
+                    continue
+                values[slot] = number
+            items.append((key, values[slot]))
+        self._items = items
+        self.extra = extra
+        return True
+
+    @property
+    def mask(self) -> int:
+        """Bit 'slot' a 1 por cada clave válida de la trama"""
+        index = self.layout.index
+        return sum(1 << index[key] for key, _ in self._items)
+
+    def items(self) -> List[Tuple[str, float]]:
+        """Pares (clave, valor) válidos de la última trama, en el orden en que llegaron"""
+        return self._items
+
+    def fields(self, include_extra: bool = True) -> dict:
+        """Campos para MQTT: los válidos del array (+ las claves fuera de la whitelist)"""
+        out = dict(self.items())
+        if include_extra and self.extra:
+            out.update(self.extra)
+        return out
+
+    def count(self) -> int:
+        return len(self._items)
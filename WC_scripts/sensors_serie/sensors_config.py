@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+# sensors_config.py
+#
+# Sensores de la placa ESP (whitelist + mapeado a HWiNFO), compartidos por
+# serie_json_2_hwinfo_mqtt.py y serial_hub.py: así el puente y el
+# concentrador no importan uno el otro y publican los mismos campos.
+
+from sensor_frame import SensorLayout
+
+# ========= WHITELIST =========
+
+# ====== MAPEADO DE SENSORES ======
+# group = agrupación (ej: LoopWater)
+# type  = Temp0, Temp1, Fan0, Volt0, Other0, ...
+# name  = cómo se muestra en HWiNFO
+# unit  = solo si type empieza con "Other"
+SENSORS = {
+    # ---- Water temps (ADS1256) ----
+    "water_in":        {"group":"WaterLoop", "type":"Temp0",  "name":"Water In (°C)"},
+    "water_out":       {"group":"WaterLoop", "type":"Temp1",  "name":"Water Out (°C)"},
+    # ---- Air temps ----
+    "air_in_top":      {"group":"WaterLoop",   "type":"Temp2",  "name":"Air In Top (°C)"},
+    "air_out_top":     {"group":"WaterLoop",   "type":"Temp3",  "name":"Air Out Top (°C)"},
+    "air_in_bottom":   {"group":"WaterLoop",   "type":"Temp4",  "name":"Air In Bottom (°C)"},
+    "air_out_bottom":  {"group":"WaterLoop",   "type":"Temp5",  "name":"Air Out Bottom (°C)"},
+    "extra_temp1":     {"group":"WaterLoop", "type":"Temp6",  "name":"Extra Temp 1 (°C)"},
+    "extra_temp2":     {"group":"WaterLoop", "type":"Temp7",  "name":"Extra Temp 2 (°C)"},
+    # ---- Electrical (INA3221) ----
+    "fans_power":      {"group":"WaterLoop", "type":"Power0", "name":"Fans Power (W)"},
+    "pump_power":      {"group":"WaterLoop", "type":"Power1", "name":"Pump Power (W)"},
+    "aux_power":       {"group":"WaterLoop", "type":"Power2", "name":"Aux Power (W)"},
+    "fans_voltage":    {"group":"WaterLoop", "type":"Volt0",  "name":"Fans Voltage (V)"},
+    "fans_current":    {"group":"WaterLoop", "type":"Current0","name":"Fans Current (A)"},
+    "pump_voltage":    {"group":"WaterLoop", "type":"Volt1",  "name":"Pump Voltage (V)"},
+    "pump_current":    {"group":"WaterLoop", "type":"Current1","name":"Pump Current (A)"},
+    "aux_voltage":     {"group":"WaterLoop", "type":"Volt2",   "name":"Aux voltage (V)"},
+    "aux_current":     {"group":"WaterLoop", "type":"Current2", "name":"Aux Current (A)"},
+    # ---- RPM + Flow ----
+#    "pump_rpm":        {"group":"LoopFlow",  "type":"Fan0",   "name":"Pump RPM"},
+#    "fan1_rpm":        {"group":"LoopFlow",  "type":"Fan1",   "name":"Fan1 RPM"},
+#    "fan2_rpm":        {"group":"LoopFlow",  "type":"Fan2",   "name":"Fan2 RPM"},
+    "flow_lpm":        {"group":"WaterLoop",  "type":"Other0", "name":"Flow", "unit":"L/min"},
+}
+
+# Whitelist estricta compilada una vez: clave -> slot del array de cada trama
+LAYOUT = SensorLayout(SENSORS)
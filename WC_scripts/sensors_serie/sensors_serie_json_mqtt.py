@@ -10,6 +10,15 @@ import argparse
 import serial
 import serial.tools.list_ports
 import paho.mqtt.client as mqtt
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from field_filter import SENSORS_DEADBAND_DEFAULTS, DeadbandFilter, add_filter_arguments
+from mqtt_publisher import MqttPublisher, add_publisher_arguments
+from serial_framer import FrameReader
+from sensor_frame import JSON_BACKEND, loads as json_loads
+from status_view import StatusView, add_view_arguments
 
 # ====== MQTT SETTINGS ======
 MQTT_HOST = "155.210.152.63"
@@ -20,6 +29,10 @@ MQTT_TOPIC = "cooler"
 MQTT_DEVICE = "sensors"
 MQTT_MEASUREMENT = "sensors"
 
+# ====== DEADBAND (--deadband-defaults) ======
+# Campos lentos: solo se publican si cambian más del umbral (ver field_filter.py)
+DEADBAND_DEFAULTS = SENSORS_DEADBAND_DEFAULTS
+
 
 def choose_port_interactive() -> str:
     ports = list(serial.tools.list_ports.comports())
@@ -46,64 +59,105 @@ def main():
     ap.add_argument("port", nargs="?", help="Puerto COM (ej. COM6). Si no se pasa, se listarán y podrás elegir.")
     ap.add_argument("--baud", type=int, default=115200, help="Baudrate (por defecto 115200)")
     ap.add_argument("--prefix", default="HWiNFO:", help="Prefijo de línea para procesar (por defecto 'HWiNFO:')")
+    add_publisher_arguments(ap)
+    add_filter_arguments(ap, DEADBAND_DEFAULTS)
+    add_view_arguments(ap)
     args = ap.parse_args()
+    try:
+        deadband = DeadbandFilter.from_args(args, DEADBAND_DEFAULTS)
+    except ValueError as e:
+        ap.error(str(e))
 
     print("ℹ️  Uso:")
     print("    python sensors_serie_json_mqtt.py COM6 --baud 115200 --prefix HWiNFO:\n")
 
     port = args.port or choose_port_interactive()
-    print(f"✅ Puerto: {port}  |  Baud: {args.baud}  |  Prefijo: '{args.prefix}'\n")
+    print(f"✅ Puerto: {port}  |  Baud: {args.baud}  |  Prefijo: '{args.prefix}'  |  JSON: {JSON_BACKEND}\n")
 
     client = mqtt.Client()
     client.username_pw_set(MQTT_USERNAME, MQTT_PASSWORD)
-    client.connect(MQTT_HOST, MQTT_PORT, keepalive=30)
+    mqtt_host = args.mqtt_host or MQTT_HOST
+    mqtt_port = args.mqtt_port or MQTT_PORT
+    client.connect(mqtt_host, mqtt_port, keepalive=30)
     client.loop_start()
-    print(f"✅ MQTT conectado a {MQTT_HOST}:{MQTT_PORT} en topic '{MQTT_TOPIC}'\n")
+    publisher = MqttPublisher.from_args(client, MQTT_TOPIC, args).start()
+    print(f"✅ MQTT conectado a {mqtt_host}:{mqtt_port} en topic '{MQTT_TOPIC}'\n")
 
     ser = serial.Serial(port, args.baud, timeout=1.0)
     time.sleep(2)  # algunos ESP reinician al abrir el puerto
 
-    while True:
+    # Eco de todas las líneas del puerto solo con --debug; si no, panel de estado a ritmo fijo
+    echo = (lambda raw: print(raw.decode(errors="ignore"))) if args.debug else None
+    reader = FrameReader(ser, args.prefix.encode(), on_line=echo)
+    view = StatusView.from_args("sensors_serie_json_mqtt", args)
+    if view is not None:
+        view.add_status("MQTT", publisher.format_stats).add_status("Serie", reader.format_stats)
+        if deadband is not None:
+            view.add_status("Deadband", deadband.format_stats)
+        view.start()
+
+    def warn(text: str) -> None:
+        if view is not None:
+            view.error(text)
+        else:
+            print(f"⚠️  {text}")
+
+    def handle_frame(payload: bytes) -> None:
+        if not payload:
+            return
+
         try:
-            raw = ser.readline()
-            if not raw:
-                continue
-
-            line = raw.decode(errors="ignore").rstrip("\r\n")
-            print(line)
-
-            if not line.startswith(args.prefix):
-                continue
-
-            payload = line[len(args.prefix):].strip()
-            if not payload:
-                continue
-
-            try:
-                data = json.loads(payload)
-                if not isinstance(data, dict):
-                    continue
-            except json.JSONDecodeError:
-                print("⚠️  JSON inválido, ignorado.")
-                continue
-
-            mqtt_payload = {
-                "measurement": MQTT_MEASUREMENT,
-                "tags": {"device": MQTT_DEVICE},
-                "fields": data,
-            }
+            data = json_loads(payload)
+            if not isinstance(data, dict):
+                return
+        except ValueError:
+            warn("JSON inválido, ignorado.")
+            return
+        if view is not None:
+            view.count("tramas")
+            view.update(data)
+
+        fields = deadband.filter(data) if deadband is not None else data
+        if not fields:
+            if view is not None:
+                view.count("sin cambios")
+            elif args.debug:
+                print("       [MQTT] Sin cambios, no se publica")
+            return
+        mqtt_payload = {
+            "measurement": MQTT_MEASUREMENT,
+            "tags": {"device": MQTT_DEVICE},
+            "fields": fields,
+        }
+        publisher.publish_sample(mqtt_payload)
+        if view is not None:
+            view.count("publicadas")
+        elif args.debug:
             msg = json.dumps(mqtt_payload, separators=(",", ":"), ensure_ascii=False)
-            info = client.publish(MQTT_TOPIC, msg, qos=0, retain=False)
-            info.wait_for_publish(timeout=5)
-            print(f"       [MQTT] Enviado: {msg}")
+            print(f"       [MQTT] Encolado (cola {publisher.depth()}): {msg}")
+
+    while True:
+        try:
+            for payload in reader.read_frames():
+                try:
+                    handle_frame(payload)
+                except Exception as e:
+                    warn(f"Error: {e}")
 
         except KeyboardInterrupt:
             print("\nSaliendo…")
             break
         except Exception as e:
-            print(f"⚠️  Error: {e}")
+            warn(f"Error: {e}")
 
+    if view is not None:
+        view.stop()
     ser.close()
+    print(f"📥 Serie: {reader.format_stats()}")
+    publisher.stop()
+    print(f"📈 MQTT: {publisher.format_stats()}")
+    if deadband is not None:
+        print(f"📉 Deadband: {deadband.format_stats()}")
     client.loop_stop()
     client.disconnect()
 
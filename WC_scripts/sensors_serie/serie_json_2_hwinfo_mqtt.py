@@ -9,44 +9,20 @@ import time
 import json
 import serial
 import serial.tools.list_ports
-import winreg
 import argparse
 import paho.mqtt.client as mqtt
+from pathlib import Path
 
-# ========= WHITELIST =========
-
-# ====== MAPEADO DE SENSORES ======
-# group = agrupación (ej: LoopWater)
-# type  = Temp0, Temp1, Fan0, Volt0, Other0, ...
-# name  = cómo se muestra en HWiNFO
-# unit  = solo si type empieza con "Other"
-SENSORS = {
-    # ---- Water temps (ADS1256) ----
-    "water_in":        {"group":"WaterLoop", "type":"Temp0",  "name":"Water In (°C)"},
-    "water_out":       {"group":"WaterLoop", "type":"Temp1",  "name":"Water Out (°C)"},
-    # ---- Air temps ----
-    "air_in_top":      {"group":"WaterLoop",   "type":"Temp2",  "name":"Air In Top (°C)"},
-    "air_out_top":     {"group":"WaterLoop",   "type":"Temp3",  "name":"Air Out Top (°C)"},
-    "air_in_bottom":   {"group":"WaterLoop",   "type":"Temp4",  "name":"Air In Bottom (°C)"},
-    "air_out_bottom":  {"group":"WaterLoop",   "type":"Temp5",  "name":"Air Out Bottom (°C)"},
-    "extra_temp1":     {"group":"WaterLoop", "type":"Temp6",  "name":"Extra Temp 1 (°C)"},
-    "extra_temp2":     {"group":"WaterLoop", "type":"Temp7",  "name":"Extra Temp 2 (°C)"},
-    # ---- Electrical (INA3221) ----
-    "fans_power":      {"group":"WaterLoop", "type":"Power0", "name":"Fans Power (W)"},
-    "pump_power":      {"group":"WaterLoop", "type":"Power1", "name":"Pump Power (W)"},
-    "aux_power":       {"group":"WaterLoop", "type":"Power2", "name":"Aux Power (W)"},
-    "fans_voltage":    {"group":"WaterLoop", "type":"Volt0",  "name":"Fans Voltage (V)"},
-    "fans_current":    {"group":"WaterLoop", "type":"Current0","name":"Fans Current (A)"},
-    "pump_voltage":    {"group":"WaterLoop", "type":"Volt1",  "name":"Pump Voltage (V)"},
-    "pump_current":    {"group":"WaterLoop", "type":"Current1","name":"Pump Current (A)"},
-    "aux_voltage":     {"group":"WaterLoop", "type":"Volt2",   "name":"Aux voltage (V)"},
-    "aux_current":     {"group":"WaterLoop", "type":"Current2", "name":"Aux Current (A)"},
-    # ---- RPM + Flow ----
-#    "pump_rpm":        {"group":"LoopFlow",  "type":"Fan0",   "name":"Pump RPM"},
-#    "fan1_rpm":        {"group":"LoopFlow",  "type":"Fan1",   "name":"Fan1 RPM"},
-#    "fan2_rpm":        {"group":"LoopFlow",  "type":"Fan2",   "name":"Fan2 RPM"},
-    "flow_lpm":        {"group":"WaterLoop",  "type":"Other0", "name":"Flow", "unit":"L/min"},
-}
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent / "Vatímetro"))
+
+from field_filter import SENSORS_DEADBAND_DEFAULTS, DeadbandFilter, add_filter_arguments
+from hwinfo_sensors import BACKENDS, WINREG_AVAILABLE, HWiNFOSensors, make_backend
+from mqtt_publisher import MqttPublisher, add_publisher_arguments
+from serial_framer import FrameReader
+from sensor_frame import JSON_BACKEND
+from sensors_config import LAYOUT, SENSORS
+from status_view import StatusView, add_view_arguments
 
 # ====== MQTT SETTINGS ======
 MQTT_HOST = "155.210.152.63"
@@ -57,15 +33,11 @@ MQTT_TOPIC = "cooler"
 MQTT_DEVICE = "sensors"
 MQTT_MEASUREMENT = "sensors"
 
-# ====== FUNCIONES ======
-def write_hwinfo_sensor(group: str, stype: str, name: str, value: float, unit: str | None = None):
-    reg_path = fr"Software\HWiNFO64\Sensors\Custom\{group}\{stype}"
-    with winreg.CreateKey(winreg.HKEY_CURRENT_USER, reg_path) as keyreg:
-        winreg.SetValueEx(keyreg, "Name",  0, winreg.REG_SZ, name)
-        winreg.SetValueEx(keyreg, "Value", 0, winreg.REG_SZ, f"{value:.2f}")
-        if stype.lower().startswith("other") and unit:
-            winreg.SetValueEx(keyreg, "Unit", 0, winreg.REG_SZ, unit)
+# ====== DEADBAND (--deadband-defaults) ======
+# Campos lentos: solo se publican si cambian más del umbral (ver field_filter.py)
+DEADBAND_DEFAULTS = SENSORS_DEADBAND_DEFAULTS
 
+# ====== FUNCIONES ======
 def choose_port_interactive() -> str:
     ports = list(serial.tools.list_ports.comports())
     if not ports:
@@ -90,87 +62,152 @@ def main():
     ap.add_argument("port", nargs="?", help="Puerto COM (ej. COM6). Si no se pasa, se listarán y podrás elegir.")
     ap.add_argument("--baud", type=int, default=115200, help="Baudrate (por defecto 115200)")
     ap.add_argument("--prefix", default="HWiNFO:", help="Prefijo de línea para procesar (por defecto 'HWiNFO:')")
+    ap.add_argument("--hwinfo-backend", choices=BACKENDS, default="registry" if WINREG_AVAILABLE else "none",
+                    help="Dónde escribir los sensores de HWiNFO: registro (Windows), fichero JSON, memoria o ninguno "
+                         "(default: registry en Windows, none fuera)")
+    ap.add_argument("--hwinfo-file", default="hwinfo_sensors.json", help="Fichero del backend 'file'")
+    ap.add_argument("--bin", metavar="FICHERO", help="Grabar también las tramas en un .bin (VTMBIN, una columna por sensor)")
+    add_publisher_arguments(ap)
+    add_filter_arguments(ap, DEADBAND_DEFAULTS)
+    add_view_arguments(ap)
     args = ap.parse_args()
+    try:
+        deadband = DeadbandFilter.from_args(args, DEADBAND_DEFAULTS)
+    except ValueError as e:
+        ap.error(str(e))
 
     print("ℹ️  Uso:")
     print("    python serie_json_2_hwinfo_mqtt.py COM6 --baud 115200 --prefix HWiNFO:\n")
 
+    try:
+        backend = make_backend(args.hwinfo_backend, args.hwinfo_file)
+    except RuntimeError as e:
+        ap.error(str(e))
+    # Name/Unit se escriben aquí una vez; en cada trama solo los Value que cambian
+    hwinfo = HWiNFOSensors(backend, SENSORS) if backend is not None else None
+
+    recorder = None
+    if args.bin:
+        from vatimetro_binlog import BinarySink
+
+        recorder = BinarySink(args.bin, columns=[(key, "f") for key in LAYOUT.keys])
+        print(f"✅ Grabando en {args.bin} ({len(LAYOUT)} sensores)")
+
     port = args.port or choose_port_interactive()
-    print(f"✅ Puerto: {port}  |  Baud: {args.baud}  |  Prefijo: '{args.prefix}'\n")
+    print(f"✅ Puerto: {port}  |  Baud: {args.baud}  |  Prefijo: '{args.prefix}'  |  JSON: {JSON_BACKEND}\n")
 
     # Inicializar MQTT
     client = mqtt.Client()
     client.username_pw_set(MQTT_USERNAME, MQTT_PASSWORD)
-    client.connect(MQTT_HOST, MQTT_PORT, keepalive=30)
+    mqtt_host = args.mqtt_host or MQTT_HOST
+    mqtt_port = args.mqtt_port or MQTT_PORT
+    client.connect(mqtt_host, mqtt_port, keepalive=30)
     client.loop_start()
-    print(f"✅ MQTT conectado a {MQTT_HOST}:{MQTT_PORT} en topic '{MQTT_TOPIC}'\n")
+    publisher = MqttPublisher.from_args(client, MQTT_TOPIC, args).start()
+    print(f"✅ MQTT conectado a {mqtt_host}:{mqtt_port} en topic '{MQTT_TOPIC}'\n")
 
     ser = serial.Serial(port, args.baud, timeout=1.0)
     time.sleep(2)  # algunos ESP reinician al abrir el puerto
 
-    while True:
+    # Eco de todo lo que llega solo con --debug; si no, panel de estado a ritmo fijo.
+    # El prefijo se comprueba sobre los bytes
+    debug = args.debug
+    echo = (lambda raw: print(raw.decode(errors="ignore"))) if debug else None
+    reader = FrameReader(ser, args.prefix.encode(), on_line=echo)
+    view = StatusView.from_args("serie_json_2_hwinfo_mqtt", args)
+    if view is not None:
+        view.add_status("MQTT", publisher.format_stats).add_status("Serie", reader.format_stats)
+        if hwinfo is not None:
+            view.add_status("HWiNFO", hwinfo.format_stats)
+        if deadband is not None:
+            view.add_status("Deadband", deadband.format_stats)
+        view.start()
+
+    def warn(text: str) -> None:
+        if view is not None:
+            view.error(text)
+        else:
+            print(f"⚠️  {text}")
+
+    # Cada trama se decodifica en el mismo array (NaN + máscara para lo que no llega)
+    frame = LAYOUT.new_frame()
+
+    def handle_frame(payload: bytes) -> None:
+        if not payload:
+            return
+
+        # Solo JSON válido
         try:
-            raw = ser.readline()
-            if not raw:
-                continue
-            line = raw.decode(errors="ignore").rstrip("\r\n")
-
-            # Eco de todo lo que llega (debug/pass-through)
-            print(line)
-
-            if not line.startswith(args.prefix):
-                continue  # ignorar si no lleva prefijo
-
-            payload = line[len(args.prefix):].strip()
-            if not payload:
-                continue
-
-            # Solo JSON válido
-            try:
-                data = json.loads(payload)
-                if not isinstance(data, dict):
-                    continue
-            except json.JSONDecodeError:
-                print("⚠️  JSON inválido, ignorado.")
-                continue
+            if not frame.decode(payload):
+                return
+        except ValueError:
+            warn("JSON inválido, ignorado.")
+            return
 
+        if debug:
             print("    [HWiNFO] Decodificando")
-            # Recorremos pares clave/valor para HWiNFO
-            for k, v in data.items():
-                if k not in SENSORS:
-                    continue  # whitelist estricta
-                try:
-                    val = float(v)
-                except (ValueError, TypeError):
-                    continue
-                meta = SENSORS[k]
-                write_hwinfo_sensor(
-                    meta["group"],
-                    meta["type"],
-                    meta["name"],
-                    val,
-                    unit=meta.get("unit")
-                )
-                print(f"       [HWiNFO] {k} -> {val:.2f}")
-
-            # Enviar JSON completo por MQTT
-            mqtt_payload = {
-                "measurement": MQTT_MEASUREMENT,
-                "tags": {"device": MQTT_DEVICE},
-                "fields": data
-            }
+        # Pares clave/valor válidos de la trama (solo whitelist), en el orden en que llegaron
+        for k, val in frame.items():
+            written = hwinfo.update(k, val) if hwinfo is not None else True
+            if debug:
+                print(f"       [HWiNFO] {k} -> {val:.2f}" + ("" if written else " (sin cambios)"))
+        if hwinfo is not None:
+            hwinfo.commit()
+        if recorder is not None:
+            recorder.writerow([time.time_ns()] + frame.values.tolist())
+
+        # Enviar JSON por MQTT (completo, o solo lo que cambió con --deadband)
+        data = frame.fields()
+        if view is not None:
+            view.count("tramas")
+            view.update(data)
+        fields = deadband.filter(data) if deadband is not None else data
+        if not fields:
+            if view is not None:
+                view.count("sin cambios")
+            elif debug:
+                print("       [MQTT] Sin cambios, no se publica")
+            return
+        mqtt_payload = {
+            "measurement": MQTT_MEASUREMENT,
+            "tags": {"device": MQTT_DEVICE},
+            "fields": fields
+        }
+        publisher.publish_sample(mqtt_payload)
+        if view is not None:
+            view.count("publicadas")
+        elif debug:
             msg = json.dumps(mqtt_payload, separators=(",", ":"), ensure_ascii=False)
-            info = client.publish(MQTT_TOPIC, msg, qos=0, retain=False)
-            info.wait_for_publish(timeout=5)
-            print(f"       [MQTT] Enviado: {msg}")
+            print(f"       [MQTT] Encolado (cola {publisher.depth()}): {msg}")
+
+    while True:
+        try:
+            for payload in reader.read_frames():
+                try:
+                    handle_frame(payload)
+                except Exception as e:
+                    warn(f"Error: {e}")
 
         except KeyboardInterrupt:
             print("\nSaliendo…")
             break
         except Exception as e:
-            print(f"⚠️  Error: {e}")
+            warn(f"Error: {e}")
 
+    if view is not None:
+        view.stop()
     ser.close()
+    print(f"📥 Serie: {reader.format_stats()}")
+    if recorder is not None:
+        recorder.close()
+        print(f"💾 {args.bin}: {recorder.rows} tramas grabadas")
+    if hwinfo is not None:
+        hwinfo.close()
+        print(f"🧮 HWiNFO: {hwinfo.format_stats()}")
+    publisher.stop()
+    print(f"📈 MQTT: {publisher.format_stats()}")
+    if deadband is not None:
+        print(f"📉 Deadband: {deadband.format_stats()}")
     client.loop_stop()
     client.disconnect()
 
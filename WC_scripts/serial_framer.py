@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+# serial_framer.py
+#
+# Lector de tramas por líneas para los puentes serie. En lugar de
+# readline() + decode() de cada línea, lee de golpe todo lo que hay en el
+# puerto (read(in_waiting)), parte por '\n' sobre un bytearray reutilizado y
+# comprueba el prefijo (p.ej. b"HWiNFO:") sobre los bytes: las líneas sin
+# prefijo (logs del ESP) se descartan sin decodificarlas ni recorrerlas
+# en Python: solo se buscan las apariciones del prefijo.
+# Devuelve el contenido tras el prefijo en bytes (json.loads acepta bytes).
+#
+# Cuenta tramas, líneas, bytes leídos y bytes descartados; rate() da
+# tramas/s y bytes descartados/s desde la llamada anterior.
+
+import time
+from typing import Callable, List, Optional
+
+MAX_LINE = 64 * 1024  # una "línea" más larga sin '\n' se descarta (ruido, baudios mal puestos)
+
+
+class FrameReader:
+    """Tramas con prefijo a partir de trozos de bytes (de un puerto serie o de feed())"""
+
+    def __init__(self, ser=None, prefix: bytes = b"HWiNFO:", max_line: int = MAX_LINE,
+                 on_line: Optional[Callable[[bytes], None]] = None):
+        self.ser = ser
+        self.prefix = prefix
+        self.max_line = max_line
+        self.on_line = on_line  # eco/depuración: recibe cada línea completa (sin \r\n)
+        self._buf = bytearray()
+
+        self.bytes_in = 0
+        self.lines = 0
+        self.frames = 0
+        self.discarded_bytes = 0
+        self.overflows = 0
+        self._t0 = time.monotonic()
+        self._last = (self._t0, 0, 0)
+
+    def read_frames(self) -> List[bytes]:
+        """Lee lo disponible (espera hasta el timeout del puerto si no hay nada) y devuelve las tramas"""
+        ser = self.ser
+        waiting = ser.in_waiting
+        data = ser.read(waiting or 1)
+        if not waiting and data:
+            # Llegó el primer byte: lo que haya detrás se lee en la misma pasada
+            more = ser.in_waiting
+            if more:
+                data += ser.read(more)
+        return self.feed(data) if data else []
+
+    def feed(self, data: bytes) -> List[bytes]:
+        """Añade bytes y devuelve el contenido de las tramas completas con prefijo"""
+        self.bytes_in += len(data)
+        buf = self._buf
+        buf += data
+        complete = buf.rfind(b"\n") + 1  # solo se procesan líneas completas
+        if not complete:
+            self._check_overflow()
+            return []
+        self.lines += buf.count(b"\n", 0, complete)
+        if self.on_line is not None:
+            for raw in bytes(buf[:complete]).split(b"\n")[:-1]:
+                self.on_line(raw.rstrip(b"\r"))
+
+        # Se buscan las apariciones del prefijo (no se recorre línea a línea):
+        # las líneas de log sin prefijo no generan trabajo en Python
+        frames = []
+        kept = 0
+        prefix = self.prefix
+        plen = len(prefix)
+        i = buf.find(prefix, 0, complete)
+        while 0 <= i < complete:  # (con prefijo vacío, cada línea es una trama)
+            end = buf.find(b"\n", i + plen)
+            if i == 0 or buf[i - 1] == 0x0A:  # al principio de línea
+                frames.append(bytes(buf[i + plen:end]).strip())
+                kept += end + 1 - i
+            i = buf.find(prefix, end + 1, complete)
+        self.discarded_bytes += complete - kept
+        self.frames += len(frames)
+        del buf[:complete]
+        self._check_overflow()
+        return frames
+
+    def _check_overflow(self) -> None:
+        buf = self._buf
+        if len(buf) > self.max_line:
+            self.discarded_bytes += len(buf)
+            self.overflows += 1
+            buf.clear()
+
+    def rate(self) -> dict:
+        """Tramas/s y bytes descartados/s desde la llamada anterior"""
+        now = time.monotonic()
+        t, frames, discarded = self._last
+        dt = max(now - t, 1e-9)
+        self._last = (now, self.frames, self.discarded_bytes)
+        return {"frames_per_s": (self.frames - frames) / dt, "discarded_bytes_per_s": (self.discarded_bytes - discarded) / dt}
+
+    def stats(self) -> dict:
+        elapsed = max(time.monotonic() - self._t0, 1e-9)
+        return {
+            "bytes_in": self.bytes_in,
+            "lines": self.lines,
+            "frames": self.frames,
+            "discarded_bytes": self.discarded_bytes,
+            "overflows": self.overflows,
+            "frames_per_s": self.frames / elapsed,
+        }
+
+    def format_stats(self) -> str:
+        s = self.stats()
+        pct = 100 * s["discarded_bytes"] / s["bytes_in"] if s["bytes_in"] else 0.0
+        return (f"{s['frames']} tramas ({s['frames_per_s']:.2f}/s) de {s['lines']} líneas | "
+                f"{s['bytes_in'] / 1024:.0f} kB leídos, {s['discarded_bytes'] / 1024:.0f} kB descartados ({pct:.0f} %)"
+                + (f" | {s['overflows']} desbordes" if s["overflows"] else ""))
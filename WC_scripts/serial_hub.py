@@ -0,0 +1,524 @@
+#!/usr/bin/env python3
+# serial_hub.py
+#
+# Concentrador serie: lee N puertos en un solo proceso y un solo bucle
+# asyncio, con una conexión MQTT y un grabador CSV compartidos, en lugar de
+# un script (y un intérprete) por equipo. Cada puerto lleva un handler de
+# protocolo que recibe los bytes leídos y devuelve muestras:
+#   json    placa ESP de sensores: líneas 'HWiNFO:{...}' (como serie_json_2_hwinfo_mqtt.py,
+#           misma whitelist y mismo --deadband; no escribe en HWiNFO: para eso,
+#           el puente serie_json_2_hwinfo_mqtt.py)
+#   wt210   Yokogawa WT210: líneas V/A/W (como vatimetro.py)
+#   ppa500  N4L PPA500: sondeo MULTIL? con una petición en vuelo (como lectura_PPA500.py)
+#
+# En Linux/macOS cada puerto se registra en el bucle con add_reader() sobre
+# su descriptor: ni hilos ni sondeo. En Windows los COM no admiten select(),
+# así que una única tarea recorre todos los puertos cada --poll-ms y lee solo
+# lo que indica in_waiting (nunca bloquea). Un puerto que falla (USB
+# desconectado) se reabre cada pocos segundos sin afectar a los demás.
+#
+# El deadband (--deadband / --deadband-defaults, ver field_filter.py) se aplica
+# a lo que se publica por MQTT, con un filtro por puerto; el CSV lleva todo.
+#
+# Uso:
+#   python serial_hub.py --port json:COM6 --port wt210:COM4 --port ppa500:COM7
+#   python serial_hub.py --port placa=json:COM6 --port red=wt210:COM4 -f hub.csv --no-mqtt -d 600
+
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import paho.mqtt.client as mqtt
+import serial
+
+sys.path.insert(0, str(Path(__file__).resolve().parent / "sensors_serie"))
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "Vatímetro"))
+
+import lectura_PPA500 as ppa500
+from field_filter import SENSORS_DEADBAND_DEFAULTS, DeadbandFilter, add_filter_arguments
+from mqtt_publisher import MqttPublisher, add_publisher_arguments
+from sensors_config import LAYOUT
+from serial_framer import FrameReader
+from vatimetro_acquisition import SampleAssembler, SharedClock
+from vatimetro_parser import parse_raw
+from vatimetro_sink import CsvSink
+
+# ====== MQTT SETTINGS ======
+MQTT_HOST = "155.210.152.63"
+MQTT_PORT = 8080
+MQTT_USERNAME = "emoncms"
+MQTT_PASSWORD = "paip2020"
+MQTT_TOPIC = "cooler"
+
+DEFAULT_POLL_MS = 10.0  # sondeo de los puertos sin select() (Windows)
+RECONNECT_DELAY = 2.0  # s antes de reabrir un puerto que ha fallado
+TICK_INTERVAL = 0.05  # s entre llamadas a tick() (timeouts de sondeo)
+
+
+class PortHandler:
+    """Protocolo de un puerto: bytes leídos -> lista de muestras (dict de campos)"""
+
+    kind = ""
+    default_name = ""
+    baudrate = 9600
+    measurement = ""
+    fields: Tuple[str, ...] = ()
+
+    def __init__(self, name: str, port: str):
+        self.name = name
+        self.port = port
+        self.ser = None
+        self.samples = 0
+        self.bytes_in = 0
+        self.errors = 0
+        self.reopens = 0
+        self.deadband: Optional[DeadbandFilter] = None  # solo afecta a MQTT
+
+    def open(self) -> None:
+        # timeout=0: read() nunca bloquea el bucle
+        self.ser = serial.serial_for_url(self.port, self.baudrate, timeout=0, write_timeout=1.0)
+
+    async def setup(self) -> None:
+        """Configuración inicial del equipo tras abrir el puerto (opcional)"""
+
+    def feed(self, data: bytes) -> List[dict]:
+        raise NotImplementedError
+
+    def tick(self, now: float) -> None:
+        """Llamado periódicamente con time.perf_counter() (timeouts de sondeo)"""
+
+    def status(self) -> str:
+        """Métricas propias del protocolo para el resumen periódico"""
+        return ""
+
+    def close(self) -> None:
+        if self.ser is not None:
+            try:
+                self.ser.close()
+            except (serial.SerialException, OSError):
+                pass
+            self.ser = None
+
+
+class JsonHandler(PortHandler):
+    """Placa ESP: tramas '<prefijo>{json}' entre líneas de log; whitelist SENSORS"""
+
+    kind = "json"
+    default_name = "sensors"
+    baudrate = 115200
+    measurement = "sensors"
+    fields = LAYOUT.keys
+
+    def __init__(self, name: str, port: str, prefix: bytes = b"HWiNFO:"):
+        super().__init__(name, port)
+        self.reader = FrameReader(prefix=prefix)
+        self.frame = LAYOUT.new_frame()
+
+    def feed(self, data: bytes) -> List[dict]:
+        out = []
+        frame = self.frame
+        for payload in self.reader.feed(data):
+            try:
+                if payload and frame.decode(payload):
+                    out.append(frame.fields())
+            except ValueError:
+                self.errors += 1  # JSON inválido
+        return out
+
+    def status(self) -> str:
+        s = self.reader.stats()
+        return f"{s['discarded_bytes'] / 1024:.0f} kB de log descartados"
+
+
+class WT210Handler(PortHandler):
+    """Yokogawa WT210: lecturas V/A/W sueltas que se juntan en muestras"""
+
+    kind = "wt210"
+    default_name = "vatimetro"
+    baudrate = 9600
+    measurement = "power_in"
+    fields = ("Vin", "Iin", "W")
+
+    def __init__(self, name: str, port: str):
+        super().__init__(name, port)
+        self.lines = FrameReader(prefix=b"")
+        self.assembler = SampleAssembler()
+        self.bad_lines = 0
+
+    def feed(self, data: bytes) -> List[dict]:
+        out = []
+        for raw in self.lines.feed(data):
+            if not raw:
+                continue
+            reading = parse_raw(raw)
+            if reading is None:
+                self.bad_lines += 1
+                continue
+            sample = self.assembler.feed(*reading)
+            if sample is not None:
+                vin, iin, w = sample
+                out.append({"Vin": vin, "Iin": iin, "W": w})
+        return out
+
+    def status(self) -> str:
+        return f"{self.bad_lines} líneas no válidas" if self.bad_lines else ""
+
+
+class PPA500Handler(PortHandler):
+    """N4L PPA500: una petición MULTIL? en vuelo; la siguiente sale al llegar la respuesta"""
+
+    kind = "ppa500"
+    default_name = "ppa500"
+    baudrate = ppa500.BAUDRATE
+    measurement = "power_in"
+    fields = ("Vin", "Iin", "W", "F")
+
+    def __init__(self, name: str, port: str, request: bytes = ppa500.MULTIL_REQUEST):
+        super().__init__(name, port)
+        self.request = request
+        self.lines = FrameReader(prefix=b"")
+        self.latency = ppa500.LatencyStats()
+        self.timeouts = 0
+        self._sent: Optional[float] = None  # perf_counter de la petición en vuelo
+        self._ready = False
+
+    async def setup(self) -> None:
+        self._ready = False
+        for cmd in ppa500.MULTIL_SETUP:
+            self.ser.write((cmd + "\r").encode())
+            await asyncio.sleep(ppa500.CMD_DELAY)
+        self.ser.reset_input_buffer()
+        self.lines = FrameReader(prefix=b"")
+        self._ready = True
+        self._send()
+
+    def _send(self) -> None:
+        self.ser.write(self.request)
+        self._sent = time.perf_counter()
+
+    def feed(self, data: bytes) -> List[dict]:
+        out = []
+        for line in self.lines.feed(data):
+            if not line:
+                continue
+            if self._sent is not None:
+                self.latency.add(time.perf_counter() - self._sent)
+                self._sent = None
+            self.latency.replies += 1
+            try:
+                valores = ppa500.parse_multil(line.decode(errors="ignore"))
+            except ValueError:
+                valores = None
+            if valores is None:
+                self.errors += 1
+                continue
+            F, W, V, I = valores
+            out.append({"Vin": V, "Iin": I, "W": W, "F": F})
+        if self._ready and self._sent is None:
+            self._send()
+        return out
+
+    def tick(self, now: float) -> None:
+        if self._sent is not None and now - self._sent > ppa500.TIMEOUT:
+            # Respuesta perdida: se descarta lo recibido a medias y se vuelve a pedir
+            self.timeouts += 1
+            self.ser.reset_input_buffer()
+            self.lines = FrameReader(prefix=b"")
+            self._send()
+
+    def status(self) -> str:
+        st = self.latency.summary()
+        return f"latencia p50 {st['p50_ms']:.1f} ms, p95 {st['p95_ms']:.1f} ms | timeouts {self.timeouts}"
+
+
+HANDLER_TYPES = {
+    "json": JsonHandler,
+    "wt210": WT210Handler,
+    "ppa500": PPA500Handler,
+}
+
+
+def parse_port_spec(spec: str, index: int, used_names: set, options: Dict[str, dict]) -> PortHandler:
+    """'[nombre=]tipo:puerto' -> PortHandler (nombre por defecto: el device del script de ese equipo)"""
+    name = None
+    if "=" in spec.split(":", 1)[0]:
+        name, spec = spec.split("=", 1)
+    kind, sep, port = spec.partition(":")
+    kind = kind.strip().lower()
+    if not sep or not port or kind not in HANDLER_TYPES:
+        raise argparse.ArgumentTypeError(
+            f"Puerto no válido: '{spec}' (formato [nombre=]tipo:puerto, tipos: {', '.join(HANDLER_TYPES)})"
+        )
+    cls = HANDLER_TYPES[kind]
+    if not name:
+        name = cls.default_name if cls.default_name not in used_names else f"{cls.default_name}_{index}"
+    if name in used_names:
+        raise argparse.ArgumentTypeError(f"Nombre repetido: '{name}'")
+    used_names.add(name)
+    return cls(name, port, **options.get(kind, {}))
+
+
+class SerialHub:
+    """Un bucle para todos los puertos; las muestras van a un publicador y un grabador comunes"""
+
+    def __init__(self, handlers: List[PortHandler], publisher: Optional[MqttPublisher] = None,
+                 recorder=None, clock: Optional[SharedClock] = None,
+                 poll_interval: float = DEFAULT_POLL_MS / 1000, stats_interval: float = 10.0):
+        self.handlers = handlers
+        self.publisher = publisher
+        self.recorder = recorder
+        self.clock = clock or SharedClock()
+        self.poll_interval = poll_interval
+        self.stats_interval = stats_interval
+        self.running = False
+        self.columns = columns_for(handlers)
+        self._polled: List[PortHandler] = []
+        self._failed: Dict[PortHandler, asyncio.Future] = {}  # puertos abiertos -> se resuelve si fallan
+
+    # ---------- lectura ----------
+    @staticmethod
+    def _fileno(ser) -> Optional[int]:
+        """Descriptor para add_reader(); None en Windows o en puertos sin fd (loop://, socket://)"""
+        if sys.platform == "win32":
+            return None
+        try:
+            return ser.fileno()
+        except (AttributeError, OSError, ValueError):
+            return None
+
+    def _on_readable(self, handler: PortHandler) -> None:
+        try:
+            ser = handler.ser
+            data = ser.read(ser.in_waiting or 1)
+        except (serial.SerialException, OSError) as e:
+            self._fail(handler, e)
+            return
+        if data:
+            self._process(handler, data)
+
+    async def _poll(self) -> None:
+        while True:
+            for handler in list(self._polled):
+                try:
+                    ser = handler.ser
+                    waiting = ser.in_waiting
+                    data = ser.read(waiting) if waiting else b""
+                except (serial.SerialException, OSError) as e:
+                    self._fail(handler, e)
+                    continue
+                if data:
+                    self._process(handler, data)
+            await asyncio.sleep(self.poll_interval if self._polled else 0.2)
+
+    def _process(self, handler: PortHandler, data: bytes) -> None:
+        handler.bytes_in += len(data)
+        try:
+            samples = handler.feed(data)
+        except (serial.SerialException, OSError) as e:  # escrituras del sondeo
+            self._fail(handler, e)
+            return
+        if samples:
+            self._dispatch(handler, samples)
+
+    def _dispatch(self, handler: PortHandler, samples: List[dict]) -> None:
+        t_ns = self.clock.now_ns()
+        ts = time.time()
+        publisher = self.publisher
+        recorder = self.recorder
+        deadband = handler.deadband
+        for fields in samples:
+            handler.samples += 1
+            if publisher is not None:
+                published = deadband.filter(fields) if deadband is not None else fields
+                if published:
+                    publisher.publish_sample(
+                        {"measurement": handler.measurement, "tags": {"device": handler.name}, "fields": published}, ts=ts
+                    )
+            if recorder is not None:
+                recorder.writerow([t_ns, self.clock.isoformat(t_ns), handler.name,
+                                   *(fields.get(k, "") for k in self.columns)])
+
+    def _fail(self, handler: PortHandler, error: Exception) -> None:
+        handler.errors += 1
+        failed = self._failed.pop(handler, None)
+        if failed is not None and not failed.done():
+            print(f"❌ {handler.name} ({handler.port}): {error}")
+            failed.set_result(error)
+
+    # ---------- tareas ----------
+    async def _run_port(self, handler: PortHandler) -> None:
+        loop = asyncio.get_running_loop()
+        retrying = False
+        while self.running:
+            try:
+                handler.open()
+                await handler.setup()
+            except (serial.SerialException, OSError) as e:
+                if not retrying:  # se avisa una vez; se sigue reintentando cada RECONNECT_DELAY s
+                    print(f"❌ {handler.name} ({handler.port}): {e} (reintentando cada {RECONNECT_DELAY:g} s)")
+                    retrying = True
+                handler.close()
+                await asyncio.sleep(RECONNECT_DELAY)
+                continue
+            retrying = False
+
+            failed = self._failed[handler] = loop.create_future()
+            fd = self._fileno(handler.ser)
+            if fd is not None:
+                loop.add_reader(fd, self._on_readable, handler)
+            else:
+                self._polled.append(handler)
+            print(f"✓ {handler.name}: {handler.kind} en {handler.port} "
+                  f"({'add_reader' if fd is not None else f'sondeo {self.poll_interval * 1000:g} ms'})")
+            try:
+                await failed
+            finally:
+                self._failed.pop(handler, None)
+                if fd is not None:
+                    loop.remove_reader(fd)
+                elif handler in self._polled:
+                    self._polled.remove(handler)
+                handler.close()
+            handler.reopens += 1
+            await asyncio.sleep(RECONNECT_DELAY)
+
+    async def _tick(self) -> None:
+        while True:
+            await asyncio.sleep(TICK_INTERVAL)
+            now = time.perf_counter()
+            for handler in list(self._failed):
+                try:
+                    handler.tick(now)
+                except (serial.SerialException, OSError) as e:
+                    self._fail(handler, e)
+
+    async def _report(self) -> None:
+        last = {handler.name: 0 for handler in self.handlers}
+        while True:
+            await asyncio.sleep(self.stats_interval)
+            for handler in self.handlers:
+                rate = (handler.samples - last[handler.name]) / self.stats_interval
+                last[handler.name] = handler.samples
+                state = "ok" if handler in self._failed else "cerrado"
+                extra = handler.status()
+                if handler.deadband is not None:
+                    extra = " | ".join(filter(None, (extra, f"deadband {handler.deadband.format_stats()}")))
+                print(f"📈 {handler.name} [{state}]: {handler.samples} ({rate:.2f}/s) | errores {handler.errors}"
+                      + (f" | reaperturas {handler.reopens}" if handler.reopens else "")
+                      + (f" | {extra}" if extra else ""))
+            if self.publisher is not None:
+                print(f"📈 MQTT: {self.publisher.format_stats()}")
+
+    async def run(self, duration: Optional[float] = None) -> None:
+        self.running = True
+        tasks = [asyncio.create_task(self._run_port(handler)) for handler in self.handlers]
+        tasks.append(asyncio.create_task(self._poll()))
+        tasks.append(asyncio.create_task(self._tick()))
+        if self.stats_interval > 0:
+            tasks.append(asyncio.create_task(self._report()))
+        try:
+            if duration:
+                await asyncio.sleep(duration)
+            else:
+                await asyncio.Event().wait()  # hasta Ctrl+C
+        finally:
+            self.running = False
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def close(self) -> None:
+        for handler in self.handlers:
+            handler.close()
+        if self.recorder is not None:
+            self.recorder.close()
+
+
+def columns_for(handlers: List[PortHandler]) -> List[str]:
+    """Unión de los campos de todos los handlers, en orden de aparición (columnas del CSV)"""
+    columns = []
+    for handler in handlers:
+        for field in handler.fields:
+            if field not in columns:
+                columns.append(field)
+    return columns
+
+
+def main():
+    ap = argparse.ArgumentParser(
+        description="Concentrador serie: varios equipos en un proceso, una conexión MQTT y un CSV común."
+    )
+    ap.add_argument("-p", "--port", action="append", required=True, metavar="[NOMBRE=]TIPO:PUERTO",
+                    help=f"Puerto a leer, repetible (tipos: {', '.join(HANDLER_TYPES)})")
+    ap.add_argument("--prefix", default="HWiNFO:", help="Prefijo de las tramas de los puertos json (default: 'HWiNFO:')")
+    ap.add_argument("--ppa500-mode", choices=["pipeline", "newloc"], default="pipeline",
+                    help="pipeline: MULTIL? | newloc: NEWLOC;MULTIL? (solo datos nuevos) (default: pipeline)")
+    ap.add_argument("-f", "--file", default=None, help="Grabar las muestras de todos los puertos en un CSV")
+    ap.add_argument("-d", "--duration", type=float, default=None, help="Duración en segundos (default: hasta Ctrl+C)")
+    ap.add_argument("--poll-ms", type=float, default=DEFAULT_POLL_MS,
+                    help=f"Periodo de sondeo de los puertos sin select(), p.ej. COM en Windows (default: {DEFAULT_POLL_MS:g})")
+    ap.add_argument("--stats-interval", type=float, default=10.0, help="Resumen por puerto cada N segundos (0 = nunca)")
+    ap.add_argument("--no-mqtt", action="store_true", help="No publicar por MQTT (solo grabar)")
+    add_publisher_arguments(ap)
+    add_filter_arguments(ap, SENSORS_DEADBAND_DEFAULTS)
+    args = ap.parse_args()
+
+    options = {
+        "json": {"prefix": args.prefix.encode()},
+        "ppa500": {"request": ppa500.NEWLOC_REQUEST if args.ppa500_mode == "newloc" else ppa500.MULTIL_REQUEST},
+    }
+    used_names = set()
+    try:
+        handlers = [parse_port_spec(spec, i, used_names, options) for i, spec in enumerate(args.port)]
+    except argparse.ArgumentTypeError as e:
+        ap.error(str(e))
+    if args.no_mqtt and not args.file:
+        ap.error("Con --no-mqtt hay que indicar -f/--file")
+    try:
+        for handler in handlers:
+            handler.deadband = DeadbandFilter.from_args(args, SENSORS_DEADBAND_DEFAULTS)
+    except ValueError as e:
+        ap.error(str(e))
+
+    recorder = None
+    if args.file:
+        recorder = CsvSink(args.file, header=["t_mono_ns", "timestamp", "device", *columns_for(handlers)])
+        if recorder.recovered_bytes:
+            print(f"⚠ {args.file}: descartados datos incompletos ({recorder.recovered_bytes} bytes)")
+        print(f"✅ Grabando en {args.file}")
+
+    client = publisher = None
+    if not args.no_mqtt:
+        client = mqtt.Client()
+        client.username_pw_set(MQTT_USERNAME, MQTT_PASSWORD)
+        mqtt_host = args.mqtt_host or MQTT_HOST
+        mqtt_port = args.mqtt_port or MQTT_PORT
+        client.connect(mqtt_host, mqtt_port, keepalive=30)
+        client.loop_start()
+        publisher = MqttPublisher.from_args(client, MQTT_TOPIC, args).start()
+        print(f"✅ MQTT conectado a {mqtt_host}:{mqtt_port} en topic '{MQTT_TOPIC}'")
+
+    hub = SerialHub(handlers, publisher, recorder, poll_interval=args.poll_ms / 1000,
+                    stats_interval=args.stats_interval)
+    print(f"▶ {len(handlers)} puertos en un proceso (Ctrl+C para detener)\n")
+    try:
+        asyncio.run(hub.run(args.duration))
+    except KeyboardInterrupt:
+        print("\nSaliendo…")
+    finally:
+        hub.close()
+        total = ", ".join(f"{h.name}={h.samples}" for h in handlers)
+        print(f"✓ Muestras: {total}" + (f" -> {args.file}" if args.file else ""))
+        if publisher is not None:
+            publisher.stop()
+            print(f"📈 MQTT: {publisher.format_stats()}")
+            client.loop_stop()
+            client.disconnect()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+# status_view.py
+#
+# Panel de estado en consola para los puentes. En lugar de imprimir cada
+# línea recibida y cada mensaje publicado (print síncrono en el camino
+# caliente; en la consola de Windows es un techo de rendimiento), el puente
+# solo actualiza contadores y últimos valores en memoria, y un hilo aparte
+# redibuja el panel a ritmo fijo (--refresh, 1 s por defecto):
+#   - tasas de cada contador (recibidas/publicadas por s)
+#   - líneas de estado (cola MQTT, serie, deadband... vía add_status)
+#   - errores y últimos avisos
+#   - último valor de cada campo y su antigüedad
+# Con la salida redirigida (no TTY) no se borra la pantalla: se escribe el
+# resumen cada --refresh s (mínimo 10 s).
+# --debug vuelve al eco de antes (cada línea y cada mensaje) sin panel.
+
+import os
+import sys
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Callable, List, Optional, Tuple
+
+DEFAULT_REFRESH = 1.0
+NON_TTY_MIN_INTERVAL = 10.0  # s entre resúmenes con la salida redirigida
+MAX_FIELDS = 40  # campos mostrados como máximo (pcm publica cientos)
+MAX_EVENTS = 5  # últimos avisos mostrados
+
+
+def add_view_arguments(parser) -> None:
+    """Añade --debug/--refresh a un argparse"""
+    parser.add_argument("--debug", action="store_true",
+                        help="Eco de cada línea recibida y cada mensaje publicado, sin panel de estado")
+    parser.add_argument("--refresh", type=float, default=DEFAULT_REFRESH,
+                        help=f"Segundos entre refrescos del panel de estado (default: {DEFAULT_REFRESH:g}; 0 = sin panel)")
+
+
+def _format_value(value) -> str:
+    if isinstance(value, float):
+        return f"{value:.6g}"
+    return str(value)
+
+
+def _format_age(seconds: float) -> str:
+    if seconds < 60:
+        return f"{seconds:.1f} s"
+    if seconds < 3600:
+        return f"{seconds / 60:.0f} min"
+    return f"{seconds / 3600:.1f} h"
+
+
+class StatusView:
+    """Contadores y últimos valores compartidos + hilo que los muestra a ritmo fijo"""
+
+    def __init__(self, title: str, refresh: float = DEFAULT_REFRESH, stream=None, max_fields: int = MAX_FIELDS):
+        self.title = title
+        self.stream = stream or sys.stdout
+        self.tty = hasattr(self.stream, "isatty") and self.stream.isatty()
+        self.refresh = refresh if self.tty else max(refresh, NON_TTY_MIN_INTERVAL)
+        self.max_fields = max_fields
+
+        self.counters = {}  # nombre -> total (en el orden en que aparecen)
+        self.last = {}  # campo -> último valor
+        self.last_t = {}  # campo -> monotonic de la última actualización
+        self.errors = 0
+        self.events = deque(maxlen=MAX_EVENTS)  # (hora, texto)
+        self._status: List[Tuple[str, Callable[[], str]]] = []
+
+        self._t0 = time.monotonic()
+        self._prev = (self._t0, {})
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @classmethod
+    def from_args(cls, title: str, args) -> Optional["StatusView"]:
+        """None con --debug o --refresh 0: el puente imprime como antes (o nada)"""
+        if args.debug or args.refresh <= 0:
+            return None
+        return cls(title, refresh=args.refresh)
+
+    # ---------- camino caliente (solo memoria) ----------
+    def count(self, name: str, n: int = 1) -> None:
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def update(self, fields: dict) -> None:
+        """Últimos valores de una muestra"""
+        self.last.update(fields)
+        self.last_t.update(dict.fromkeys(fields, time.monotonic()))
+
+    def error(self, text: str) -> None:
+        self.errors += 1
+        self.log(text)
+
+    def log(self, text: str) -> None:
+        self.events.append((datetime.now().strftime("%H:%M:%S"), text))
+
+    # ---------- panel ----------
+    def add_status(self, label: str, func: Callable[[], str]) -> "StatusView":
+        """Línea calculada al refrescar (p.ej. publisher.format_stats)"""
+        self._status.append((label, func))
+        return self
+
+    def render(self) -> str:
+        now = time.monotonic()
+        counters = dict(self.counters)
+        t_prev, prev = self._prev
+        dt = max(now - t_prev, 1e-9)
+        self._prev = (now, counters)
+
+        uptime = int(now - self._t0)
+        lines = [f"{self.title}  |  {datetime.now().strftime('%H:%M:%S')}  |  en marcha "
+                 f"{uptime // 3600:02d}:{uptime // 60 % 60:02d}:{uptime % 60:02d}"]
+        if counters:
+            lines.append(" | ".join(f"{name} {total} ({(total - prev.get(name, 0)) / dt:.1f}/s)"
+                                    for name, total in counters.items()))
+        for label, func in self._status:
+            try:
+                lines.append(f"{label}: {func()}")
+            except Exception as e:  # una línea de estado rota no debe tirar el panel
+                lines.append(f"{label}: ({e})")
+        lines.append(f"Errores: {self.errors}")
+        for t, text in list(self.events):
+            lines.append(f"  {t} {text}")
+
+        last = dict(self.last)
+        last_t = dict(self.last_t)
+        if last:
+            width = min(max(len(key) for key in last), 40)
+            lines.append("-" * (width + 30))
+            lines.append(f"{'campo':<{width}}  {'último':>14}  {'hace':>8}")
+            for key, value in list(last.items())[:self.max_fields]:
+                age = now - last_t.get(key, now)
+                lines.append(f"{key:<{width}}  {_format_value(value):>14}  {_format_age(age):>8}")
+            if len(last) > self.max_fields:
+                lines.append(f"(+{len(last) - self.max_fields} campos)")
+        return "\n".join(lines)
+
+    def draw(self) -> None:
+        text = self.render()
+        if self.tty:
+            # Cursor al inicio + borrar pantalla, en una sola escritura
+            self.stream.write("\x1b[H\x1b[2J" + text + "\n")
+        else:
+            self.stream.write(text + "\n\n")
+        self.stream.flush()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.refresh):
+            try:
+                self.draw()
+            except (OSError, ValueError):  # consola cerrada
+                return
+
+    def start(self) -> "StatusView":
+        if self.tty and os.name == "nt":
+            os.system("")  # activa las secuencias ANSI en la consola de Windows
+        self._thread = threading.Thread(target=self._run, name="status-view", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
@@ -0,0 +1,494 @@
+#!/usr/bin/env python3
+# bench_hotpaths.py
+#
+# Benchmark de los caminos calientes de cada puente (parse -> transformación ->
+# publicación): coste de CPU por muestra y tasa máxima sostenida por etapa.
+# Usa datos sintéticos y un cliente MQTT local en proceso (no hace falta
+# broker, equipo ni Windows). Guarda los resultados en JSON con el commit
+# actual para comparar regresiones entre commits.
+#
+# Uso:
+#   python bench_hotpaths.py                          # -> bench_hotpaths_<commit>.json
+#   python bench_hotpaths.py --compare bench_hotpaths_1c60a39.json
+#   python bench_hotpaths.py --only pcm --min-time 2
+
+import argparse
+import ast
+import csv
+import json
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent
+sys.path.insert(0, str(ROOT / "Vatímetro"))
+sys.path.insert(0, str(ROOT / "WC_scripts"))
+sys.path.insert(0, str(ROOT / "WC_scripts" / "pcm"))
+sys.path.insert(0, str(ROOT / "WC_scripts" / "sensors_serie"))
+
+import pcm_csv_to_mqtt as pcm
+import serie_json_2_hwinfo_mqtt as sensors
+from hwinfo_sensors import HWiNFOSensors, MemoryBackend, sensor_path, writes_unit
+from mqtt_codec import SchemaEncoder
+from sensor_frame import JSON_BACKEND
+from serial_framer import FrameReader
+from vatimetro_parser import parse_line
+
+PCM_COLUMNS_FILE = ROOT / "WC_scripts" / "pcm" / "pcm_csv_to_mqtt_parametros.csv"
+PCM_MAPPING_FILE = ROOT / "WC_scripts" / "pcm" / pcm.MAPPING_FILE
+AUTOMATIZATION_FILE = ROOT / "Afinidad Procesos" / "automatization.py"
+REGRESSION_THRESHOLD = 0.10  # 10 % más CPU por muestra se marca como regresión
+
+
+# ====== MQTT local ======
+class LocalPublishInfo:
+    """Equivalente mínimo de MQTTMessageInfo (ya publicado)"""
+
+    rc = 0
+
+    def wait_for_publish(self, timeout=None):
+        return None
+
+    def is_published(self):
+        return True
+
+
+class LocalMqttClient:
+    """Cliente MQTT en proceso: entrega a los suscriptores locales y cuenta mensajes/bytes"""
+
+    def __init__(self):
+        self.messages = 0
+        self.bytes = 0
+        self.subscribers = []
+        self._info = LocalPublishInfo()
+
+    def publish(self, topic, payload=None, qos=0, retain=False):
+        if isinstance(payload, str):
+            payload = payload.encode("utf-8")
+        self.messages += 1
+        self.bytes += len(payload)
+        for callback in self.subscribers:
+            callback(topic, payload)
+        return self._info
+
+
+# ====== Datos sintéticos ======
+def make_wattmeter_lines(n, rng):
+    lines = []
+    for i in range(n):
+        kind = i % 3
+        if kind == 0:
+            lines.append(f"V  0N  {230.0 + rng.uniform(-11.5, 11.5):.2f}\r\n".encode())
+        elif kind == 1:
+            lines.append(f"A  0N  {2.5 + rng.uniform(-0.125, 0.125):.3f}\r\n".encode())
+        else:
+            lines.append(f"W  0N  {550.0 + rng.uniform(-27.5, 27.5):.2f}\r\n".encode())
+    return lines
+
+
+def load_pcm_columns():
+    """(componentes, métricas) de todas las columnas que imprime PCM en la máquina de pruebas"""
+    components, metrics = [], []
+    with PCM_COLUMNS_FILE.open(encoding="utf-8", errors="ignore", newline="") as f:
+        for row in csv.DictReader(f):
+            components.append((row.get("Component") or row.get("component") or "").strip())
+            metrics.append((row.get("Metric") or row.get("metric") or "").strip())
+    return components, metrics
+
+
+def make_pcm_session(n, rng):
+    """Cabeceras y filas tal como las procesa main() de pcm_csv_to_mqtt.py"""
+    components, metrics = load_pcm_columns()
+    pair_to_index = pcm.build_pair_index(components, metrics)
+
+    fixed_pairs, core_template_metrics = pcm.load_mapping(PCM_MAPPING_FILE)
+    selected_pairs, cores = pcm.expand_core_pairs(components, fixed_pairs, core_template_metrics)
+
+    t0 = datetime(2025, 1, 1, 12, 0, 0)
+    lines = []
+    for i in range(n):
+        t = t0 + timedelta(seconds=i)
+        values = [t.strftime("%Y-%m-%d"), t.strftime("%H:%M:%S.%f")[:-3]]
+        values += [f"{rng.uniform(0, 100):.4g}" for _ in components[2:]]
+        lines.append(",".join(values))
+    return {
+        "lines": lines,
+        "selected_pairs": selected_pairs,
+        "cores": cores,
+        "core_template_metrics": core_template_metrics,
+        "pair_to_index": pair_to_index,
+        "n_columns": len(components),
+        "components": components,
+        "metrics": metrics,
+    }
+
+
+def make_sensor_lines(n, rng, prefix="HWiNFO:"):
+    keys = list(sensors.SENSORS) + ["uptime_s", "rssi"]  # claves fuera de la whitelist también
+    lines = []
+    for _ in range(n):
+        data = {k: round(rng.uniform(0, 60), 2) for k in keys}
+        lines.append(prefix + json.dumps(data))
+    return lines
+
+
+def make_serial_chunks(lines, chatter, rng):
+    """Bytes del puerto por trama: 'chatter' líneas de log del ESP y luego la línea HWiNFO:"""
+    chunks = []
+    for line in lines:
+        noise = [f"[{rng.randint(0, 10**6):7d}] I (wifi) rssi={rng.randint(-90, -30)} heap={rng.randint(10**4, 10**5)} "
+                 f"task=sensors state=ok" for _ in range(chatter)]
+        chunks.append(("\r\n".join(noise + [line]) + "\r\n").encode())
+    return chunks
+
+
+def make_sensor_frames(n, rng):
+    """Tramas whitelist con valores que varían despacio (paseo aleatorio), como el bucle de agua"""
+    values = {k: rng.uniform(20, 40) for k in sensors.SENSORS}
+    frames = []
+    for _ in range(n):
+        for k in values:
+            values[k] += rng.gauss(0, 0.005)
+        frames.append(list(values.items()))
+    return frames
+
+
+def make_hwinfo_csv(path, rows, cols, rng):
+    """CSV de HWiNFO con 'rows' filas: read_csv_latest lo relee entero en cada llamada"""
+    headers = ["Date", "Time", "CPU Package Power [W]"] + [f"Sensor {i} [°C]" for i in range(cols - 3)]
+    t0 = datetime(2025, 1, 1, 12, 0, 0)
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(headers)
+        for i in range(rows):
+            t = t0 + timedelta(seconds=i)
+            writer.writerow([t.strftime("%d.%m.%Y"), t.strftime("%H:%M:%S.%f")[:-3]]
+                            + [f"{rng.uniform(10, 120):.3f}" for _ in range(cols - 2)])
+
+
+def load_read_csv_latest():
+    """Extrae read_csv_latest de automatization.py sin ejecutar el script (redirige stdout, busca Prime95...)"""
+    tree = ast.parse(AUTOMATIZATION_FILE.read_text(encoding="utf-8"))
+    funcs = [node for node in tree.body if isinstance(node, ast.FunctionDef) and node.name == "read_csv_latest"]
+    if not funcs:
+        raise RuntimeError(f"read_csv_latest no encontrada en {AUTOMATIZATION_FILE}")
+    module = ast.Module(body=funcs, type_ignores=[])
+    namespace = {"csv": csv}
+    exec(compile(module, str(AUTOMATIZATION_FILE), "exec"), namespace)
+    return namespace["read_csv_latest"]
+
+
+# ====== Medida ======
+def measure(func, items, min_time, repeat):
+    """Aplica func a cada item hasta cubrir min_time; devuelve la mejor de 'repeat' pasadas"""
+    best_cpu = best_wall = float("inf")
+    samples = 0
+    for _ in range(repeat):
+        n = 0
+        c0 = time.process_time()
+        t0 = time.perf_counter()
+        while True:
+            for item in items:
+                func(item)
+            n += len(items)
+            if time.perf_counter() - t0 >= min_time:
+                break
+        wall = (time.perf_counter() - t0) / n
+        cpu = (time.process_time() - c0) / n
+        best_wall = min(best_wall, wall)
+        best_cpu = min(best_cpu, cpu)
+        samples += n
+    return {
+        "samples": samples,
+        "cpu_us": best_cpu * 1e6,
+        "wall_us": best_wall * 1e6,
+        "max_rate_hz": 1.0 / best_wall if best_wall > 0 else float("inf"),
+    }
+
+
+def build_stages(args, workdir):
+    """Devuelve {puente: [(etapa, función, items)]}"""
+    rng = random.Random(args.seed)
+    client = LocalMqttClient()
+    stages = {}
+    extra_stages = {}
+
+    # ---- Vatímetro (test.py) ----
+    lines = make_wattmeter_lines(args.samples, rng)
+
+    def vatimetro_publish(fields):
+        payload = {"measurement": "power_in", "tags": {"device": "vatimetro"}, "fields": fields}
+        msg = json.dumps(payload, separators=(",", ":"), ensure_ascii=False)
+        client.publish("cooler", msg, qos=0, retain=False).wait_for_publish(timeout=5)
+
+    vat_fields = [{"ver": "1", "Vin": 230.0 + i * 1e-3, "Iin": 2.5, "W": 550.0} for i in range(args.samples // 3)]
+    stages["vatimetro"] = [
+        ("parse_line", parse_line, lines),
+        ("serialize_publish", vatimetro_publish, vat_fields),
+    ]
+
+    # ---- PCM (pcm_csv_to_mqtt.py) ----
+    session = make_pcm_session(max(50, args.samples // 100), rng)
+    selected_pairs = session["selected_pairs"]
+    n_columns = session["n_columns"]
+    plan = pcm.compile_projection(selected_pairs, session["pair_to_index"])
+    width = pcm.projection_width(plan)
+
+    def pcm_parse_extract(line):
+        return pcm.project_row(line, plan, n_columns, width)
+
+    pcm_fields = [pcm_parse_extract(line) for line in session["lines"][:20]]
+
+    def pcm_publish(fields):
+        payload = {"measurement": pcm.MQTT_MEASUREMENT, "tags": {"device": pcm.MQTT_DEVICE}, "fields": fields}
+        msg = json.dumps(payload, separators=(",", ":"), ensure_ascii=False)
+        client.publish(pcm.MQTT_TOPIC, msg, qos=0, retain=False).wait_for_publish(timeout=5)
+
+    encoder = SchemaEncoder(pcm.MQTT_TOPIC)
+
+    def pcm_publish_packed(fields):
+        payload = {"measurement": pcm.MQTT_MEASUREMENT, "tags": {"device": pcm.MQTT_DEVICE}, "fields": fields}
+        for topic, body, retain in encoder.encode([(payload, time.time())]):
+            client.publish(topic, body, qos=0, retain=retain).wait_for_publish(timeout=5)
+
+    stages["pcm"] = [
+        ("parse_csv_line+extract", pcm_parse_extract, session["lines"]),
+        ("serialize_publish", pcm_publish, pcm_fields),
+    ]
+    agg_plan = pcm.compile_aggregation(pcm.CORE_GROUPS, session["cores"], session["core_template_metrics"], plan)
+
+    def pcm_aggregate(fields):
+        return pcm.aggregate_fields(fields, agg_plan)
+
+    # Alternativas/etapas opcionales (no suman en el total del puente)
+    extra_stages["pcm"] = [
+        ("serialize_publish_packed", pcm_publish_packed, pcm_fields),
+        ("aggregate_groups", pcm_aggregate, pcm_fields),
+    ]
+
+    # ---- Sensores serie (serie_json_2_hwinfo_mqtt.py) ----
+    prefix = "HWiNFO:"
+    sensor_lines = make_sensor_lines(max(100, args.samples // 10), rng, prefix)
+
+    sensor_frame = sensors.LAYOUT.new_frame()
+
+    def sensors_decode_whitelist(line):
+        if not line.startswith(prefix):
+            return None
+        if not sensor_frame.decode(line[len(prefix):].strip()):
+            return None
+        return list(sensor_frame.items())
+
+    def sensors_decode_whitelist_dict(line):
+        # Camino anterior: json.loads + pertenencia a SENSORS y float() por clave
+        if not line.startswith(prefix):
+            return None
+        data = json.loads(line[len(prefix):].strip())
+        if not isinstance(data, dict):
+            return None
+        out = []
+        for k, v in data.items():
+            if k not in sensors.SENSORS:
+                continue
+            try:
+                out.append((k, float(v)))
+            except (ValueError, TypeError):
+                continue
+        return out
+
+    sensor_data = [json.loads(line[len(prefix):]) for line in sensor_lines[:100]]
+
+    def sensors_publish(data):
+        payload = {"measurement": sensors.MQTT_MEASUREMENT, "tags": {"device": sensors.MQTT_DEVICE}, "fields": data}
+        msg = json.dumps(payload, separators=(",", ":"), ensure_ascii=False)
+        client.publish(sensors.MQTT_TOPIC, msg, qos=0, retain=False).wait_for_publish(timeout=5)
+
+    stages["sensors"] = [
+        ("json_decode+whitelist", sensors_decode_whitelist, sensor_lines),
+        ("serialize_publish", sensors_publish, sensor_data),
+    ]
+
+    # Escrituras HWiNFO sobre el backend en memoria: la forma antigua (abrir la
+    # clave + Name/Value/Unit por sensor y trama) frente a la caché por cambios
+    sensor_frames = make_sensor_frames(max(100, args.samples // 10), rng)
+    legacy_backend = MemoryBackend()
+
+    def hwinfo_write_legacy(frame):
+        for k, val in frame:
+            meta = sensors.SENSORS[k]
+            handle = legacy_backend.open_key(sensor_path(meta["group"], meta["type"]))
+            legacy_backend.set_value(handle, "Name", meta["name"])
+            legacy_backend.set_value(handle, "Value", f"{val:.2f}")
+            if writes_unit(meta):
+                legacy_backend.set_value(handle, "Unit", meta["unit"])
+
+    hwinfo = HWiNFOSensors(MemoryBackend(), sensors.SENSORS)
+
+    # Llamadas al backend por trama (una pasada aparte, sin contar repeticiones del benchmark)
+    probe = HWiNFOSensors(MemoryBackend(), sensors.SENSORS)
+    for frame in sensor_frames:
+        for k, val in frame:
+            probe.update(k, val)
+    probe_stats = probe.stats()
+    for frame in sensor_frames:  # (antes de las etapas: legacy_backend aún está a cero)
+        hwinfo_write_legacy(frame)
+    legacy_probe_calls = legacy_backend.opens + legacy_backend.sets
+
+    def hwinfo_write_cached(frame):
+        for k, val in frame:
+            hwinfo.update(k, val)
+        hwinfo.commit()
+
+    # Lectura del puerto: readline() + decode de cada línea (antes) frente a
+    # FrameReader, que descarta por prefijo sobre bytes. Un item = una trama con su ruido
+    serial_chunks = make_serial_chunks(sensor_lines, args.chatter, rng)
+    prefix_bytes = prefix.encode()
+
+    def serial_readline_legacy(chunk):
+        frames = []
+        for raw in chunk.splitlines(keepends=True):
+            line = raw.decode(errors="ignore").rstrip("\r\n")
+            if line.startswith(prefix):
+                frames.append(line[len(prefix):].strip())
+        return frames
+
+    frame_reader = FrameReader(prefix=prefix_bytes)
+
+    extra_stages["sensors"] = [
+        ("json_decode+whitelist_dict", sensors_decode_whitelist_dict, sensor_lines),
+        ("serial_readline_legacy", serial_readline_legacy, serial_chunks),
+        ("serial_frame_reader", frame_reader.feed, serial_chunks),
+        ("hwinfo_write_legacy", hwinfo_write_legacy, sensor_frames),
+        ("hwinfo_write_cached", hwinfo_write_cached, sensor_frames),
+    ]
+
+    # ---- Afinidad (automatization.py) ----
+    read_csv_latest = load_read_csv_latest()
+    hwinfo_csv = Path(workdir) / "hwinfo_log.csv"
+    make_hwinfo_csv(hwinfo_csv, args.hwinfo_rows, args.hwinfo_cols, rng)
+    stages["automatization"] = [
+        ("read_csv_latest", read_csv_latest, [str(hwinfo_csv)]),
+    ]
+
+    params = {
+        "samples": args.samples,
+        "pcm_columns": n_columns,
+        "pcm_selected_pairs": len(selected_pairs),
+        "hwinfo_calls_per_frame_legacy": legacy_probe_calls / len(sensor_frames),
+        "hwinfo_calls_per_frame_cached": probe_stats["backend_calls"] / len(sensor_frames),
+        "serial_chatter_lines": args.chatter,
+        "sensors_json_backend": JSON_BACKEND,
+        "hwinfo_rows": args.hwinfo_rows,
+        "hwinfo_cols": args.hwinfo_cols,
+        "min_time": args.min_time,
+        "repeat": args.repeat,
+        "seed": args.seed,
+    }
+    return stages, extra_stages, params, client
+
+
+def git_commit():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT,
+                                    capture_output=True, text=True, check=True).stdout.strip())
+        return commit, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown", False
+
+
+def compare(results, base_path):
+    """Imprime la variación de CPU por muestra respecto a un JSON anterior"""
+    with open(base_path, encoding="utf-8") as f:
+        base = json.load(f)
+    print(f"\n=== Comparación con {base.get('commit', '?')} ({base_path}) ===")
+    regressions = 0
+    for bridge, stages in results["bridges"].items():
+        for stage, res in stages["stages"].items():
+            old = base.get("bridges", {}).get(bridge, {}).get("stages", {}).get(stage)
+            if not old:
+                print(f"  {bridge}.{stage:<26s} (nuevo)")
+                continue
+            ratio = res["cpu_us"] / old["cpu_us"] if old["cpu_us"] else float("inf")
+            mark = ""
+            if ratio > 1 + REGRESSION_THRESHOLD:
+                mark = "  ⚠ regresión"
+                regressions += 1
+            elif ratio < 1 - REGRESSION_THRESHOLD:
+                mark = "  📈 mejora"
+            print(f"  {bridge}.{stage:<26s} {old['cpu_us']:10.2f} -> {res['cpu_us']:10.2f} µs  (x{ratio:.2f}){mark}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de los caminos calientes de los puentes")
+    parser.add_argument("-n", "--samples", type=int, default=30_000, help="Muestras sintéticas por etapa (base)")
+    parser.add_argument("--min-time", type=float, default=1.0, help="Segundos mínimos por pasada (default: 1)")
+    parser.add_argument("-r", "--repeat", type=int, default=3, help="Pasadas por etapa (se toma la mejor)")
+    parser.add_argument("--chatter", type=int, default=20, help="Líneas de log del ESP por trama HWiNFO: (sensores)")
+    parser.add_argument("--hwinfo-rows", type=int, default=3600, help="Filas del CSV de HWiNFO (default: 1 h a 1 Hz)")
+    parser.add_argument("--hwinfo-cols", type=int, default=200, help="Columnas del CSV de HWiNFO")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--only", action="append", help="Medir solo este puente (repetible)")
+    parser.add_argument("-o", "--output", help="JSON de resultados (default: bench_hotpaths_<commit>.json)")
+    parser.add_argument("--compare", metavar="BASE_JSON", help="Comparar con un resultado anterior")
+    args = parser.parse_args()
+
+    commit, dirty = git_commit()
+    with tempfile.TemporaryDirectory() as workdir:
+        stages, extra_stages, params, client = build_stages(args, workdir)
+        if args.only:
+            stages = {k: v for k, v in stages.items() if k in args.only}
+
+        results = {
+            "commit": commit,
+            "dirty": dirty,
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "params": params,
+            "bridges": {},
+        }
+
+        print(f"=== bench_hotpaths @ {commit}{' (modificado)' if dirty else ''} | Python {results['python']} ===")
+        for bridge, bridge_stages in stages.items():
+            print(f"\n[{bridge}]")
+            out = {}
+            for name, func, items in bridge_stages:
+                res = measure(func, items, args.min_time, args.repeat)
+                out[name] = res
+                print(f"  {name:<26s} {res['cpu_us']:10.2f} µs CPU/muestra  {res['max_rate_hz']:14,.0f} muestras/s")
+            total_cpu = sum(res["cpu_us"] for res in out.values())
+            results["bridges"][bridge] = {
+                "stages": out,
+                "cpu_us_total": total_cpu,
+                "max_rate_hz": 1e6 / total_cpu if total_cpu > 0 else float("inf"),
+            }
+            print(f"  {'total':<26s} {total_cpu:10.2f} µs CPU/muestra  "
+                  f"{results['bridges'][bridge]['max_rate_hz']:14,.0f} muestras/s")
+            for name, func, items in extra_stages.get(bridge, []):
+                res = measure(func, items, args.min_time, args.repeat)
+                out[name] = res
+                print(f"  {name:<26s} {res['cpu_us']:10.2f} µs CPU/muestra  {res['max_rate_hz']:14,.0f} muestras/s")
+
+    results["mqtt"] = {"messages": client.messages, "bytes": client.bytes}
+
+    output = args.output or f"bench_hotpaths_{commit}.json"
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+    print(f"\n✓ Resultados guardados en {output}")
+
+    if args.compare:
+        regressions = compare(results, args.compare)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
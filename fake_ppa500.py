@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# fake_ppa500.py
+#
+# PPA500 falso sobre un pty (solo Linux/macOS) para medir lectura_PPA500.py sin
+# el equipo. Responde a MULTIL? / NEWLOC;MULTIL? con "F,W,V,I" tras una latencia
+# configurable, atendiendo las peticiones de una en una como el equipo real,
+# e ignora los comandos de configuración.
+#
+# Uso:
+#   python fake_ppa500.py --latency 20          # imprime el pty, p.ej. /dev/pts/5
+#   python lectura_PPA500.py -p /dev/pts/5 -m pipeline -q -d 10
+
+import argparse
+import heapq
+import os
+import random
+import select
+import time
+import tty
+
+BAUDRATE = 38400
+
+
+def make_reply(rng):
+    """Respuesta MULTIL con valores realistas (F, W, V, I)"""
+    v = 230.0 + rng.uniform(-2.0, 2.0)
+    i = 2.5 + rng.uniform(-0.1, 0.1)
+    return f"{50.0 + rng.uniform(-0.05, 0.05):.3f},{v * i * 0.95:.2f},{v:.2f},{i:.4f}\r\n".encode()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PPA500 simulado sobre un pty")
+    parser.add_argument("--latency", type=float, default=20.0, help="Tiempo de proceso por petición (ms)")
+    parser.add_argument("--jitter", type=float, default=2.0, help="Variación aleatoria de la latencia (ms)")
+    parser.add_argument("--update-ms", type=float, default=0.0,
+                        help="Periodo de medida para NEWLOC (ms): la respuesta espera al siguiente dato")
+    parser.add_argument("--no-wire-delay", action="store_true",
+                        help="No simular el tiempo de transmisión a 38400 baudios")
+    args = parser.parse_args()
+
+    master, slave = os.openpty()
+    tty.setraw(slave)
+    print(os.ttyname(slave), flush=True)
+
+    rng = random.Random(0)
+    byte_time = 0.0 if args.no_wire_delay else 10.0 / BAUDRATE
+    inbuf = bytearray()
+    scheduled = []  # heap (t_envío, seq, bytes)
+    seq = 0
+    busy_until = 0.0
+    requests = 0
+    t0 = time.monotonic()
+
+    try:
+        while True:
+            now = time.monotonic()
+            timeout = max(0.0, scheduled[0][0] - now) if scheduled else 1.0
+            ready, _, _ = select.select([master], [], [], timeout)
+
+            if ready:
+                try:
+                    data = os.read(master, 4096)
+                except OSError:
+                    data = b""
+                inbuf += data
+                now = time.monotonic()
+                while True:
+                    idx = inbuf.find(b"\r")
+                    if idx == -1:
+                        break
+                    cmd = bytes(inbuf[:idx]).strip().upper()
+                    del inbuf[:idx + 1]
+                    if not cmd.endswith(b"MULTIL?"):
+                        continue
+                    requests += 1
+                    start = max(now + len(cmd) * byte_time, busy_until)
+                    if cmd.startswith(b"NEWLOC") and args.update_ms > 0:
+                        period = args.update_ms / 1000
+                        start = t0 + (int((start - t0) / period) + 1) * period
+                    reply = make_reply(rng)
+                    latency = max(0.0, args.latency + rng.uniform(-args.jitter, args.jitter)) / 1000
+                    busy_until = start + latency + len(reply) * byte_time
+                    heapq.heappush(scheduled, (busy_until, seq, reply))
+                    seq += 1
+
+            now = time.monotonic()
+            while scheduled and scheduled[0][0] <= now:
+                _, _, reply = heapq.heappop(scheduled)
+                os.write(master, reply)
+
+    except KeyboardInterrupt:
+        elapsed = time.monotonic() - t0
+        print(f"\n{requests} peticiones atendidas en {elapsed:.1f} s")
+    finally:
+        os.close(master)
+        os.close(slave)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,65 +1,188 @@
+import argparse
 import serial
 import time
+from collections import deque
 from datetime import datetime
 
 # Configuración del puerto serie
-ser = serial.Serial('COM7', 38400, timeout=0.5)
+DEFAULT_PORT = 'COM7'
+BAUDRATE = 38400
+TIMEOUT = 0.5
+CMD_DELAY = 0.1  # espera tras cada comando de configuración (s)
 
-def enviar(cmd, delay=0.1):
+MULTIL_REQUEST = b"MULTIL?\r"
+NEWLOC_REQUEST = b"NEWLOC;MULTIL?\r"  # espera a un dato nuevo antes de responder
+
+def enviar(ser, cmd, delay=CMD_DELAY):
     """Envía un comando al vatímetro y espera un pequeño delay."""
     ser.write((cmd + '\r').encode())
     time.sleep(delay)
 
-def configurar_multil_newloc():
+# Comandos de configuración MULTIL (en orden, con CMD_DELAY entre ellos)
+MULTIL_SETUP = [
+    "*CLS",          # limpia estados anteriores
+    "MULTIL,0",      # activa MULTIL
+    # Configuración de canales
+    "MULTIL,1,1,1",  # Frecuencia
+    "MULTIL,2,1,2",  # Vatios
+    "MULTIL,3,1,50", # Voltaje RMS
+    "MULTIL,4,1,51", # Corriente RMS
+]
+
+def configurar_multil_newloc(ser, delay=CMD_DELAY):
     """Configura MULTIL """
     print("Configurando MULTIL ")
 
-    enviar("*CLS")          # limpia estados anteriores
-    enviar("MULTIL,0")      # activa MULTIL
-
-    # Configuración de canales
-    enviar("MULTIL,1,1,1")   # Frecuencia
-    enviar("MULTIL,2,1,2")   # Vatios
-    enviar("MULTIL,3,1,50")  # Voltaje RMS
-    enviar("MULTIL,4,1,51")  # Corriente RMS
+    for cmd in MULTIL_SETUP:
+        enviar(ser, cmd, delay)
 
-#    enviar("NEWLOC,1")       # sincroniza la transmisión
-#    enviar("MULTIL?")        # dispara la primera lectura para iniciar flujo
+#    enviar(ser, "NEWLOC,1")       # sincroniza la transmisión
+#    enviar(ser, "MULTIL?")        # dispara la primera lectura para iniciar flujo
 
     print("Configuración completada\n")
 
-def leer_multil():
-    """Lee una línea de MULTIL desde el vatímetro."""
-    ser.reset_input_buffer()
-    ser.write(b"MULTIL?\r")
-#    ser.write(b"NEWLOC;MULTIL?\r")
-    return ser.readline().decode(errors='ignore').strip()
-
-try:
-    configurar_multil_newloc()
-
-    while True:
-        data = leer_multil()
-
-        if data:
-            try:
-                valores = [float(x) for x in data.split(',')]
-
-                if len(valores) == 4:
-                    F, W, V, I = valores  # orden correcto
-                    timestamp = datetime.now().strftime("%H:%M:%S.%f")[:-3]  # milisegundos
-                    print(f"{timestamp} | {F:6.2f} Hz | {W:8.2f} W | {V:7.2f} V | {I:7.4f} A")
-                else:
-                    print("Formato inesperado:", data)
-
-            except ValueError:
-                print("Error parseando:", data)
-        else:
-            # No bloquear si no hay datos, simplemente espera
-            time.sleep(0.05)
-
-except KeyboardInterrupt:
-    print("\nLectura detenida")
-
-finally:
-    ser.close()
\ No newline at end of file
+def parse_multil(data):
+    """Convierte una respuesta MULTIL en (F, W, V, I); None si no trae 4 valores.
+    Lanza ValueError si algún valor no es numérico."""
+    valores = [float(x) for x in data.split(',')]
+    if len(valores) != 4:
+        return None
+    return tuple(valores)  # orden correcto: F, W, V, I
+
+class LatencyStats:
+    """Tasa lograda y distribución de la latencia petición -> respuesta"""
+
+    def __init__(self, window=10000):
+        self.latencies = deque(maxlen=window)
+        self.replies = 0
+        self.t_start = time.perf_counter()
+
+    def add(self, latency):
+        self.latencies.append(latency)
+
+    def summary(self):
+        elapsed = time.perf_counter() - self.t_start
+        ordered = sorted(self.latencies)
+        def pct(p):
+            return ordered[min(len(ordered) - 1, int(p * len(ordered)))] * 1000 if ordered else 0.0
+        return {
+            "replies": self.replies,
+            "hz": self.replies / elapsed if elapsed > 0 else 0.0,
+            "p50_ms": pct(0.50),
+            "p95_ms": pct(0.95),
+            "p99_ms": pct(0.99),
+            "max_ms": ordered[-1] * 1000 if ordered else 0.0,
+        }
+
+    def format(self):
+        st = self.summary()
+        return (f"{st['hz']:.2f} Hz ({st['replies']} respuestas) | latencia p50 {st['p50_ms']:.1f} ms, "
+                f"p95 {st['p95_ms']:.1f} ms, p99 {st['p99_ms']:.1f} ms, máx {st['max_ms']:.1f} ms")
+
+class MultilPoller:
+    """Sondeo MULTIL? con 'depth' peticiones en vuelo.
+    depth=0 es el modo síncrono de siempre: limpia el buffer, pide y espera la respuesta.
+    Con depth>=1 la siguiente petición sale en cuanto llega una respuesta, antes
+    de parsearla, así el medidor ya está trabajando mientras procesamos."""
+
+    def __init__(self, ser, depth=1, request=MULTIL_REQUEST):
+        self.ser = ser
+        self.depth = depth
+        self.request = request
+        self.pending = deque()
+        self.timeouts = 0
+        self.stats = LatencyStats()
+
+    def _send(self):
+        self.ser.write(self.request)
+        self.pending.append(time.perf_counter())
+
+    def start(self):
+        self.ser.reset_input_buffer()
+        self.pending.clear()
+        for _ in range(self.depth):
+            self._send()
+
+    def read(self):
+        """Devuelve la siguiente respuesta (str) o '' si hubo timeout"""
+        if self.depth == 0:
+            self.ser.reset_input_buffer()
+            self.pending.clear()
+            self._send()
+
+        raw = self.ser.readline()
+        t = time.perf_counter()
+        if not raw:
+            # Respuesta perdida: resincroniza las peticiones en vuelo
+            self.timeouts += 1
+            if self.depth:
+                self.start()
+            return ''
+
+        if self.pending:
+            self.stats.add(t - self.pending.popleft())
+        self.stats.replies += 1
+        if self.depth:
+            self._send()
+        return raw.decode(errors='ignore').strip()
+
+def main():
+    parser = argparse.ArgumentParser(description="Lectura MULTIL del vatímetro PPA500")
+    parser.add_argument("-p", "--port", default=DEFAULT_PORT, help=f"Puerto serie (default: {DEFAULT_PORT})")
+    parser.add_argument(
+        "-m", "--modo", choices=["sync", "pipeline", "newloc"], default="sync",
+        help="sync: una petición y espera (original) | pipeline: peticiones en vuelo | "
+             "newloc: pipeline con NEWLOC;MULTIL? (solo datos nuevos)"
+    )
+    parser.add_argument("--depth", type=int, default=1, help="Peticiones en vuelo en pipeline/newloc (default: 1)")
+    parser.add_argument("--cmd-delay", type=float, default=CMD_DELAY, help=f"Espera tras cada comando de configuración (default: {CMD_DELAY} s)")
+    parser.add_argument("-d", "--duration", type=float, default=None, help="Duración en segundos (default: hasta Ctrl+C)")
+    parser.add_argument("--stats-interval", type=float, default=10.0, help="Mostrar Hz y latencias cada N segundos (0 = nunca)")
+    parser.add_argument("-q", "--quiet", action="store_true", help="No imprimir cada muestra")
+    args = parser.parse_args()
+
+    ser = serial.Serial(args.port, BAUDRATE, timeout=TIMEOUT)
+
+    if args.modo == "sync":
+        poller = MultilPoller(ser, depth=0)
+    else:
+        request = NEWLOC_REQUEST if args.modo == "newloc" else MULTIL_REQUEST
+        poller = MultilPoller(ser, depth=max(1, args.depth), request=request)
+
+    try:
+        configurar_multil_newloc(ser, args.cmd_delay)
+        poller.start()
+        t_end = time.monotonic() + args.duration if args.duration else None
+        last_stats = time.monotonic()
+
+        while t_end is None or time.monotonic() < t_end:
+            data = poller.read()
+
+            if data:
+                try:
+                    valores = parse_multil(data)
+
+                    if valores is not None:
+                        F, W, V, I = valores
+                        if not args.quiet:
+                            timestamp = datetime.now().strftime("%H:%M:%S.%f")[:-3]  # milisegundos
+                            print(f"{timestamp} | {F:6.2f} Hz | {W:8.2f} W | {V:7.2f} V | {I:7.4f} A")
+                    else:
+                        print("Formato inesperado:", data)
+
+                except ValueError:
+                    print("Error parseando:", data)
+
+            if args.stats_interval > 0 and time.monotonic() - last_stats >= args.stats_interval:
+                last_stats = time.monotonic()
+                print(f"📈 [{args.modo}] {poller.stats.format()} | timeouts {poller.timeouts}")
+
+    except KeyboardInterrupt:
+        print("\nLectura detenida")
+
+    finally:
+        print(f"✓ [{args.modo}] {poller.stats.format()} | timeouts {poller.timeouts}")
+        ser.close()
+
+if __name__ == "__main__":
+    main()
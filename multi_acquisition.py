@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+# multi_acquisition.py
+#
+# Motor de adquisición asyncio para varios medidores serie a la vez
+# (WT210, PPA500 y los que se añadan a INSTRUMENT_TYPES).
+# Cada muestra se marca con un reloj monotónico común a todos los medidores
+# y va a un único CSV (t_mono_ns: ns desde el arranque; timestamp: hora ISO),
+# así se pueden comparar muestra a muestra sin lanzar y alinear N procesos.
+#
+# Uso:
+#   python multi_acquisition.py --inst wt210:COM4 --inst ppa500:COM7 -f multi.csv
+#   python multi_acquisition.py --inst red=wt210:COM4 --inst ref=ppa500:COM7 -d 600
+
+import argparse
+import asyncio
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import serial
+
+sys.path.insert(0, str(Path(__file__).resolve().parent / "Vatímetro"))
+
+import lectura_PPA500 as ppa500
+from vatimetro_acquisition import SharedClock, WT210Reader
+from vatimetro_sink import CsvSink
+
+DEFAULT_CSV_FILE = "multi_acquisition.csv"
+FIELDS = ["Vin", "Iin", "W", "F"]
+CSV_HEADER = ["t_mono_ns", "timestamp", "instrument", *FIELDS]
+
+
+class Instrument:
+    """Medidor serie genérico. Los métodos bloqueantes se ejecutan en un hilo del motor"""
+
+    baudrate = 9600
+    timeout = 1.0
+
+    def __init__(self, name, port):
+        self.name = name
+        self.port = port
+        self.ser = None
+        self.samples = 0
+
+    def open(self):
+        self.ser = serial.serial_for_url(self.port, self.baudrate, timeout=self.timeout)
+        self.setup()
+
+    def setup(self):
+        """Configuración inicial del medidor (opcional)"""
+
+    def read_samples(self):
+        """Bloquea hasta tener datos (o timeout) y devuelve una lista de dicts de campos"""
+        raise NotImplementedError
+
+    def close(self):
+        if self.ser is not None:
+            self.ser.close()
+
+
+class WT210Instrument(Instrument):
+    """Yokogawa WT210: líneas V/A/W a 9600 baudios"""
+
+    baudrate = 9600
+    timeout = 1.0
+
+    def setup(self):
+        self.reader = WT210Reader(self.ser)
+
+    def read_samples(self):
+        return [{"Vin": vin, "Iin": iin, "W": w} for vin, iin, w in self.reader.poll()]
+
+
+class PPA500Instrument(Instrument):
+    """N4L PPA500: sondeo MULTIL? a 38400 baudios"""
+
+    baudrate = ppa500.BAUDRATE
+    timeout = ppa500.TIMEOUT
+
+    def setup(self):
+        ppa500.configurar_multil_newloc(self.ser)
+        # Una petición siempre en vuelo (ver MultilPoller en lectura_PPA500.py)
+        self.poller = ppa500.MultilPoller(self.ser, depth=1)
+        self.poller.start()
+
+    def read_samples(self):
+        data = self.poller.read()
+        if not data:
+            return []
+        try:
+            valores = ppa500.parse_multil(data)
+        except ValueError:
+            return []
+        if valores is None:
+            return []
+        F, W, V, I = valores
+        return [{"Vin": V, "Iin": I, "W": W, "F": F}]
+
+
+INSTRUMENT_TYPES = {
+    "wt210": WT210Instrument,
+    "ppa500": PPA500Instrument,
+}
+
+
+def parse_instrument_spec(spec, index):
+    """'[nombre=]tipo:puerto' -> Instrument"""
+    name = None
+    if "=" in spec.split(":", 1)[0]:
+        name, spec = spec.split("=", 1)
+    kind, sep, port = spec.partition(":")
+    kind = kind.strip().lower()
+    if not sep or not port or kind not in INSTRUMENT_TYPES:
+        raise argparse.ArgumentTypeError(
+            f"Instrumento no válido: '{spec}' (formato [nombre=]tipo:puerto, tipos: {', '.join(INSTRUMENT_TYPES)})"
+        )
+    return INSTRUMENT_TYPES[kind](name or f"{kind}_{index}", port)
+
+
+class AcquisitionEngine:
+    """Lanza una tarea por medidor y vuelca todas las muestras a un sumidero común"""
+
+    def __init__(self, instruments, sink, clock=None, stats_interval=10.0):
+        self.instruments = instruments
+        self.sink = sink
+        self.clock = clock or SharedClock()
+        self.stats_interval = stats_interval
+        self.running = False
+        # Un hilo por medidor: ninguno espera a que otro termine su read()
+        self._executor = ThreadPoolExecutor(max_workers=max(1, len(instruments)))
+
+    def _read_stamped(self, inst):
+        samples = inst.read_samples()
+        return self.clock.now_ns(), samples
+
+    async def _run_instrument(self, inst, queue):
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(self._executor, inst.open)
+            print(f"✓ {inst.name}: {type(inst).__name__} en {inst.port}")
+            while self.running:
+                t_ns, samples = await loop.run_in_executor(self._executor, self._read_stamped, inst)
+                for fields in samples:
+                    inst.samples += 1
+                    await queue.put((t_ns, inst.name, fields))
+        except (serial.SerialException, OSError) as e:
+            print(f"❌ {inst.name}: {e}")
+
+    async def _write(self, queue):
+        iso = self.clock.isoformat
+        while True:
+            t_ns, name, fields = await queue.get()
+            self.sink.writerow([t_ns, iso(t_ns), name, *(fields.get(k, "") for k in FIELDS)])
+            queue.task_done()
+
+    async def _report(self):
+        last = {inst.name: 0 for inst in self.instruments}
+        while True:
+            await asyncio.sleep(self.stats_interval)
+            parts = []
+            for inst in self.instruments:
+                rate = (inst.samples - last[inst.name]) / self.stats_interval
+                last[inst.name] = inst.samples
+                parts.append(f"{inst.name}: {inst.samples} ({rate:.2f}/s)")
+            print("📈 " + " | ".join(parts))
+
+    async def run(self, duration=None):
+        self.running = True
+        queue = asyncio.Queue(maxsize=10_000)
+        tasks = [asyncio.create_task(self._run_instrument(inst, queue)) for inst in self.instruments]
+        helpers = [asyncio.create_task(self._write(queue))]
+        if self.stats_interval > 0:
+            helpers.append(asyncio.create_task(self._report()))
+        try:
+            await asyncio.wait(tasks, timeout=duration)
+        finally:
+            # Los hilos terminan su read() en curso (como mucho el timeout del puerto)
+            self.running = False
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await queue.join()
+            for h in helpers:
+                h.cancel()
+
+    def close(self):
+        self.running = False
+        self._executor.shutdown(wait=True)
+        for inst in self.instruments:
+            inst.close()
+        self.sink.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Adquisición simultánea de varios medidores serie")
+    parser.add_argument(
+        "-i", "--inst", action="append", required=True, metavar="[NOMBRE=]TIPO:PUERTO",
+        help=f"Medidor a leer, repetible (tipos: {', '.join(INSTRUMENT_TYPES)})"
+    )
+    parser.add_argument("-f", "--file", default=DEFAULT_CSV_FILE, help=f"Archivo CSV (default: {DEFAULT_CSV_FILE})")
+    parser.add_argument("-d", "--duration", type=float, default=None, help="Duración en segundos (default: hasta Ctrl+C)")
+    parser.add_argument("--stats-interval", type=float, default=10.0, help="Resumen por medidor cada N segundos (0 = nunca)")
+    args = parser.parse_args()
+
+    try:
+        instruments = [parse_instrument_spec(spec, i) for i, spec in enumerate(args.inst)]
+    except argparse.ArgumentTypeError as e:
+        parser.error(str(e))
+
+    sink = CsvSink(args.file, header=CSV_HEADER)
+    engine = AcquisitionEngine(instruments, sink, stats_interval=args.stats_interval)
+    print(f"Guardando en {args.file} (Ctrl+C para detener)...")
+    try:
+        asyncio.run(engine.run(args.duration))
+    except KeyboardInterrupt:
+        print("\nDetenido por el usuario.")
+    finally:
+        engine.close()
+        total = ", ".join(f"{inst.name}={inst.samples}" for inst in instruments)
+        print(f"✓ Muestras: {total} -> {args.file}")
+
+
+if __name__ == "__main__":
+    main()